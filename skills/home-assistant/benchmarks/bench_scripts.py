@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# /// script
+# dependencies = [
+#   "aiohttp",
+#   "homeassistant-api",
+#   "niquests",
+#   "websockets",
+# ]
+# ///
+"""
+Wall time, round-trips and peak RSS of every script against the local mock.
+
+Usage:
+    uv run benchmarks/bench_scripts.py [--sizes 1000,10000,50000] [--latency-ms 5]
+                                       [--repeat 3] [--only NAME,...] [--format table|json]
+
+For each install size a mock_ha.py server is started on a free port. Each
+script case then runs --repeat times cold (an empty HA_CACHE_DIR and trace
+archive) and --repeat times warm (caches left by a previous run), each in a
+fresh interpreter, and reports per mode:
+
+- wall_ms: median wall time of the process, startup included
+- http / ws / auth: REST requests, WebSocket commands and auth handshakes,
+  from the script's HA_SESSION_STATS report
+- rss_mb: the largest peak RSS of any run
+
+Scripts run under this interpreter (uv run installs every script's
+dependencies into it), with HA_AGENT=0 so a running ha_agent.py doesn't
+answer for the mock. ha_tail.py and ha_state_cache.py follow run until
+interrupted and are not included.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_ha import DOMAINS, entity_id  # noqa: E402
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+DEFAULT_SIZES = "1000,10000,50000"
+TOKEN = "test"
+
+
+def first_of(domain):
+    return entity_id(DOMAINS.index(domain))
+
+
+def cases():
+    """(name, script, args) for every benchmarked invocation."""
+    light = first_of("light")
+    automation = first_of("automation")
+    item_id = str(1_700_000_000_000 + DOMAINS.index("automation"))
+    return [
+        ("get_entities", "ha_get_entities.py", ["light", "--format", "compact"]),
+        ("get_entities_all", "ha_get_entities.py", ["--format", "ndjson"]),
+        ("get_state", "ha_get_state.py", [light]),
+        ("search_similar", "ha_search_similar_entities.py", ["kitchen light", "--limit", "10"]),
+        ("get_automations", "ha_get_automations.py", ["--format", "compact"]),
+        ("list_traces", "ha_list_traces.py", ["--limit", "20"]),
+        ("get_trace", "ha_get_trace.py", [item_id, f"{item_id}-0"]),
+        ("get_trace_bulk", "ha_get_trace.py", ["--bulk"]),
+        ("trace_summary", "ha_trace_summary.py", [item_id, "--steps"]),
+        ("trace_summary_all", "ha_trace_summary.py", ["--all", "--limit", "10"]),
+        ("trace_archive_sync", "ha_trace_archive.py", ["sync"]),
+        ("search_dashboards", "ha_search_dashboards.py", []),
+        ("dashboards_entity", "ha_search_dashboards.py", ["--entity", light]),
+        ("entity_graph", "ha_entity_graph.py", [light, automation]),
+        ("get_services", "ha_get_services.py", ["light"]),
+        ("get_config", "ha_get_config.py", []),
+        ("get_config_entries", "ha_get_config_entries.py", []),
+        ("context", "ha_context.py", ["kitchen"]),
+    ]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock(entities, latency_ms):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve().parent / "mock_ha.py"),
+         "--entities", str(entities), "--port", str(port), "--token", TOKEN,
+         "--latency-ms", str(latency_ms)],
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    request = urllib.request.Request(f"{url}/api/", headers={"Authorization": f"Bearer {TOKEN}"})
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"mock_ha.py exited with {process.returncode}")
+        try:
+            urllib.request.urlopen(request, timeout=1).close()
+            return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("mock_ha.py did not start")
+
+
+def peak_rss_mb(rusage):
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    return rusage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_once(script, args, env):
+    """Run one script; returns (wall seconds, session stats, peak RSS MB, exit code)."""
+    with tempfile.TemporaryFile() as stderr:
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, str(SCRIPTS_DIR / script), *args],
+            stdout=subprocess.DEVNULL, stderr=stderr, env=env,
+        )
+        _, status, rusage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - started
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        stderr.seek(0)
+        stats = {}
+        for line in stderr.read().decode(errors="replace").splitlines():
+            if line.startswith("ha_session: "):
+                stats = json.loads(line[len("ha_session: "):])
+    return wall, stats, peak_rss_mb(rusage), process.returncode
+
+
+def summarize(runs):
+    walls, stats, rss, codes = zip(*runs)
+    last = stats[-1]
+    return {
+        "wall_ms": round(statistics.median(walls) * 1000, 1),
+        "http": last.get("http_requests"),
+        "ws": last.get("ws_commands"),
+        "auth": last.get("auth_round_trips"),
+        "rss_mb": round(max(rss), 1),
+        "failed_runs": sum(1 for code in codes if code != 0),
+    }
+
+
+def bench_case(script, args, base_env, repeat):
+    results = {}
+    for mode in ("cold", "warm"):
+        runs = []
+        workdir = Path(tempfile.mkdtemp(prefix="ha-bench-"))
+        try:
+            env = {**base_env, "HA_CACHE_DIR": str(workdir / "cache"), "HA_TRACE_DB": str(workdir / "traces.sqlite")}
+            if mode == "warm":
+                run_once(script, args, env)
+            for _ in range(repeat):
+                if mode == "cold":
+                    shutil.rmtree(workdir / "cache", ignore_errors=True)
+                    (workdir / "traces.sqlite").unlink(missing_ok=True)
+                runs.append(run_once(script, args, env))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        results[mode] = summarize(runs)
+    return results
+
+
+def print_table(rows):
+    header = f"{'entities':>8}  {'case':<20} {'mode':<5} {'wall_ms':>9} {'http':>5} {'ws':>5} {'auth':>4} {'rss_mb':>7}  failed"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['entities']:>8}  {row['case']:<20} {row['mode']:<5} {row['wall_ms']:>9} "
+              f"{row['http'] if row['http'] is not None else '-':>5} {row['ws'] if row['ws'] is not None else '-':>5} "
+              f"{row['auth'] if row['auth'] is not None else '-':>4} {row['rss_mb']:>7}  {row['failed_runs'] or ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the HA scripts against the local mock")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Install sizes to run (default: {DEFAULT_SIZES})")
+    parser.add_argument("--latency-ms", type=float, default=5, help="Simulated round-trip latency (default: 5)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case and mode; the median is reported (default: 3)")
+    parser.add_argument("--only", help="Comma-separated case names to run")
+    parser.add_argument("--format", choices=["table", "json"], default="table", help="Output format (default: table)")
+    args = parser.parse_args()
+
+    selected = cases()
+    if args.only:
+        wanted = set(args.only.split(","))
+        unknown = wanted - {name for name, _, _ in selected}
+        if unknown:
+            parser.error(f"unknown case(s): {', '.join(sorted(unknown))}")
+        selected = [case for case in selected if case[0] in wanted]
+
+    rows = []
+    for size in (int(value) for value in args.sizes.split(",")):
+        mock, url = start_mock(size, args.latency_ms)
+        try:
+            base_env = {**os.environ, "HA_URL": url, "HA_TOKEN": TOKEN, "HA_SESSION_STATS": "1", "HA_AGENT": "0"}
+            for name, script, script_args in selected:
+                for mode, result in bench_case(script, script_args, base_env, args.repeat).items():
+                    rows.append({"entities": size, "case": name, "mode": mode, **result})
+                    print(f"{size} {name} {mode}: {result['wall_ms']} ms", file=sys.stderr)
+        finally:
+            mock.terminate()
+            mock.wait()
+
+    if args.format == "json":
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# /// script
+# dependencies = [
+#   "aiohttp",
+#   "homeassistant-api",
+#   "niquests",
+#   "websockets",
+# ]
+# ///
+"""
+Startup cost of every script: interpreter, imports and the rest, per case.
+
+Usage:
+    uv run benchmarks/bench_startup.py [--entities 1000] [--repeat 5] [--only NAME,...]
+                                       [--python PATH] [--top 3] [--format table|json]
+
+Runs the bench_scripts.py cases against a local mock_ha.py, with warm
+caches (one unmeasured run first), each under `python -X importtime`, and
+reports per case:
+
+- wall_ms: median wall time of the whole process
+- python_ms: median wall time of `python -c pass` with the same
+  interpreter (startup plus site), the floor no script can go under
+- imports_ms: time spent importing, from -X importtime (excluding site)
+- overhead_ms: wall_ms - python_ms, what the script itself adds
+- top: the top-level imports that took longest, cumulative ms
+
+--python runs the scripts with another interpreter, e.g. the one in a
+pre-built environment, to compare it against this one.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_scripts import SCRIPTS_DIR, TOKEN, cases, start_mock  # noqa: E402
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+# Loaded by the interpreter before the script's first line runs
+STARTUP_MODULES = {"site", "encodings", "_frozen_importlib_external", "zipimport", "_signal", "io", "abc", "codecs"}
+
+
+def parse_importtime(stderr):
+    """{top-level module: cumulative ms} from -X importtime output, startup modules left out.
+
+    Imports done lazily inside functions also show up at the top level.
+    """
+    top_level = {}
+    for match in map(IMPORT_LINE.match, stderr.splitlines()):
+        if match and len(match[3]) == 1 and match[4] not in STARTUP_MODULES:
+            top_level[match[4]] = int(match[2]) / 1000
+    return top_level
+
+
+def timed(command, env):
+    started = time.perf_counter()
+    process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env, text=True)
+    return time.perf_counter() - started, process
+
+
+def bench_case(python, script, args, env, repeat):
+    walls, imports, tops = [], [], []
+    timed([python, str(SCRIPTS_DIR / script), *args], env)
+    for _ in range(repeat):
+        wall, process = timed([python, "-X", "importtime", str(SCRIPTS_DIR / script), *args], env)
+        if process.returncode != 0:
+            raise RuntimeError(f"{script} exited with {process.returncode}: {process.stderr[-500:]}")
+        top_level = parse_importtime(process.stderr)
+        walls.append(wall * 1000)
+        imports.append(sum(top_level.values()))
+        tops.append(top_level)
+    top = {module: statistics.median(run.get(module, 0) for run in tops) for module in tops[-1]}
+    return statistics.median(walls), statistics.median(imports), top
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the startup cost of each HA script")
+    parser.add_argument("--entities", type=int, default=1000, help="Mock install size (default: 1000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case; the median is reported (default: 5)")
+    parser.add_argument("--only", help="Comma-separated case names to run")
+    parser.add_argument("--python", default=sys.executable, help="Interpreter to run the scripts with (default: this one)")
+    parser.add_argument("--top", type=int, default=3, help="Slowest top-level imports to list (default: 3)")
+    parser.add_argument("--format", choices=["table", "json"], default="table", help="Output format (default: table)")
+    args = parser.parse_args()
+
+    selected = cases()
+    if args.only:
+        wanted = set(args.only.split(","))
+        unknown = wanted - {name for name, _, _ in selected}
+        if unknown:
+            parser.error(f"unknown case(s): {', '.join(sorted(unknown))}")
+        selected = [case for case in selected if case[0] in wanted]
+
+    baseline = statistics.median(
+        timed([args.python, "-c", "pass"], os.environ)[0] * 1000 for _ in range(args.repeat)
+    )
+
+    rows = []
+    mock, url = start_mock(args.entities, 0)
+    workdir = Path(tempfile.mkdtemp(prefix="ha-startup-"))
+    try:
+        env = {**os.environ, "HA_URL": url, "HA_TOKEN": TOKEN,
+               "HA_CACHE_DIR": str(workdir / "cache"), "HA_TRACE_DB": str(workdir / "traces.sqlite")}
+        env.pop("HA_SESSION_STATS", None)
+        for name, script, script_args in selected:
+            wall, imports, top = bench_case(args.python, script, script_args, env, args.repeat)
+            rows.append({
+                "case": name,
+                "wall_ms": round(wall, 1),
+                "python_ms": round(baseline, 1),
+                "imports_ms": round(imports, 1),
+                "overhead_ms": round(wall - baseline, 1),
+                "top": {module: round(ms, 1) for module, ms in sorted(top.items(), key=lambda item: -item[1])[:args.top]},
+            })
+            print(f"{name}: {rows[-1]['wall_ms']} ms", file=sys.stderr)
+    finally:
+        mock.terminate()
+        mock.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.format == "json":
+        print(json.dumps(rows, indent=2))
+        return
+    header = f"{'case':<20} {'wall_ms':>8} {'python_ms':>9} {'imports_ms':>10} {'overhead_ms':>11}  top imports (ms)"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        top = ", ".join(f"{module} {ms:g}" for module, ms in row["top"].items())
+        print(f"{row['case']:<20} {row['wall_ms']:>8} {row['python_ms']:>9} {row['imports_ms']:>10} {row['overhead_ms']:>11}  {top}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# /// script
+# dependencies = [
+#   "homeassistant-api",
+# ]
+# ///
+"""
+Per-entity cost of decoding an /api/states payload, raw vs typed.
+
+raw   - json.loads into plain dicts (what halib.cache does by default)
+typed - json.loads, homeassistant_api State.from_json per entity, then
+        model_dump(mode='json') back to dicts (HA_STATES_DECODE=typed, and
+        what the scripts used to do)
+
+Usage:
+    uv run benchmarks/bench_state_decode.py [--entities 5000] [--repeat 5]
+
+The payload is synthetic but shaped like a real install: a mix of domains,
+realistic attribute counts and full context objects. Each path is run
+--repeat times and the best run is reported.
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+DOMAINS = {
+    "sensor": lambda r: {"unit_of_measurement": "°C", "device_class": "temperature", "state_class": "measurement"},
+    "binary_sensor": lambda r: {"device_class": "motion"},
+    "light": lambda r: {
+        "supported_color_modes": ["color_temp", "hs"], "color_mode": "color_temp", "brightness": r.randint(0, 255),
+        "color_temp_kelvin": 2700, "min_color_temp_kelvin": 2000, "max_color_temp_kelvin": 6500,
+        "hs_color": [30.0, 50.2], "rgb_color": [255, 200, 140], "xy_color": [0.5, 0.4], "supported_features": 44,
+    },
+    "switch": lambda r: {},
+    "automation": lambda r: {"id": str(r.randint(10**12, 10**13)), "last_triggered": None, "mode": "single", "current": 0},
+    "media_player": lambda r: {
+        "volume_level": 0.4, "is_volume_muted": False, "source_list": ["TV", "Radio", "Spotify"],
+        "media_title": "Something", "supported_features": 152463,
+    },
+}
+
+
+def synthetic_states(count, seed=1):
+    """A list of /api/states entries for `count` entities."""
+    rnd = random.Random(seed)
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    domains = list(DOMAINS)
+    states = []
+    for i in range(count):
+        domain = domains[i % len(domains)]
+        changed = (now - timedelta(seconds=rnd.randint(0, 86400))).isoformat()
+        states.append({
+            "entity_id": f"{domain}.entity_{i}",
+            "state": rnd.choice(["on", "off", "21.5", "unavailable"]),
+            "attributes": {"friendly_name": f"Entity {i}", "icon": "mdi:home", **DOMAINS[domain](rnd)},
+            "last_changed": changed,
+            "last_reported": changed,
+            "last_updated": changed,
+            "context": {"id": f"01J{rnd.getrandbits(80):020X}", "parent_id": None, "user_id": None},
+        })
+    return states
+
+
+def decode_raw(payload):
+    return json.loads(payload)
+
+
+def decode_typed(payload):
+    from homeassistant_api import State
+
+    return [State.from_json(entity).model_dump(mode='json') for entity in json.loads(payload)]
+
+
+def best_of(fn, payload, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(payload)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /api/states decoding")
+    parser.add_argument("--entities", type=int, default=5000, help="Synthetic entity count (default: 5000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per path; the best is reported (default: 5)")
+    args = parser.parse_args()
+
+    states = synthetic_states(args.entities)
+    payload = json.dumps(states)
+    # Import and warm the typed path outside the timings
+    decode_typed(json.dumps(states[:1]))
+
+    results = {path: best_of(fn, payload, args.repeat) for path, fn in (("raw", decode_raw), ("typed", decode_typed))}
+
+    print(json.dumps({
+        "entities": args.entities,
+        "payload_bytes": len(payload),
+        **{
+            path: {"total_ms": round(seconds * 1000, 2), "per_entity_us": round(seconds / args.entities * 1e6, 2)}
+            for path, seconds in results.items()
+        },
+        "typed_vs_raw": round(results["typed"] / results["raw"], 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
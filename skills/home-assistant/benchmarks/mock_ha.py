@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+# /// script
+# dependencies = [
+#   "aiohttp",
+# ]
+# ///
+"""
+Local stand-in for a Home Assistant instance, for testing and benchmarking.
+
+Usage:
+    uv run benchmarks/mock_ha.py [--entities 1000] [--port 8123] [--token test] [--latency-ms 0]
+
+Then point the scripts at it:
+    HA_URL=http://127.0.0.1:8123 HA_TOKEN=test uv run scripts/ha_get_entities.py light
+
+Serves a synthetic install of --entities entities (1k, 10k and 50k are the
+benchmark sizes; any count works). The same seed always produces the same
+install, so entity ids are predictable: entity_id(i) is the i-th entity.
+
+REST:      /api/, /api/states, /api/states/<entity_id>, /api/services,
+           /api/config, /api/config/config_entries/entry
+WebSocket: auth, supported_features, get_states, get_config,
+           trace/list, trace/get, lovelace/dashboards/list, lovelace/config,
+           automation/config, config/{entity,device,area}_registry/list,
+           subscribe_events (state_changed, automation_triggered),
+           subscribe_trigger (state and event triggers), unsubscribe_events
+
+--latency-ms delays every REST response and WebSocket result, as a network
+round-trip would. WebSocket commands are handled concurrently, so pipelined
+commands overlap their delays the way they do against a real instance.
+Subscriptions emit --event-rate events per second.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+SEED = 1
+NOW = datetime(2026, 3, 8, 8, 0, tzinfo=timezone.utc)
+
+# One entry per entity slot, so the mix is weighted by repetition
+DOMAINS = (
+    ["sensor"] * 8 + ["binary_sensor"] * 3 + ["light"] * 3 + ["switch"] * 2
+    + ["automation", "media_player", "climate", "cover"]
+)
+ROOMS = [
+    "kitchen", "living_room", "bedroom", "office", "garage", "hallway",
+    "bathroom", "basement", "porch", "dining_room", "laundry", "attic",
+]
+SERVICES = {
+    "light": ["turn_on", "turn_off", "toggle"],
+    "switch": ["turn_on", "turn_off", "toggle"],
+    "cover": ["open_cover", "close_cover", "stop_cover"],
+    "climate": ["set_temperature", "set_hvac_mode"],
+    "media_player": ["media_play", "media_pause", "volume_set"],
+    "automation": ["trigger", "turn_on", "turn_off", "reload"],
+    "homeassistant": ["restart", "reload_all", "update_entity"],
+    "notify": ["notify", "persistent_notification"],
+}
+TRACED_AUTOMATIONS = 50
+RUNS_PER_AUTOMATION = 5
+ENTITIES_PER_DEVICE = 4
+CARDS_PER_VIEW = 20
+
+
+def entity_id(i):
+    """The i-th entity of every synthetic install."""
+    domain = DOMAINS[i % len(DOMAINS)]
+    room = ROOMS[(i // len(DOMAINS)) % len(ROOMS)]
+    return f"{domain}.{room}_{i}"
+
+
+def _attributes(domain, room, i, rnd):
+    name = f"{room.replace('_', ' ').title()} {domain.replace('_', ' ')} {i}"
+    attributes = {"friendly_name": name}
+    if domain == "sensor":
+        attributes.update(unit_of_measurement="°C", device_class="temperature", state_class="measurement")
+    elif domain == "binary_sensor":
+        attributes.update(device_class=rnd.choice(["motion", "door", "window", "occupancy"]))
+    elif domain == "light":
+        attributes.update(supported_color_modes=["color_temp", "hs"], color_mode="color_temp",
+                          brightness=rnd.randint(0, 255), color_temp_kelvin=2700, supported_features=44)
+    elif domain == "automation":
+        attributes.update(id=str(1_700_000_000_000 + i), mode="single", current=0,
+                          last_triggered=(NOW - timedelta(minutes=rnd.randint(0, 600))).isoformat())
+    elif domain == "climate":
+        attributes.update(hvac_modes=["off", "heat", "cool"], temperature=21, current_temperature=20.5)
+    return attributes
+
+
+def _state(domain, rnd):
+    return {
+        "sensor": lambda: f"{rnd.uniform(15, 25):.1f}",
+        "climate": lambda: rnd.choice(["heat", "off"]),
+        "cover": lambda: rnd.choice(["open", "closed"]),
+        "media_player": lambda: rnd.choice(["playing", "idle", "off"]),
+    }.get(domain, lambda: rnd.choice(["on", "off"]))()
+
+
+class Install:
+    """Every piece of data the mock serves, generated up front."""
+
+    def __init__(self, entities, seed=SEED):
+        rnd = random.Random(seed)
+        self.states = []
+        for i in range(entities):
+            eid = entity_id(i)
+            domain = eid.split(".", 1)[0]
+            room = ROOMS[(i // len(DOMAINS)) % len(ROOMS)]
+            changed = (NOW - timedelta(seconds=rnd.randint(0, 86400))).isoformat()
+            self.states.append({
+                "entity_id": eid,
+                "state": _state(domain, rnd),
+                "attributes": _attributes(domain, room, i, rnd),
+                "last_changed": changed,
+                "last_reported": changed,
+                "last_updated": changed,
+                "context": {"id": f"01J{rnd.getrandbits(80):020X}", "parent_id": None, "user_id": None},
+            })
+        self.states_by_id = {state["entity_id"]: state for state in self.states}
+
+        by_room_domain = {}
+        for state in self.states:
+            eid = state["entity_id"]
+            room = eid.split(".", 1)[1].rsplit("_", 1)[0]
+            by_room_domain.setdefault((room, eid.split(".", 1)[0]), []).append(eid)
+
+        def pick(room, domain, k):
+            candidates = by_room_domain.get((room, domain)) or ["sun.sun"]
+            return candidates[k % len(candidates)]
+
+        self.automations = [state for state in self.states if state["entity_id"].startswith("automation.")]
+        self.automation_configs = {}
+        for k, automation in enumerate(self.automations):
+            room = automation["entity_id"].split(".", 1)[1].rsplit("_", 1)[0]
+            self.automation_configs[automation["entity_id"]] = {
+                "id": automation["attributes"]["id"],
+                "alias": automation["attributes"]["friendly_name"],
+                "mode": "single",
+                "triggers": [{"trigger": "state", "entity_id": pick(room, "binary_sensor", k), "to": "on"}],
+                "conditions": [{"condition": "numeric_state", "entity_id": pick(room, "sensor", k), "below": 22}],
+                "actions": [
+                    {"action": "light.turn_on", "target": {"entity_id": [pick(room, "light", k)]}},
+                    {"delay": {"seconds": 1}},
+                    {"action": "switch.turn_off", "target": {"entity_id": pick(room, "switch", k)}},
+                ],
+            }
+
+        self.traces = []
+        for automation in self.automations[:TRACED_AUTOMATIONS]:
+            item_id = automation["attributes"]["id"]
+            for run in range(RUNS_PER_AUTOMATION):
+                start = NOW - timedelta(minutes=rnd.randint(0, 24 * 60))
+                failed = rnd.random() < 0.2
+                finish = start + timedelta(seconds=rnd.uniform(0.01, 3))
+                self.traces.append({
+                    "domain": "automation", "item_id": item_id, "run_id": f"{item_id}-{run}",
+                    "state": "stopped", "script_execution": "error" if failed else "finished",
+                    "last_step": "action/2" if not failed else "action/0",
+                    "error": "Service light.turn_on timed out" if failed else None,
+                    "timestamp": {"start": start.isoformat(), "finish": finish.isoformat()},
+                    "trigger": f"state of {self.automation_configs[automation['entity_id']]['triggers'][0]['entity_id']}",
+                })
+        self.configs_by_item = {config["id"]: config for config in self.automation_configs.values()}
+
+        self.dashboards = [
+            {"id": f"dashboard_{room}", "url_path": f"dashboard-{room.replace('_', '-')}", "title": room.replace("_", " ").title(),
+             "mode": "storage", "icon": "mdi:home", "show_in_sidebar": True, "require_admin": False}
+            for room in ROOMS
+        ]
+        self.lovelace = {None: {"title": "Home", "views": self._views(ROOMS, by_room_domain)}}
+        for room, dashboard in zip(ROOMS, self.dashboards):
+            self.lovelace[dashboard["url_path"]] = {"title": dashboard["title"], "views": self._views([room], by_room_domain)}
+
+        devices = (len(self.states) + ENTITIES_PER_DEVICE - 1) // ENTITIES_PER_DEVICE
+        self.entity_registry = [
+            {"entity_id": state["entity_id"], "device_id": f"device{i // ENTITIES_PER_DEVICE}", "area_id": None,
+             "platform": "mock", "name": None}
+            for i, state in enumerate(self.states)
+        ]
+        self.device_registry = [
+            {"id": f"device{d}", "name": f"Device {d}", "name_by_user": None, "manufacturer": "Mock",
+             "area_id": ROOMS[(d * ENTITIES_PER_DEVICE // len(DOMAINS)) % len(ROOMS)]}
+            for d in range(devices)
+        ]
+        self.area_registry = [{"area_id": room, "name": room.replace("_", " ").title()} for room in ROOMS]
+
+        self.services = [
+            {"domain": domain, "services": {
+                name: {"name": name.replace("_", " ").capitalize(), "description": f"{name} for {domain}",
+                       "fields": {"entity_id": {"example": f"{domain}.example", "selector": {"entity": {}}}}}
+                for name in names
+            }}
+            for domain, names in SERVICES.items()
+        ]
+        self.config = {
+            "version": "2026.3.0", "location_name": "Mock Home", "time_zone": "America/Denver",
+            "unit_system": {"temperature": "°C"}, "latitude": 39.7, "longitude": -105.0, "elevation": 1600,
+            "components": sorted(set(SERVICES) | {"api", "websocket_api", "lovelace", "trace", "sensor", "binary_sensor"}),
+            "state": "RUNNING",
+        }
+        self.config_entries = [
+            {"entry_id": f"01MOCK{n:04d}", "domain": domain, "title": domain.replace("_", " ").title(),
+             "state": "loaded", "source": "user"}
+            for n, domain in enumerate(["hue", "mqtt", "zha", "telegram_bot", "met", "mobile_app"])
+        ]
+
+    def _views(self, rooms, by_room_domain):
+        views = []
+        for room in rooms:
+            shown = [eid for domain in ("light", "switch", "sensor", "binary_sensor") for eid in by_room_domain.get((room, domain), [])[:5]]
+            cards = [{"type": "tile", "entity": eid} for eid in shown[:CARDS_PER_VIEW]]
+            cards.append({"type": "entities", "title": "All", "entities": shown})
+            lights = by_room_domain.get((room, "light"), [])
+            if lights:
+                cards.append({"type": "button", "entity": lights[0],
+                              "tap_action": {"action": "perform-action", "perform_action": "light.toggle",
+                                             "target": {"entity_id": lights[0]}}})
+            views.append({"title": room.replace("_", " ").title(), "path": room, "cards": cards})
+        return views
+
+    def full_trace(self, trace):
+        start = datetime.fromisoformat(trace["timestamp"]["start"])
+        config = self.configs_by_item[trace["item_id"]]
+        step = lambda n: (start + timedelta(milliseconds=10 * n)).isoformat()
+        trigger_entity = config["triggers"][0]["entity_id"]
+        steps = {
+            "trigger/0": [{"path": "trigger/0", "timestamp": step(0), "changed_variables": {
+                "this": self.states_by_id.get(f"automation.{trace['item_id']}"),
+                "trigger": {"platform": "state", "entity_id": trigger_entity, "to_state": {"state": "on"}}}}],
+            "condition/0": [{"path": "condition/0", "timestamp": step(1), "result": {"result": True}}],
+            "action/0": [{"path": "action/0", "timestamp": step(2), "changed_variables": {"context": {"id": "x"}},
+                          "result": {"params": {"domain": "light", "service": "turn_on"}, "running_script": False},
+                          **({"error": trace["error"]} if trace["error"] else {})}],
+        }
+        if not trace["error"]:
+            steps["action/1"] = [{"path": "action/1", "timestamp": step(3), "result": {"delay": 1.0, "done": True}}]
+            steps["action/2"] = [{"path": "action/2", "timestamp": trace["timestamp"]["finish"],
+                                  "result": {"params": {"domain": "switch", "service": "turn_off"}}}]
+        return {**trace, "trace": steps, "config": config, "blueprint_inputs": None,
+                "context": {"id": f"ctx-{trace['run_id']}", "parent_id": None, "user_id": None}}
+
+
+class CommandError(Exception):
+    pass
+
+
+class MockHA:
+    def __init__(self, install, token, latency, event_rate):
+        self.install = install
+        self.token = token
+        self.latency = latency
+        self.event_rate = event_rate
+
+    async def _delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _authorized(self, request):
+        return request.headers.get("Authorization") == f"Bearer {self.token}"
+
+    def app(self):
+        from aiohttp import web
+
+        def rest(handler):
+            async def wrapped(request):
+                if not self._authorized(request):
+                    raise web.HTTPUnauthorized()
+                await self._delay()
+                result = handler(request)
+                if result is None:
+                    raise web.HTTPNotFound()
+                return web.json_response(result)
+            return wrapped
+
+        app = web.Application()
+        app.add_routes([
+            web.get("/api/", rest(lambda request: {"message": "API running."})),
+            web.get("/api/states", rest(lambda request: self.install.states)),
+            web.get("/api/states/{entity_id}", rest(lambda request: self.install.states_by_id.get(request.match_info["entity_id"]))),
+            web.get("/api/services", rest(lambda request: self.install.services)),
+            web.get("/api/config", rest(lambda request: self.install.config)),
+            web.get("/api/config/config_entries/entry", rest(lambda request: self.install.config_entries)),
+            web.get("/api/websocket", self.websocket),
+        ])
+        return app
+
+    # WebSocket commands: type → handler(msg) returning the result
+
+    def _trace_list(self, msg):
+        return [trace for trace in self.install.traces if msg.get("item_id") in (None, trace["item_id"])]
+
+    def _trace_get(self, msg):
+        for trace in self.install.traces:
+            if trace["item_id"] == msg.get("item_id") and trace["run_id"] == msg.get("run_id"):
+                return self.install.full_trace(trace)
+        raise CommandError("not_found", "The trace could not be found")
+
+    def _lovelace_config(self, msg):
+        config = self.install.lovelace.get(msg.get("url_path"))
+        if config is None:
+            raise CommandError("config_not_found", "No config found.")
+        return config
+
+    def _automation_config(self, msg):
+        config = self.install.automation_configs.get(msg.get("entity_id"))
+        if config is None:
+            raise CommandError("not_found", "Entity not found")
+        return {"config": config}
+
+    def commands(self):
+        install = self.install
+        return {
+            "supported_features": lambda msg: None,
+            "get_states": lambda msg: install.states,
+            "get_config": lambda msg: install.config,
+            "trace/list": self._trace_list,
+            "trace/get": self._trace_get,
+            "lovelace/dashboards/list": lambda msg: install.dashboards,
+            "lovelace/config": self._lovelace_config,
+            "automation/config": self._automation_config,
+            "config/entity_registry/list": lambda msg: install.entity_registry,
+            "config/device_registry/list": lambda msg: install.device_registry,
+            "config/area_registry/list": lambda msg: install.area_registry,
+        }
+
+    async def websocket(self, request):
+        from aiohttp import WSMsgType, web
+
+        socket = web.WebSocketResponse(max_msg_size=0)
+        await socket.prepare(request)
+        lock = asyncio.Lock()
+
+        async def send(message):
+            async with lock:
+                await socket.send_str(json.dumps(message))
+
+        await send({"type": "auth_required", "ha_version": self.install.config["version"]})
+        auth = await socket.receive()
+        if auth.type != WSMsgType.TEXT or json.loads(auth.data).get("access_token") != self.token:
+            await send({"type": "auth_invalid", "message": "Invalid access token or password"})
+            await socket.close()
+            return socket
+        await send({"type": "auth_ok", "ha_version": self.install.config["version"]})
+
+        handlers = self.commands()
+        subscriptions = {}
+        tasks = set()
+
+        async def handle(msg):
+            await self._delay()
+            msg_id, msg_type = msg.get("id"), msg.get("type")
+            try:
+                if msg_type in ("subscribe_events", "subscribe_trigger"):
+                    subscriptions[msg_id] = asyncio.create_task(self._pump(send, msg))
+                    result = None
+                elif msg_type == "unsubscribe_events":
+                    task = subscriptions.pop(msg.get("subscription"), None)
+                    if task is None:
+                        raise CommandError("not_found", "Subscription not found.")
+                    task.cancel()
+                    result = None
+                elif msg_type in handlers:
+                    result = handlers[msg_type](msg)
+                else:
+                    raise CommandError("unknown_command", f"Unknown command: {msg_type}")
+            except CommandError as e:
+                code, message = e.args
+                await send({"id": msg_id, "type": "result", "success": False, "error": {"code": code, "message": message}})
+            else:
+                await send({"id": msg_id, "type": "result", "success": True, "result": result})
+
+        try:
+            async for message in socket:
+                if message.type != WSMsgType.TEXT:
+                    break
+                task = asyncio.create_task(handle(json.loads(message.data)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in [*tasks, *subscriptions.values()]:
+                task.cancel()
+        return socket
+
+    async def _pump(self, send, msg):
+        """Emit events for one subscription until it is cancelled."""
+        rnd = random.Random(msg["id"])
+        install = self.install
+        interval = 1 / self.event_rate if self.event_rate > 0 else None
+        triggers = msg.get("trigger") or []
+        if isinstance(triggers, dict):
+            triggers = [triggers]
+        count = 0
+        while interval:
+            await asyncio.sleep(interval)
+            count += 1
+            now = datetime.now(timezone.utc).isoformat()
+            state = rnd.choice(install.states)
+            new_state = {**state, "state": f"{count}", "last_changed": now, "last_updated": now, "last_reported": now}
+            automation = rnd.choice(install.automations) if install.automations else None
+
+            if msg["type"] == "subscribe_events":
+                event_type = msg.get("event_type")
+                if event_type in (None, "state_changed"):
+                    await send({"id": msg["id"], "type": "event", "event": {
+                        "event_type": "state_changed", "time_fired": now, "origin": "LOCAL",
+                        "data": {"entity_id": state["entity_id"], "old_state": state, "new_state": new_state}}})
+                if event_type in (None, "automation_triggered") and automation:
+                    await send({"id": msg["id"], "type": "event", "event": self._automation_triggered(automation, now)})
+                continue
+
+            for trigger in triggers:
+                platform = trigger.get("platform") or trigger.get("trigger")
+                if platform == "state":
+                    entity_ids = trigger.get("entity_id") or []
+                    entity_ids = [entity_ids] if isinstance(entity_ids, str) else entity_ids
+                    if not entity_ids:
+                        continue
+                    watched = install.states_by_id.get(rnd.choice(entity_ids))
+                    if watched is None:
+                        continue
+                    variables = {"platform": "state", "entity_id": watched["entity_id"], "from_state": watched,
+                                 "to_state": {**watched, "state": f"{count}", "last_updated": now}}
+                elif platform == "event" and trigger.get("event_type") == "automation_triggered" and automation:
+                    wanted = (trigger.get("event_data") or {}).get("entity_id")
+                    if wanted and wanted != automation["entity_id"]:
+                        automation = install.states_by_id.get(wanted, automation)
+                    variables = {"platform": "event", "event": self._automation_triggered(automation, now)}
+                else:
+                    continue
+                await send({"id": msg["id"], "type": "event", "event": {"variables": {"trigger": variables}, "context": {"id": f"c{count}"}}})
+
+    def _automation_triggered(self, automation, now):
+        return {"event_type": "automation_triggered", "time_fired": now, "origin": "LOCAL",
+                "data": {"name": automation["attributes"]["friendly_name"], "entity_id": automation["entity_id"],
+                         "source": "state of mock"}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic Home Assistant install")
+    parser.add_argument("--entities", type=int, default=1000, help="Entities in the install (default: 1000)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8123, help="Port to listen on (default: 8123)")
+    parser.add_argument("--token", default="test", help="Accepted access token (default: test)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay before every response (default: 0)")
+    parser.add_argument("--event-rate", type=float, default=5, help="Events per second per subscription (default: 5)")
+    args = parser.parse_args()
+
+    from aiohttp import web
+
+    install = Install(args.entities)
+    server = MockHA(install, args.token, args.latency_ms / 1000, args.event_rate)
+    print(f"Mock HA with {len(install.states)} entities on http://{args.host}:{args.port}", flush=True)
+    web.run_app(server.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# /// script
+# dependencies = [
+#   "homeassistant-api",
+#   "niquests",
+#   "websockets",
+# ]
+# ///
+"""
+Optional background agent that the other scripts forward their requests to.
+
+Usage:
+    uv run ha_agent.py run [--flush 5]     # Serve until interrupted
+    uv run ha_agent.py status              # Is an agent running, and what does it hold
+    uv run ha_agent.py stop                # Ask the running agent to exit
+
+`run` keeps one authenticated WebSocket open and subscribes to
+state_changed, the entity/device/area registry updates and core config
+changes. From those it keeps current:
+
+- the state table (one /api/states fetch, then every state_changed)
+- /api/config (refetched after core_config_updated or component_loaded)
+- the area/device registry cache (refetched after a registry edit)
+- an in-memory trigram index for ha_search_similar_entities.py and
+  ha_context.py, updated with the states and registries
+
+It answers the other scripts on a Unix socket in the cache directory, one
+per HA instance, readable only by the current user. While it runs, every
+script forwards to it without any flag:
+
+- /api/states, /api/states/<entity_id> and /api/config come from memory,
+  and so do entity searches.
+- Other REST GETs and all WebSocket commands run on the agent's
+  connections, with no TLS or auth handshake per script.
+
+It also rewrites the state snapshot every --flush seconds, the same way
+ha_state_cache.py follow does (run one or the other, not both).
+
+Start it in the background (`uv run ha_agent.py run &`, or under systemd or
+launchd). When no agent is running, the scripts connect to HA directly as
+before. Set HA_AGENT=0 to make a script ignore a running agent.
+
+Requires HA_TOKEN environment variable to be set.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from halib.agent import READ_LIMIT, AgentClient, AgentUnavailable, agent_status, socket_path, token_digest
+from halib.cache import RegistryCache, StateCache, apply_state_changed
+from halib.search import EntityIndex, document
+from halib.session import HAError, HTTPStatusError, get_session
+
+# Events (besides state_changed) that invalidate something the agent holds
+REFRESH_EVENTS = {
+    "entity_registry_updated": "registry",
+    "device_registry_updated": "registry",
+    "area_registry_updated": "registry",
+    "core_config_updated": "config",
+    "component_loaded": "config",
+}
+# Registry edits arrive in bursts; refetch once they settle
+REGISTRY_DEBOUNCE = 2.0
+
+class Agent:
+    """The state the agent keeps current, and the request handlers over it."""
+
+    def __init__(self, session, flush_interval):
+        self.session = session
+        self.flush_interval = flush_interval
+        self.state_cache = StateCache(session)
+        self.registry = RegistryCache(session)
+        self.states_by_id = {}
+        self.locations = {}
+        self.index = EntityIndex()
+        self.config = None
+        self.websocket = None
+        self.started_at = time.time()
+        self.requests = 0
+        self.connections = 0
+        self.registry_dirty = asyncio.Event()
+        self.stopping = asyncio.Event()
+
+    async def start(self):
+        """Subscribe, then load everything; returns the event stream."""
+        self.websocket = await self.session.websocket()
+        # Subscribe before fetching so no change between the two is lost;
+        # events queue on the socket while the snapshot downloads.
+        queue = asyncio.Queue()
+        subscription = await self.websocket.subscribe("state_changed", queue)
+        for event_type in REFRESH_EVENTS:
+            await self.websocket.subscribe(event_type, queue)
+
+        states, self.config, self.locations = await asyncio.gather(
+            self.state_cache.fetch_async(),
+            self.session.get_json_async("/api/config"),
+            self.registry.fetch_async(),
+        )
+        self.states_by_id = {state["entity_id"]: state for state in states}
+        # Nothing else touches the index until start() returns
+        await asyncio.to_thread(self.index.sync, self.documents())
+        return self.websocket.events(subscription)
+
+    def documents(self):
+        return {
+            entity_id: document(state, self.locations.get(entity_id))
+            for entity_id, state in self.states_by_id.items()
+        }
+
+    async def follow(self, events):
+        async for event in events:
+            kind = REFRESH_EVENTS.get(event.get("event_type"))
+            if kind is None:
+                apply_state_changed(self.states_by_id, event)
+                entity_id = event.get("data", {}).get("entity_id")
+                state = self.states_by_id.get(entity_id)
+                self.index.update(entity_id, state and document(state, self.locations.get(entity_id)))
+            elif kind == "config":
+                self.config = None
+            else:
+                self.registry_dirty.set()
+
+    async def flush(self):
+        """Rewrite the snapshot every interval so readers stay within the TTL."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # Events replace state dicts rather than mutate them, so the
+            # list can be serialized off the loop
+            await asyncio.to_thread(self.state_cache.store, list(self.states_by_id.values()))
+
+    async def refresh_registry(self):
+        """Refetch the registries after edits, and often enough to stay within their TTL."""
+        while True:
+            try:
+                await asyncio.wait_for(self.registry_dirty.wait(), timeout=max(self.registry.ttl / 2, 1))
+                await asyncio.sleep(REGISTRY_DEBOUNCE)
+            except asyncio.TimeoutError:
+                pass
+            self.registry_dirty.clear()
+            self.locations = await self.registry.fetch_async()
+            # Only entities whose area or device name changed are re-indexed
+            self.index.sync(self.documents())
+
+    async def get(self, path):
+        if path == "/api/states":
+            return list(self.states_by_id.values())
+        if path.startswith("/api/states/"):
+            state = self.states_by_id.get(path[len("/api/states/"):])
+            if state is None:
+                raise HTTPStatusError(404, "Not Found", f"{self.session.base_url}{path}")
+            return state
+        if path == "/api/config":
+            if self.config is None:
+                self.config = await self.session.get_json_async(path)
+            return self.config
+        return await self.session.get_json_async(path)
+
+    def status(self):
+        return {
+            "running": True,
+            "pid": os.getpid(),
+            "url": self.session.base_url,
+            "socket": str(socket_path(self.session)),
+            "started_at": datetime.fromtimestamp(self.started_at).astimezone().isoformat(),
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "entities": len(self.states_by_id),
+            "requests": self.requests,
+            "connections": self.connections,
+        }
+
+    async def dispatch(self, request):
+        op = request.get("op")
+        if op == "get":
+            return await self.get(request["path"])
+        if op == "ws":
+            return await self.websocket.call(request["type"], **request.get("kwargs", {}))
+        if op == "search":
+            return self.index.search(request["query"], request.get("limit", 25))
+        if op == "status":
+            return self.status()
+        if op == "stop":
+            self.stopping.set()
+            return {"stopping": True}
+        raise HAError(f"unknown request: {op}")
+
+    async def answer(self, request, send):
+        reply = {"id": request.get("id")}
+        try:
+            reply.update(ok=True, result=await self.dispatch(request))
+        except HTTPStatusError as e:
+            reply.update(ok=False, error=str(e), status_code=e.status_code, reason=e.reason, url=e.url)
+        except Exception as e:
+            reply.update(ok=False, error=str(e), code=getattr(e, "code", None))
+        self.requests += 1
+        try:
+            await send(reply)
+        except ConnectionError:
+            pass
+
+    async def serve_client(self, reader, writer):
+        """One script's connection: a hello, then pipelined requests."""
+        self.connections += 1
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def send(reply):
+            async with write_lock:
+                writer.write(json.dumps(reply, separators=(",", ":")).encode() + b"\n")
+                await writer.drain()
+
+        try:
+            hello = json.loads(await reader.readline() or b"{}")
+            if hello.get("op") != "hello" or hello.get("token") != token_digest(self.session.token):
+                await send({"ok": False, "error": "HA_TOKEN does not match the agent's"})
+                return
+            await send({"ok": True, "result": {"pid": os.getpid()}})
+
+            while line := await reader.readline():
+                task = asyncio.create_task(self.answer(json.loads(line), send))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks, return_exceptions=True)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+async def run(flush_interval):
+    # This process is the agent: its own requests must go to HA
+    os.environ["HA_AGENT"] = "0"
+    session = get_session()
+    path = socket_path(session)
+    running = agent_status(session)
+    if running is not None:
+        raise HAError(f"an agent is already running (pid {running['pid']}) on {path}")
+
+    agent = Agent(session, flush_interval)
+    server = None
+    try:
+        events = await agent.start()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A socket file left by an agent that didn't shut down cleanly
+        path.unlink(missing_ok=True)
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(agent.serve_client, path=str(path), limit=READ_LIMIT)
+        finally:
+            os.umask(umask)
+        print(f"Agent serving {len(agent.states_by_id)} entities on {path}", file=sys.stderr)
+
+        workers = [
+            asyncio.create_task(agent.follow(events)),
+            asyncio.create_task(agent.flush()),
+            asyncio.create_task(agent.refresh_registry()),
+        ]
+        stopping = asyncio.create_task(agent.stopping.wait())
+        done, _ = await asyncio.wait([*workers, stopping], return_when=asyncio.FIRST_COMPLETED)
+        for task in (*workers, stopping):
+            task.cancel()
+        # A worker only returns early on failure (e.g. the WebSocket dropped)
+        for task in done:
+            if task is not stopping and not task.cancelled() and task.exception():
+                raise task.exception()
+    finally:
+        if server is not None:
+            server.close()
+            path.unlink(missing_ok=True)
+        await session.aclose()
+
+def stop():
+    session = get_session()
+    try:
+        client = AgentClient(session)
+    except AgentUnavailable:
+        print("No agent is running", file=sys.stderr)
+        return
+    try:
+        client.request("stop")
+    finally:
+        client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run or control the local HA agent")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="Serve the other scripts until interrupted")
+    run_parser.add_argument("--flush", type=float, default=5.0,
+                            help="Seconds between state snapshot rewrites (default: 5)")
+    sub.add_parser("status", help="Show whether an agent is running")
+    sub.add_parser("stop", help="Stop the running agent")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "run":
+            asyncio.run(run(args.flush))
+        elif args.command == "status":
+            session = get_session()
+            status = agent_status(session)
+            print(json.dumps(status or {"running": False, "socket": str(socket_path(session))}, indent=2))
+        elif args.command == "stop":
+            stop()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
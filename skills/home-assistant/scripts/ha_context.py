@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# /// script
+# dependencies = [
+#   "homeassistant-api",
+#   "niquests",
+#   "websockets",
+# ]
+# ///
+"""
+Gather everything relevant to a topic or entity in one call.
+
+Usage:
+    uv run ha_context.py <topic> [--limit N] [--traces N] [--fresh] [--format json|compact|ndjson]
+
+Examples:
+    uv run ha_context.py "kitchen lights"          # Fuzzy topic, best 10 entities
+    uv run ha_context.py light.kitchen             # One entity
+    uv run ha_context.py "binary_sensor.*door*"    # Every matching entity
+    uv run ha_context.py motion --traces 10 --format json
+
+Replaces running the search, state, automation, trace, dashboard and
+service scripts one after another. The topic is resolved to entities the
+same way as ha_search_similar_entities.py (or as an entity_id/wildcard if
+it looks like one), then the bundle holds:
+
+- ha: version, location and time zone
+- entities: state, friendly name, area and device of each match
+- automations: the matched automations plus every automation that
+  triggers on, checks or acts on a matched entity (from the entity graph)
+- traces: the most recent --traces runs (default 5) of each of those
+  automations
+- dashboards: where the matched entities are shown (dashboard, view, card)
+- services: service names for the matched entities' domains
+
+All sources are fetched concurrently in this one process, over one HTTP
+pool and one WebSocket, and the caches the individual scripts use are read
+and refreshed as usual. The default output is compact JSON.
+
+Requires HA_TOKEN environment variable to be set.
+"""
+
+import sys
+import asyncio
+import argparse
+import fnmatch
+from halib.automations import AutomationConfigCache
+from halib.cache import RegistryCache, StateCache
+from halib.dashboards import DashboardCache, build_index, find_entity
+from halib.graph import EntityGraph
+from halib.output import add_format_argument, write
+from halib.search import search
+from halib.services import ServiceCatalog
+from halib.session import get_session
+from halib.timefmt import format_timestamp, to_epoch
+
+DEFAULT_LIMIT = 10
+DEFAULT_TRACES = 5
+
+
+def match_entities(topic, states, locations, limit):
+    """entity_ids for a topic: exact id, wildcard over ids, else fuzzy search."""
+    entity_ids = [state["entity_id"] for state in states]
+    if any(char in topic for char in "*?["):
+        return sorted(fnmatch.filter(entity_ids, topic))
+    if topic in set(entity_ids):
+        return [topic]
+    return [entity_id for _, entity_id in search(states, locations, topic, limit=limit)]
+
+
+def recent_runs(traces, entity_ids_by_item, per_automation):
+    """The newest runs of each automation in {item_id: entity_id}, newest first."""
+    by_item = {}
+    for trace in traces or []:
+        if trace.get("item_id") in entity_ids_by_item:
+            by_item.setdefault(trace["item_id"], []).append(trace)
+
+    runs = []
+    for item_traces in by_item.values():
+        item_traces.sort(key=lambda trace: to_epoch(trace.get("timestamp", {}).get("start")) or 0, reverse=True)
+        runs.extend(item_traces[:per_automation])
+    runs.sort(key=lambda trace: to_epoch(trace.get("timestamp", {}).get("start")) or 0, reverse=True)
+    return [
+        {
+            "automation_id": entity_ids_by_item[trace["item_id"]],
+            "run_id": trace.get("run_id"),
+            "timestamp": format_timestamp(trace.get("timestamp", {}).get("start")),
+            "script_execution": trace.get("script_execution"),
+            "last_step": trace.get("last_step"),
+            "error": trace.get("error"),
+        }
+        for trace in runs
+    ]
+
+
+async def gather_context(topic, limit=DEFAULT_LIMIT, traces_per_automation=DEFAULT_TRACES, fresh=False):
+    session = get_session()
+    try:
+        websocket = await session.websocket()
+
+        # Everything that doesn't depend on which entities match. The config
+        # comes over the WebSocket (same payload as /api/config), so a warm
+        # run makes no REST request and never loads the HTTP client.
+        config, states, locations, dashboards, traces = await asyncio.gather(
+            websocket.call("get_config"),
+            StateCache(session).states_async(fresh=fresh),
+            RegistryCache(session).locations_async(fresh=fresh),
+            DashboardCache(session).configs_async(fresh=fresh),
+            websocket.call("trace/list", domain="automation"),
+        )
+
+        entity_ids = match_entities(topic, states, locations, limit)
+        domains = sorted({entity_id.split(".", 1)[0] for entity_id in entity_ids})
+
+        # Automation configs (for the graph) and the service slices
+        (automations, _), services = await asyncio.gather(
+            AutomationConfigCache(session).sync_async(states, fresh=fresh),
+            ServiceCatalog(session).slices_async(domains, fresh=fresh, config=config),
+        )
+    finally:
+        await session.aclose()
+
+    graph = EntityGraph(session)
+    graph.update(automations, dashboards)
+
+    by_id = {state["entity_id"]: state for state in states}
+    matched = set(entity_ids)
+
+    related = {entity_id: [] for entity_id in entity_ids if entity_id.startswith("automation.")}
+    for entity_id in entity_ids:
+        for reference in graph.lookup(entity_id)["used_by"]:
+            if reference["source"].startswith("automation."):
+                related.setdefault(reference["source"], []).append(
+                    {"relation": reference["relation"], "entity_id": entity_id}
+                )
+
+    automation_records = []
+    for automation_id, references in related.items():
+        state = by_id.get(automation_id, {})
+        attributes = state.get("attributes", {})
+        automation_records.append({
+            "entity_id": automation_id,
+            "id": attributes.get("id"),
+            "friendly_name": attributes.get("friendly_name"),
+            "state": state.get("state"),
+            "last_triggered": format_timestamp(attributes.get("last_triggered")),
+            "matched": automation_id in matched,
+            "references": references,
+        })
+
+    entity_ids_by_item = {record["id"]: record["entity_id"] for record in automation_records if record["id"]}
+    dashboard_index = build_index(dashboards)
+
+    return {
+        "query": topic,
+        "ha": {key: config.get(key) for key in ("version", "location_name", "time_zone")},
+        "entities": [
+            {
+                "entity_id": entity_id,
+                "friendly_name": by_id[entity_id].get("attributes", {}).get("friendly_name"),
+                "state": by_id[entity_id].get("state"),
+                "area": locations.get(entity_id, {}).get("area"),
+                "device": locations.get(entity_id, {}).get("device"),
+                "last_changed": format_timestamp(by_id[entity_id].get("last_changed")),
+            }
+            for entity_id in entity_ids
+        ],
+        "automations": automation_records,
+        "traces": recent_runs(traces, entity_ids_by_item, traces_per_automation),
+        "dashboards": [
+            {key: record[key] for key in ("entity_id", "dashboard", "view", "card")}
+            for entity_id in entity_ids
+            for record in find_entity(dashboard_index, entity_id)
+        ],
+        "services": {domain: sorted(domain_services) for domain, domain_services in services.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gather entities, automations, traces, dashboards and services for a topic")
+    parser.add_argument("topic", help="Search text, entity_id or entity_id wildcard")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT,
+                        help=f"Entities to keep from a fuzzy search (default: {DEFAULT_LIMIT})")
+    parser.add_argument("--traces", type=int, default=DEFAULT_TRACES,
+                        help=f"Recent runs to include per automation (default: {DEFAULT_TRACES})")
+    parser.add_argument("--fresh", action="store_true", help="Bypass every cache")
+    add_format_argument(parser, default="compact")
+    args = parser.parse_args()
+
+    try:
+        bundle = asyncio.run(gather_context(args.topic, args.limit, args.traces, fresh=args.fresh))
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if not bundle["entities"]:
+        print(f"No entities found matching '{args.topic}'", file=sys.stderr)
+        sys.exit(1)
+    write(bundle, args.format)
+
+
+if __name__ == "__main__":
+    main()
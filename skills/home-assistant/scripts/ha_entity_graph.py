@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# /// script
+# dependencies = [
+#   "homeassistant-api",
+#   "niquests",
+#   "websockets",
+# ]
+# ///
+"""
+Look up what references an entity, and what an automation or dashboard references.
+
+Usage:
+    uv run ha_entity_graph.py NODE [NODE ...] [--fresh] [--format json|compact|ndjson]
+    uv run ha_entity_graph.py --status [--fresh]
+
+Examples:
+    uv run ha_entity_graph.py light.kitchen              # Automations/dashboards using it
+    uv run ha_entity_graph.py automation.motion_lights   # Everything the automation touches
+    uv run ha_entity_graph.py service:light.turn_on      # Who calls the service
+    uv run ha_entity_graph.py dashboard:lovelace         # Entities on the default dashboard
+    uv run ha_entity_graph.py "binary_sensor.*door*"     # Wildcards match every node
+    uv run ha_entity_graph.py --status                   # Graph size and age
+
+Each node is written as {"node", "uses": [{relation, target}], "used_by":
+[{relation, source}]}. Relations are triggered_by, checks and acts_on
+(automation → entity in a trigger, condition or action), calls (automation
+or dashboard → service:domain.name) and displays (dashboard → entity).
+
+The graph is cached (see halib/graph.py). Every run refreshes it
+incrementally: automations whose last_updated changed are refetched and
+re-extracted, dashboards are re-read when older than HA_REGISTRY_TTL, and
+everything else is reused. --fresh refetches every config.
+
+Requires HA_TOKEN environment variable to be set.
+"""
+
+import sys
+import asyncio
+import argparse
+from halib.automations import AutomationConfigCache
+from halib.cache import get_states
+from halib.dashboards import DashboardCache
+from halib.graph import EntityGraph
+from halib.output import add_format_argument, write, write_records
+from halib.session import get_session
+
+
+def build_graph(fresh=False):
+    """Sync the automation and dashboard configs and update the cached graph."""
+    session = get_session()
+    states = get_states(fresh=fresh)
+
+    async def fetch():
+        # Both syncs share the session's one WebSocket connection
+        try:
+            (automations, _), dashboards = await asyncio.gather(
+                AutomationConfigCache(session).sync_async(states, fresh=fresh),
+                DashboardCache(session).configs_async(fresh=fresh),
+            )
+            return automations, dashboards
+        finally:
+            await session.aclose()
+
+    automations, dashboards = asyncio.run(fetch())
+    graph = EntityGraph(session)
+    graph.update(automations, dashboards)
+    return graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up references between entities, automations, dashboards and services")
+    parser.add_argument("nodes", nargs="*", help="entity_id, dashboard:<url_path> or service:<domain.name> (wildcards allowed)")
+    parser.add_argument("--status", action="store_true", help="Show graph size and build time instead of a lookup")
+    parser.add_argument("--fresh", action="store_true", help="Refetch every automation and dashboard config")
+    add_format_argument(parser)
+    args = parser.parse_args()
+
+    if not args.nodes and not args.status:
+        parser.error("give at least one node, or --status")
+
+    try:
+        graph = build_graph(fresh=args.fresh)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.status:
+        write(graph.status(), args.format)
+        return
+
+    matched = []
+    for pattern in args.nodes:
+        nodes = graph.match(pattern)
+        if not nodes:
+            print(f"No references to or from '{pattern}'", file=sys.stderr)
+        matched.extend(nodes)
+
+    if not matched:
+        sys.exit(1)
+    write_records((graph.lookup(node) for node in dict.fromkeys(matched)), args.format)
+
+
+if __name__ == "__main__":
+    main()
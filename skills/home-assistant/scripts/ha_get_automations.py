@@ -2,93 +2,155 @@
 # /// script
 # dependencies = [
 #   "homeassistant-api",
+#   "niquests",
+#   "websockets",
 # ]
 # ///
 """
 Retrieve all automations from Home Assistant with their configurations.
 
 Usage:
-    uv run ha_get_automations.py [search_term]
+    uv run ha_get_automations.py [search_term] [--fresh] [--fields a,b.c] [--format json|compact|ndjson]
+    uv run ha_get_automations.py [search_term] [--trigger-type T] [--trigger-entity E] [--condition-type T]
+                                 [--condition-entity E] [--service S] [--target E] [--entity E] [--configs]
 
 Examples:
     uv run ha_get_automations.py                    # All automations
     uv run ha_get_automations.py motion             # Automations with 'motion' in name
     uv run ha_get_automations.py light              # Automations with 'light' in name
+    uv run ha_get_automations.py --fresh            # Bypass the cached state snapshot
+    uv run ha_get_automations.py --fields entity_id,state,attributes.id,attributes.last_triggered
+    uv run ha_get_automations.py --service light.turn_on --target "*kitchen*"   # Turns on a kitchen light
+    uv run ha_get_automations.py --trigger-entity "binary_sensor.*motion*"
+    uv run ha_get_automations.py --condition-type sun --configs
+    uv run ha_get_automations.py --entity light.kitchen                     # Referenced anywhere
+
+The config filters search inside each automation's triggers, conditions and
+actions. They are answered from a local index over every automation config
+(see halib/automations.py): configs are fetched in one pipelined batch the
+first time, and afterwards only automations whose last_updated changed are
+refetched. Patterns accept * and ? wildcards; several filters must all
+match, and --service with --target must match on the same action.
+--configs adds each matching automation's config to its record.
 
 Requires HA_TOKEN environment variable to be set.
 """
 
-import os
 import sys
-import json
-from homeassistant_api import Client
-from datetime import datetime
-from zoneinfo import ZoneInfo
-
-HA_URL = "https://ha.cullen.rocks/api"
-MOUNTAIN_TZ = ZoneInfo("America/Denver")
-
-def convert_to_mountain_time(timestamp_str):
-    """Convert ISO timestamp string to Mountain Time formatted string."""
-    if not timestamp_str:
-        return None
-    try:
-        # Parse ISO timestamp (handles both +00:00 and Z formats)
-        dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        # Convert to Mountain Time
-        dt_mountain = dt.astimezone(MOUNTAIN_TZ)
-        # Return formatted string
-        return dt_mountain.strftime("%Y-%m-%d %H:%M:%S %Z")
-    except Exception:
-        return timestamp_str  # Return original if conversion fails
-
-def get_automations(search_term=None):
-    """Fetch all automation entities."""
-    token = os.environ.get("HA_TOKEN")
-    if not token:
-        print("Error: HA_TOKEN environment variable not set", file=sys.stderr)
-        sys.exit(1)
+import asyncio
+import argparse
+from halib.automations import AutomationConfigCache, AutomationIndex
+from halib.cache import get_states
+from halib.output import add_fields_argument, add_format_argument, project, write_records
+from halib.session import get_session
+from halib.timefmt import format_timestamp
+
+# --flag → AutomationIndex.query keyword
+CONFIG_FILTERS = {
+    "trigger_type": "trigger_types",
+    "trigger_entity": "trigger_entities",
+    "condition_type": "condition_types",
+    "condition_entity": "condition_entities",
+    "service": "services",
+    "target": "action_entities",
+    "entity": "entity",
+}
+
+def query_configs(states, filters, fresh=False):
+    """Sync the automation configs and return (matching entity_ids, configs)."""
+    session = get_session()
+
+    async def sync():
+        try:
+            return await AutomationConfigCache(session).sync_async(states, fresh=fresh)
+        finally:
+            await session.aclose()
+
+    automations, changed = asyncio.run(sync())
+    index = AutomationIndex(session)
+    index.update(automations, changed)
+    return index.query(**filters), automations
+
+def get_automations(search_term=None, fresh=False, fields=None, filters=None, with_configs=False):
+    """Fetch all automation entities.
 
+    Returns an iterator: each automation is filtered, projected to fields
+    and converted only as it is written. filters are AutomationIndex.query
+    keywords matched against each automation's config.
+    """
     try:
-        with Client(HA_URL, token) as client:
-            entities = client.get_states()
-
-            # Filter to automation entities
-            automations = [
-                entity.model_dump(mode='json') for entity in entities
-                if entity.entity_id.startswith("automation.")
-            ]
-
-            # Filter by search term if provided
-            if search_term:
-                search_term = search_term.lower()
-                automations = [
-                    a for a in automations
-                    if search_term in a["entity_id"].lower() or
-                       search_term in a.get("attributes", {}).get("friendly_name", "").lower()
-                ]
-
-            # Convert timestamps to Mountain Time
-            for automation in automations:
-                # Convert last_triggered in attributes
-                if "attributes" in automation and "last_triggered" in automation["attributes"]:
-                    automation["attributes"]["last_triggered"] = convert_to_mountain_time(
-                        automation["attributes"]["last_triggered"]
-                    )
-                # Convert top-level timestamps
-                for field in ["last_changed", "last_updated", "last_reported"]:
-                    if field in automation:
-                        automation[field] = convert_to_mountain_time(automation[field])
-
-            return automations
+        entities = get_states(fresh=fresh)
+        matching = configs = None
+        if filters or with_configs:
+            matching, configs = query_configs(entities, filters or {}, fresh=fresh)
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
+    search_term = search_term.lower() if search_term else None
+
+    for entity in entities:
+        if not entity["entity_id"].startswith("automation."):
+            continue
+        if matching is not None and entity["entity_id"] not in matching:
+            continue
+
+        # Filter by search term if provided
+        if search_term and not (
+            search_term in entity["entity_id"].lower() or
+            search_term in entity.get("attributes", {}).get("friendly_name", "").lower()
+        ):
+            continue
+
+        # Shallow copy: the timestamp conversion below rewrites fields in place
+        if fields:
+            automation = project(entity, fields)
+            if "attributes" in automation:
+                automation["attributes"] = dict(automation["attributes"])
+        else:
+            automation = {**entity, "attributes": dict(entity.get("attributes", {}))}
+
+        # Convert timestamps to local time
+        # Convert last_triggered in attributes
+        if "last_triggered" in automation.get("attributes", {}):
+            automation["attributes"]["last_triggered"] = format_timestamp(
+                automation["attributes"]["last_triggered"]
+            )
+        # Convert top-level timestamps
+        for field in ["last_changed", "last_updated", "last_reported"]:
+            if field in automation:
+                automation[field] = format_timestamp(automation[field])
+
+        if with_configs:
+            automation["config"] = configs.get(entity["entity_id"], {}).get("config")
+
+        yield automation
+
 def main():
-    search_term = sys.argv[1] if len(sys.argv) > 1 else None
-    automations = get_automations(search_term)
-    print(json.dumps(automations, indent=2))
+    parser = argparse.ArgumentParser(description="Retrieve automations from Home Assistant")
+    parser.add_argument("search_term", nargs="?", help="Only return automations whose id or name contains this")
+    parser.add_argument("--fresh", action="store_true", help="Bypass the cached state snapshot and automation configs")
+    parser.add_argument("--trigger-type", help="Has a trigger of this type (state, time, sun, ...)")
+    parser.add_argument("--trigger-entity", help="Triggers on this entity (wildcards allowed)")
+    parser.add_argument("--condition-type", help="Has a condition of this type (state, numeric_state, template, ...)")
+    parser.add_argument("--condition-entity", help="Checks this entity in a condition (wildcards allowed)")
+    parser.add_argument("--service", help="Calls this action/service, e.g. light.turn_on (wildcards allowed)")
+    parser.add_argument("--target", help="Targets this entity in a service call (wildcards allowed)")
+    parser.add_argument("--entity", help="References this entity anywhere (wildcards allowed)")
+    parser.add_argument("--configs", action="store_true", help="Include each automation's config")
+    add_fields_argument(parser)
+    add_format_argument(parser)
+    args = parser.parse_args()
+
+    filters = {
+        keyword: getattr(args, option)
+        for option, keyword in CONFIG_FILTERS.items()
+        if getattr(args, option) is not None
+    }
+    automations = get_automations(
+        args.search_term, fresh=args.fresh, fields=args.fields, filters=filters, with_configs=args.configs
+    )
+    write_records(automations, args.format)
 
 if __name__ == "__main__":
     main()
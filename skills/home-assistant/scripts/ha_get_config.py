@@ -1,43 +1,37 @@
 #!/usr/bin/env python3
 # /// script
 # dependencies = [
-#   "homeassistant-api",
+#   "niquests",
 # ]
 # ///
 """
 Get Home Assistant configuration including available integrations and domains.
 
 Usage:
-    uv run ha_get_config.py
+    uv run ha_get_config.py [--format json|compact|ndjson]
 
 Requires HA_TOKEN environment variable to be set.
 """
 
-import os
 import sys
-import json
-from homeassistant_api import Client
-
-HA_URL = "https://ha.cullen.rocks/api"
+import argparse
+from halib.output import add_format_argument, write
+from halib.session import get_session
 
 def get_config():
     """Fetch Home Assistant configuration."""
-    token = os.environ.get("HA_TOKEN")
-    if not token:
-        print("Error: HA_TOKEN environment variable not set", file=sys.stderr)
-        sys.exit(1)
-
     try:
-        with Client(HA_URL, token) as client:
-            config = client.get_config()
-            return config
+        return get_session().get_json("/api/config")
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
 def main():
-    config = get_config()
-    print(json.dumps(config, indent=2))
+    parser = argparse.ArgumentParser(description="Get Home Assistant configuration")
+    add_format_argument(parser)
+    args = parser.parse_args()
+
+    write(get_config(), args.format)
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # /// script
 # dependencies = [
-#   "requests",
+#   "niquests",
 # ]
 # ///
 """
@@ -12,35 +12,20 @@ Usage:
     uv run ha_get_config_entries.py              # All config entries
     uv run ha_get_config_entries.py telegram_bot # Just Telegram bots
     uv run ha_get_config_entries.py mqtt         # Just MQTT entries
+    uv run ha_get_config_entries.py --format ndjson
 """
 
-import os
 import sys
-import json
-import requests
+import argparse
+from halib.output import add_format_argument, write_records
+from halib.session import get_session
 
-HA_URL = "https://ha.cullen.rocks"
-
-def get_config_entries(domain_filter=None):
+def get_config_entries(domain_filter=None, fmt="json"):
     """Get config entries, optionally filtered by domain."""
-    token = os.getenv("HA_TOKEN")
-    if not token:
-        print("Error: HA_TOKEN environment variable not set", file=sys.stderr)
-        sys.exit(1)
-
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-    }
+    session = get_session()
 
     try:
-        response = requests.get(
-            f"{HA_URL}/api/config/config_entries/entry",
-            headers=headers,
-            timeout=10
-        )
-        response.raise_for_status()
-        entries = response.json()
+        entries = session.get_json("/api/config/config_entries/entry")
 
         # Filter by domain if specified
         if domain_filter:
@@ -57,22 +42,27 @@ def get_config_entries(domain_filter=None):
             return
 
         # Format for easy use
-        result = []
-        for entry in entries:
-            result.append({
+        result = (
+            {
                 "config_entry_id": entry["entry_id"],
                 "title": entry.get("title", "Unknown"),
                 "domain": entry["domain"],
                 "state": entry.get("state", "unknown"),
                 "source": entry.get("source", "unknown")
-            })
+            }
+            for entry in entries
+        )
 
-        print(json.dumps(result, indent=2))
+        write_records(result, fmt)
 
-    except requests.exceptions.RequestException as e:
+    except Exception as e:
         print(f"Error fetching config entries: {e}", file=sys.stderr)
         sys.exit(1)
 
 if __name__ == "__main__":
-    domain = sys.argv[1] if len(sys.argv) > 1 else None
-    get_config_entries(domain)
+    parser = argparse.ArgumentParser(description="Get Home Assistant config entries")
+    parser.add_argument("domain", nargs="?", help="Only return entries for this integration domain")
+    add_format_argument(parser)
+    args = parser.parse_args()
+
+    get_config_entries(args.domain, args.format)
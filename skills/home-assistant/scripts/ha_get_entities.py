@@ -2,55 +2,57 @@
 # /// script
 # dependencies = [
 #   "homeassistant-api",
+#   "niquests",
 # ]
 # ///
 """
 Retrieve entities from Home Assistant.
 
 Usage:
-    uv run ha_get_entities.py [domain]
+    uv run ha_get_entities.py [domain] [--fresh] [--fields a,b.c] [--format json|compact|ndjson]
 
 Examples:
     uv run ha_get_entities.py light
     uv run ha_get_entities.py sensor
     uv run ha_get_entities.py          # All entities
+    uv run ha_get_entities.py --fresh  # Bypass the cached state snapshot
+    uv run ha_get_entities.py sensor --format ndjson   # One entity per line
+    uv run ha_get_entities.py light --fields entity_id,state,attributes.friendly_name
 
 Requires HA_TOKEN environment variable to be set.
 """
 
-import os
 import sys
-import json
-from homeassistant_api import Client
+import argparse
+from halib.cache import get_states
+from halib.output import add_fields_argument, add_format_argument, project, write_records
 
-HA_URL = "https://ha.cullen.rocks/api"
-
-def get_entities(domain=None):
-    """Fetch entities from Home Assistant, optionally filtered by domain."""
-    token = os.environ.get("HA_TOKEN")
-    if not token:
-        print("Error: HA_TOKEN environment variable not set", file=sys.stderr)
-        sys.exit(1)
+def get_entities(domain=None, fresh=False, fields=None):
+    """Fetch entities from Home Assistant, optionally filtered by domain.
 
+    Returns an iterator, so the filtered entities are never copied into a
+    second list before being written. With fields, each entity is reduced
+    to just those paths.
+    """
     try:
-        with Client(HA_URL, token) as client:
-            entities = client.get_states()
-
-            # Convert to dict format for JSON serialization (mode='json' handles datetime serialization)
-            entities_data = [entity.model_dump(mode='json') for entity in entities]
-
-            if domain:
-                entities_data = [e for e in entities_data if e["entity_id"].startswith(f"{domain}.")]
-
-            return entities_data
+        entities_data = get_states(fresh=fresh)
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
+    if domain:
+        entities_data = (e for e in entities_data if e["entity_id"].startswith(f"{domain}."))
+    return (project(e, fields) for e in entities_data)
+
 def main():
-    domain = sys.argv[1] if len(sys.argv) > 1 else None
-    entities = get_entities(domain)
-    print(json.dumps(entities, indent=2))
+    parser = argparse.ArgumentParser(description="Retrieve entities from Home Assistant")
+    parser.add_argument("domain", nargs="?", help="Only return entities in this domain")
+    parser.add_argument("--fresh", action="store_true", help="Bypass the cached state snapshot")
+    add_fields_argument(parser)
+    add_format_argument(parser)
+    args = parser.parse_args()
+
+    write_records(get_entities(args.domain, fresh=args.fresh, fields=args.fields), args.format)
 
 if __name__ == "__main__":
     main()
@@ -1,67 +1,52 @@
 #!/usr/bin/env python3
 # /// script
 # dependencies = [
-#   "homeassistant-api",
+#   "niquests",
 # ]
 # ///
 """
 Get all available Home Assistant services with their descriptions and fields.
 
 Usage:
-    uv run ha_get_services.py [domain]
+    uv run ha_get_services.py [domain] [--fresh] [--format json|compact|ndjson]
 
 Examples:
     uv run ha_get_services.py           # All services
     uv run ha_get_services.py light     # Just light services
     uv run ha_get_services.py climate   # Just climate services
 
+The catalog is cached per domain (see halib/services.py) and reused until
+the HA version or the set of loaded integrations changes; --fresh refetches
+it regardless.
+
 Requires HA_TOKEN environment variable to be set.
 """
 
-import os
 import sys
-import json
-from homeassistant_api import Client
-
-HA_URL = "https://ha.cullen.rocks/api"
+import argparse
+from halib.output import add_format_argument, write
+from halib.services import ServiceCatalog
 
-def get_services(domain=None):
+def get_services(domain=None, fresh=False):
     """Fetch available services, optionally filtered by domain."""
-    token = os.environ.get("HA_TOKEN")
-    if not token:
-        print("Error: HA_TOKEN environment variable not set", file=sys.stderr)
-        sys.exit(1)
-
     try:
-        with Client(HA_URL, token) as client:
-            # Get domains which contain the services
-            domains = client.get_domains()
-
-            if domain:
-                # Get specific domain
-                if domain in domains:
-                    domain_obj = domains[domain]
-                    # Get services from the domain
-                    services = {svc_name: svc.model_dump(mode='json') for svc_name, svc in domain_obj.services.items()}
-                    return {domain: services}
-                else:
-                    return {}
-
-            # Get all services from all domains
-            all_services = {}
-            for domain_name, domain_obj in domains.items():
-                services = {svc_name: svc.model_dump(mode='json') for svc_name, svc in domain_obj.services.items()}
-                all_services[domain_name] = services
-
-            return all_services
+        return ServiceCatalog().services(domain, fresh=fresh)
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
 def main():
-    domain = sys.argv[1] if len(sys.argv) > 1 else None
-    services = get_services(domain)
-    print(json.dumps(services, indent=2))
+    parser = argparse.ArgumentParser(description="Get Home Assistant services")
+    parser.add_argument("domain", nargs="?", help="Only return services in this domain")
+    parser.add_argument("--fresh", action="store_true", help="Refetch the catalog instead of using the cached copy")
+    add_format_argument(parser)
+    args = parser.parse_args()
+
+    services = get_services(args.domain, fresh=args.fresh)
+    if args.format == "ndjson":
+        # One line per domain
+        services = [{"domain": name, "services": domain_services} for name, domain_services in services.items()]
+    write(services, args.format)
 
 if __name__ == "__main__":
     main()
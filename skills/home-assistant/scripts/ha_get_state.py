@@ -2,57 +2,136 @@
 # /// script
 # dependencies = [
 #   "homeassistant-api",
+#   "niquests",
 # ]
 # ///
 """
-Get the state of a specific Home Assistant entity.
+Get the state of one or more Home Assistant entities.
+
+Each entity is fetched with its own GET /api/states/<entity_id>, all of
+them concurrently on the session's async HTTP pool, so the cost grows with
+the number of entities asked for rather than the size of the install. A
+single entity is one plain GET, without starting an event loop. Only a
+batch of SNAPSHOT_MIN_ENTITIES or more reads the cached state snapshot
+(when it is fresh) instead: parsing the whole table is then cheaper than
+that many requests.
 
 Usage:
-    uv run ha_get_state.py <entity_id>
+    uv run ha_get_state.py <entity_id> [entity_id ...] [--fresh] [--fields a,b.c] [--format json|compact|ndjson]
 
-Example:
+Examples:
     uv run ha_get_state.py light.living_room
+    uv run ha_get_state.py light.living_room sensor.outdoor_temperature
+    uv run ha_get_state.py sensor.outdoor_temperature --fields state,attributes.unit_of_measurement
+
+A single entity prints one object; several print a list in the order given.
 
 Requires HA_TOKEN environment variable to be set.
 """
 
-import os
 import sys
-import json
-from homeassistant_api import Client
+import argparse
+from halib.cache import peek_states, states_decode
+from halib.output import add_fields_argument, add_format_argument, project, write, write_records
+from halib.session import HTTPStatusError, get_session
 
-HA_URL = "https://ha.cullen.rocks/api"
+# Below this many entities, direct GETs beat parsing the full snapshot
+SNAPSHOT_MIN_ENTITIES = 20
 
-def get_state(entity_id):
-    """Fetch the state of a specific entity."""
-    token = os.environ.get("HA_TOKEN")
-    if not token:
-        print("Error: HA_TOKEN environment variable not set", file=sys.stderr)
-        sys.exit(1)
+def decode_state(state):
+    if states_decode() == "typed":
+        from homeassistant_api import State
+
+        return State.from_json(state).model_dump(mode='json')
+    return state
+
+def fetch_state(session, entity_id):
+    """Fetch a single entity, or None if it does not exist."""
+    try:
+        return decode_state(session.get_json(f"/api/states/{entity_id}"))
+    except HTTPStatusError as e:
+        if e.status_code == 404:
+            return None
+        raise
+
+async def fetch_state_async(session, entity_id):
+    """fetch_state on the async pool, to run alongside the others."""
+    try:
+        return decode_state(await session.get_json_async(f"/api/states/{entity_id}"))
+    except HTTPStatusError as e:
+        if e.status_code == 404:
+            return None
+        raise
+
+async def fetch_states(session, entity_ids):
+    import asyncio
 
     try:
-        with Client(HA_URL, token) as client:
-            # Get all states and filter for the requested entity_id
-            states = client.get_states()
-            entity = next((e for e in states if e.entity_id == entity_id), None)
-
-            if entity is None:
-                print(f"Error: Entity '{entity_id}' not found", file=sys.stderr)
-                sys.exit(1)
-
-            return entity.model_dump(mode='json')
-    except Exception as e:
-        print(f"Error: {e}", file=sys.stderr)
+        return await asyncio.gather(*(fetch_state_async(session, entity_id) for entity_id in entity_ids))
+    finally:
+        await session.aclose()
+
+def get_states(entity_ids, fresh=False):
+    """Fetch several entities concurrently. Returns (states, missing_ids)."""
+    entity_ids = list(dict.fromkeys(entity_ids))
+    found = {}
+
+    if not fresh and len(entity_ids) >= SNAPSHOT_MIN_ENTITIES:
+        snapshot = peek_states()
+        if snapshot is not None:
+            wanted = set(entity_ids)
+            found = {state["entity_id"]: state for state in snapshot if state["entity_id"] in wanted}
+
+    # Anything not in the snapshot (or everything, without one) is fetched directly
+    to_fetch = [entity_id for entity_id in entity_ids if entity_id not in found]
+    if to_fetch:
+        try:
+            if len(to_fetch) == 1:
+                results = [fetch_state(get_session(), to_fetch[0])]
+            else:
+                # Only several entities are worth asyncio and the async pool
+                import asyncio
+
+                results = asyncio.run(fetch_states(get_session(), to_fetch))
+            found.update((entity_id, state) for entity_id, state in zip(to_fetch, results) if state is not None)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    states = [found[entity_id] for entity_id in entity_ids if entity_id in found]
+    missing = [entity_id for entity_id in entity_ids if entity_id not in found]
+    return states, missing
+
+def get_state(entity_id, fresh=False):
+    """Fetch the state of a specific entity."""
+    states, missing = get_states([entity_id], fresh=fresh)
+
+    if missing:
+        print(f"Error: Entity '{entity_id}' not found", file=sys.stderr)
         sys.exit(1)
 
+    return states[0]
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: uv run ha_get_state.py <entity_id>", file=sys.stderr)
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Get the state of Home Assistant entities")
+    parser.add_argument("entity_ids", nargs="+", metavar="entity_id", help="Entity to look up")
+    parser.add_argument("--fresh", action="store_true", help="Bypass the cached state snapshot")
+    add_fields_argument(parser)
+    add_format_argument(parser)
+    args = parser.parse_args()
+
+    entity_ids = args.entity_ids
+    if len(entity_ids) == 1:
+        write(project(get_state(entity_ids[0], fresh=args.fresh), args.fields), args.format)
+        return
 
-    entity_id = sys.argv[1]
-    state = get_state(entity_id)
-    print(json.dumps(state, indent=2))
+    states, missing = get_states(entity_ids, fresh=args.fresh)
+    write_records((project(state, args.fields) for state in states), args.format)
+
+    for entity_id in missing:
+        print(f"Error: Entity '{entity_id}' not found", file=sys.stderr)
+    if missing:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
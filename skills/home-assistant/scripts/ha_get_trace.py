@@ -5,44 +5,64 @@
 # ]
 # ///
 """
-Get detailed trace for a specific automation run.
+Get detailed trace for a specific automation run, or every stored run in bulk.
 
 Usage:
-    uv run ha_get_trace.py <automation_id> <run_id>
+    uv run ha_get_trace.py <automation_id> <run_id> [--format json|compact|ndjson]
+    uv run ha_get_trace.py --bulk [automation_id ...] [--since TIME] [--until TIME] [--concurrency N]
+    uv run ha_get_trace.py --diff <automation_id> [failing_run_id [passing_run_id]]
+    uv run ha_get_trace.py --diff-files <failing.json> <passing.json>
 
-Example:
+    Either form takes --compact-trace.
+
+Examples:
     uv run ha_get_trace.py automation.notify_on_door_open 1ceef6b2b6f63a8745eb5dba3fe12f71
+    uv run ha_get_trace.py --bulk 1761430536701                        # Every stored run of one automation
+    uv run ha_get_trace.py --bulk 1761430536701 1761430536702          # Several automations
+    uv run ha_get_trace.py --bulk --since 2025-01-10T06:00 --until 2025-01-10T09:00   # All automations, time window
+    uv run ha_get_trace.py automation.notify_on_door_open 1ceef6b2b6f63a8745eb5dba3fe12f71 --compact-trace
+    uv run ha_get_trace.py --diff 1761430536701                        # Newest failure vs. the pass before it
+    uv run ha_get_trace.py --diff-files failed.json passed.json        # Two traces saved earlier
+
+Bulk mode lists the matching runs with one trace/list call, then fetches
+them with trace/get over one connection, --concurrency at a time
+(default 8). Each trace is written as one JSON line (NDJSON) as soon as it
+arrives, so output order follows completion, not start time. TIME is ISO
+8601; without an offset it is read in HA_TIMEZONE, the zone the output
+uses. --format json or compact
+in bulk mode collects every trace first and writes one array.
+
+--compact-trace rewrites each trace so that every step lists only the
+variables that changed since the previous step, with its time as
+milliseconds since the run started, and every repeated string (entity ids,
+services, step paths) is stored once in a "strings" table and referenced
+as "@<index>". Looping automations shrink the most. Run timestamps are
+left in ISO 8601 UTC so the step offsets stay exact.
+
+--diff compares two runs of one automation step by step: by default the
+newest failed run (an error, or stopped without finishing) against the
+newest passing run that started before it. Steps are matched up by path;
+each is reported as same, changed (with the result, error and variable
+fields that differ), only_failing or only_passing, and diverged_at names
+the first step that differs. Contexts and timestamps are ignored.
+--diff-files does the same for two traces saved from this script's
+output, either form (compact traces are expanded first), without
+contacting HA.
 
 Requires HA_TOKEN environment variable to be set.
 """
 
-import os
 import sys
 import json
 import asyncio
-import websockets
-from datetime import datetime
-from zoneinfo import ZoneInfo
-
-HA_URL = "wss://ha.cullen.rocks/api/websocket"
-MOUNTAIN_TZ = ZoneInfo("America/Denver")
-
-def convert_to_mountain_time(timestamp_str):
-    """Convert ISO timestamp string to Mountain Time formatted string."""
-    if not timestamp_str:
-        return None
-    try:
-        # Parse ISO timestamp (handles both +00:00 and Z formats)
-        dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        # Convert to Mountain Time
-        dt_mountain = dt.astimezone(MOUNTAIN_TZ)
-        # Return formatted string
-        return dt_mountain.strftime("%Y-%m-%d %H:%M:%S %Z")
-    except Exception:
-        return timestamp_str  # Return original if conversion fails
+import argparse
+from halib.output import add_format_argument, write, write_records
+from halib.session import HAError, get_session
+from halib.timefmt import format_timestamp, parse_time, to_epoch
+from halib.trace_steps import COMPACT_FORMAT, compact, diff_runs, expand, run_failed, run_passed
 
 def convert_trace_timestamps(trace):
-    """Convert timestamp fields in trace data to Mountain Time."""
+    """Convert timestamp fields in trace data to local time."""
     if not trace:
         return trace
 
@@ -50,94 +70,230 @@ def convert_trace_timestamps(trace):
     if "timestamp" in trace and isinstance(trace["timestamp"], dict):
         timestamp = trace["timestamp"]
         if "start" in timestamp:
-            timestamp["start"] = convert_to_mountain_time(timestamp["start"])
+            timestamp["start"] = format_timestamp(timestamp["start"])
         if "finish" in timestamp:
-            timestamp["finish"] = convert_to_mountain_time(timestamp["finish"])
+            timestamp["finish"] = format_timestamp(timestamp["finish"])
 
     return trace
 
-async def get_trace(automation_id, run_id):
+async def get_trace(automation_id, run_id, compact_trace=False):
     """Get detailed trace for a specific automation run."""
-    token = os.environ.get("HA_TOKEN")
-    if not token:
-        print("Error: HA_TOKEN environment variable not set", file=sys.stderr)
-        sys.exit(1)
+    session = get_session()
 
     try:
-        async with websockets.connect(HA_URL) as websocket:
-            # Step 1: Receive auth_required message
-            msg = await websocket.recv()
-            auth_msg = json.loads(msg)
-
-            if auth_msg.get("type") != "auth_required":
-                print(f"Error: Expected auth_required, got {auth_msg.get('type')}", file=sys.stderr)
-                sys.exit(1)
-
-            # Step 2: Send auth message
-            await websocket.send(json.dumps({
-                "type": "auth",
-                "access_token": token
-            }))
-
-            # Step 3: Receive auth response
-            msg = await websocket.recv()
-            auth_result = json.loads(msg)
-
-            if auth_result.get("type") != "auth_ok":
-                print(f"Error: Authentication failed: {auth_result}", file=sys.stderr)
-                sys.exit(1)
-
-            # Step 4: Send trace/get command
-            # Strip "automation." prefix if present
-            item_id = automation_id.replace("automation.", "")
-
-            command = {
-                "id": 1,
-                "type": "trace/get",
-                "domain": "automation",
-                "item_id": item_id,
-                "run_id": run_id
-            }
-
-            await websocket.send(json.dumps(command))
-
-            # Step 5: Receive response
-            msg = await websocket.recv()
-            response = json.loads(msg)
-
-            if not response.get("success"):
-                error = response.get("error", {})
-                print(f"Error: {error.get('message', 'Unknown error')}", file=sys.stderr)
-                sys.exit(1)
-
-            trace = response.get("result")
+        websocket = await session.websocket()
 
-            if not trace:
-                print(f"No trace found for {automation_id} run {run_id}", file=sys.stderr)
-                sys.exit(1)
+        # Strip "automation." prefix if present
+        item_id = automation_id.replace("automation.", "")
+
+        trace = await websocket.call(
+            "trace/get",
+            domain="automation",
+            item_id=item_id,
+            run_id=run_id
+        )
 
-            # Convert timestamps to Mountain Time
-            trace = convert_trace_timestamps(trace)
+        if not trace:
+            print(f"No trace found for {automation_id} run {run_id}", file=sys.stderr)
+            sys.exit(1)
 
-            return trace
+        if compact_trace:
+            return compact(trace)
+
+        # Convert timestamps to local time
+        trace = convert_trace_timestamps(trace)
+
+        return trace
 
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         import traceback
         traceback.print_exc(file=sys.stderr)
         sys.exit(1)
+    finally:
+        await session.aclose()
+
+def in_window(trace, since=None, until=None):
+    """Whether a trace/list entry started inside [since, until]."""
+    if since is None and until is None:
+        return True
+    started = to_epoch(trace.get("timestamp", {}).get("start"))
+    if started is None:
+        return False
+    return (since is None or started >= since.timestamp()) and (until is None or started <= until.timestamp())
+
+def pick_runs(listed, failing_run_id=None, passing_run_id=None):
+    """(failing, passing) trace/list entries to diff; either may be None."""
+    by_start = sorted(listed, key=lambda run: to_epoch(run.get("timestamp", {}).get("start")) or 0, reverse=True)
+
+    def by_id(run_id):
+        return next((run for run in by_start if run.get("run_id") == run_id), None)
+
+    failing = by_id(failing_run_id) if failing_run_id else next((run for run in by_start if run_failed(run)), None)
+    if passing_run_id:
+        return failing, by_id(passing_run_id)
+    if failing is None:
+        return None, None
+    passed = [run for run in by_start if run_passed(run) and run is not failing]
+    started = to_epoch(failing.get("timestamp", {}).get("start")) or 0
+    # The last pass before the failure, else the closest one after it
+    before = [run for run in passed if (to_epoch(run.get("timestamp", {}).get("start")) or 0) <= started]
+    return failing, (before[0] if before else passed[-1] if passed else None)
+
+async def diff_traces(automation_id, failing_run_id=None, passing_run_id=None):
+    """Step-level diff of a failing run against a passing one."""
+    session = get_session()
+
+    try:
+        websocket = await session.websocket()
+        item_id = automation_id.replace("automation.", "")
+        listed = await websocket.call("trace/list", domain="automation", item_id=item_id) or []
+
+        failing, passing = pick_runs(listed, failing_run_id, passing_run_id)
+        if failing is None:
+            raise HAError(f"run {failing_run_id} not found" if failing_run_id else f"no failed run stored for {automation_id}")
+        if passing is None:
+            raise HAError(f"run {passing_run_id} not found" if passing_run_id else f"no passing run stored for {automation_id}")
+
+        failing_trace, passing_trace = await websocket.call_many([
+            ("trace/get", {"domain": "automation", "item_id": item_id, "run_id": run["run_id"]})
+            for run in (failing, passing)
+        ])
+        diff = diff_runs(failing_trace, passing_trace)
+        for run in (diff["failing"], diff["passing"]):
+            run["start"] = format_timestamp(run["start"])
+        return diff
+
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        await session.aclose()
+
+def load_trace_file(path):
+    """A trace saved from this script, in trace/get shape (compact ones expanded)."""
+    with open(path) as f:
+        trace = json.load(f)
+    return expand(trace) if trace.get("format") == COMPACT_FORMAT else trace
+
+def diff_trace_files(failing_path, passing_path):
+    """Step-level diff of two saved traces."""
+    try:
+        diff = diff_runs(load_trace_file(failing_path), load_trace_file(passing_path))
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    for run in (diff["failing"], diff["passing"]):
+        run["start"] = format_timestamp(run["start"])
+    return diff
+
+async def bulk_traces(automation_ids=(), since=None, until=None, concurrency=8, fmt="ndjson", compact_traces=False):
+    """Stream every matching stored trace to stdout as NDJSON. Returns the count."""
+    session = get_session()
+
+    try:
+        websocket = await session.websocket()
+
+        # One trace/list covers every automation; narrow it server-side when
+        # there is exactly one, otherwise filter here.
+        item_ids = {automation_id.replace("automation.", "") for automation_id in automation_ids}
+        command = {"domain": "automation"}
+        if len(item_ids) == 1:
+            command["item_id"] = next(iter(item_ids))
+        listed = await websocket.call("trace/list", **command) or []
+
+        runs = [
+            trace for trace in listed
+            if (not item_ids or trace.get("item_id") in item_ids) and in_window(trace, since, until)
+        ]
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(run):
+            async with semaphore:
+                try:
+                    return await websocket.call(
+                        "trace/get",
+                        domain="automation",
+                        item_id=run["item_id"],
+                        run_id=run["run_id"]
+                    )
+                except HAError as e:
+                    # Runs can age out between trace/list and trace/get
+                    print(f"Warning: skipped {run['item_id']} run {run['run_id']}: {e}", file=sys.stderr)
+                    return None
+
+        written = 0
+        collected = []
+        for next_trace in asyncio.as_completed([fetch(run) for run in runs]):
+            trace = await next_trace
+            if not trace:
+                continue
+            trace = compact(trace) if compact_traces else convert_trace_timestamps(trace)
+            if fmt == "ndjson":
+                write(trace, fmt)
+                sys.stdout.flush()
+            else:
+                collected.append(trace)
+            written += 1
+
+        if fmt != "ndjson":
+            # An empty result is still a JSON array
+            write_records(collected, fmt)
+        return written
+
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        await session.aclose()
 
 def main():
-    if len(sys.argv) < 3:
+    parser = argparse.ArgumentParser(description="Get automation traces from Home Assistant")
+    parser.add_argument("ids", nargs="*", metavar="id",
+                        help="<automation_id> <run_id>, or with --bulk any number of automation_ids")
+    parser.add_argument("--bulk", action="store_true", help="Fetch every stored run as NDJSON")
+    parser.add_argument("--diff", action="store_true",
+                        help="<automation_id> [failing_run_id [passing_run_id]]: diff a failing run against a passing one")
+    parser.add_argument("--diff-files", nargs=2, metavar=("FAILING", "PASSING"),
+                        help="Diff two traces saved from this script (plain or --compact-trace)")
+    parser.add_argument("--compact-trace", action="store_true",
+                        help="Variables as per-step deltas and repeated strings interned")
+    parser.add_argument("--since", type=parse_time, help="Bulk: only runs started at or after this time")
+    parser.add_argument("--until", type=parse_time, help="Bulk: only runs started at or before this time")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Bulk: trace/get requests in flight at once (default: 8)")
+    add_format_argument(parser, default=None, help="Output format (default: json, or ndjson with --bulk)")
+    args = parser.parse_args()
+
+    if args.diff_files:
+        write(diff_trace_files(*args.diff_files), args.format or "json")
+        return
+
+    if args.diff:
+        if not 1 <= len(args.ids) <= 3:
+            print("Usage: uv run ha_get_trace.py --diff <automation_id> [failing_run_id [passing_run_id]]", file=sys.stderr)
+            sys.exit(1)
+        write(asyncio.run(diff_traces(*args.ids)), args.format or "json")
+        return
+
+    if args.bulk:
+        written = asyncio.run(bulk_traces(
+            args.ids, args.since, args.until, max(args.concurrency, 1), args.format or "ndjson", args.compact_trace
+        ))
+        if not written:
+            print("No traces found", file=sys.stderr)
+        return
+
+    if len(args.ids) != 2:
         print("Usage: uv run ha_get_trace.py <automation_id> <run_id>", file=sys.stderr)
         print("\nTip: Use ha_list_traces.py to find run_ids for an automation", file=sys.stderr)
         sys.exit(1)
 
-    automation_id = sys.argv[1]
-    run_id = sys.argv[2]
+    automation_id, run_id = args.ids
 
-    trace = asyncio.run(get_trace(automation_id, run_id))
-    print(json.dumps(trace, indent=2))
+    trace = asyncio.run(get_trace(automation_id, run_id, args.compact_trace))
+    write(trace, args.format or "json")
 
 if __name__ == "__main__":
     main()
@@ -8,135 +8,145 @@
 List automation traces from Home Assistant.
 
 Usage:
-    uv run ha_list_traces.py [automation_id]
+    uv run ha_list_traces.py [automation_id] [--limit N] [--since TIME] [--until TIME] [--archive] [--format json|compact|ndjson]
 
 Examples:
     uv run ha_list_traces.py                                    # All automation traces
     uv run ha_list_traces.py automation.notify_on_door_open     # Traces for specific automation
+    uv run ha_list_traces.py 1761430536701 --archive            # Every run in the local archive
+    uv run ha_list_traces.py --limit 20                         # The 20 most recent runs
+    uv run ha_list_traces.py --since 2025-01-10T06:00 --until 2025-01-10T09:00
+
+Runs are ordered newest first by their actual start instant. --limit picks
+the newest N with a heap instead of sorting everything, and only the runs
+that are output get their timestamps formatted. TIME is ISO 8601; without
+an offset it is read in HA_TIMEZONE, the zone the output uses. With
+--archive the window and limit are applied by the database query.
+
+--archive reads the local trace archive (see ha_trace_archive.py) instead of
+the server, so it covers every run synced so far rather than the last few.
 
 Requires HA_TOKEN environment variable to be set.
 """
 
-import os
 import sys
-import json
+import heapq
 import asyncio
-import websockets
-from datetime import datetime
-from zoneinfo import ZoneInfo
-
-HA_URL = "wss://ha.cullen.rocks/api/websocket"
-MOUNTAIN_TZ = ZoneInfo("America/Denver")
-
-def convert_to_mountain_time(timestamp_str):
-    """Convert ISO timestamp string to Mountain Time formatted string."""
-    if not timestamp_str:
-        return None
+import argparse
+from halib.output import add_format_argument, write_records
+from halib.session import get_session
+from halib.timefmt import format_timestamps, parse_time, to_epoch
+from halib.trace_store import TraceStore
+
+def select_traces(result, since=None, until=None, limit=None):
+    """The runs started inside [since, until] (epoch seconds), newest first.
+
+    Runs without a start time sort last. With limit, the newest N are picked
+    with a heap rather than a full sort.
+    """
+    keyed = []
+    for trace in result:
+        started = to_epoch(trace.get("timestamp", {}).get("start"))
+        if since is not None or until is not None:
+            if started is None or (since is not None and started < since) or (until is not None and started > until):
+                continue
+        keyed.append((float("-inf") if started is None else started, trace))
+
+    def newest(entry):
+        return entry[0]
+
+    if limit:
+        selected = heapq.nlargest(limit, keyed, key=newest)
+    else:
+        selected = sorted(keyed, key=newest, reverse=True)
+    return [trace for _, trace in selected]
+
+def format_traces(result, automation_id=None, since=None, until=None, limit=None):
+    """Turn trace/list entries into the readable listing, most recent first."""
+    result = select_traces(result or [], since, until, limit)
+    if not result:
+        if automation_id:
+            print(f"No traces found for automation: {automation_id}")
+        else:
+            print("No traces found")
+        return []
+
+    # Start times are converted as one column, after selection
+    start_times = format_timestamps(trace.get("timestamp", {}).get("start") for trace in result)
+
+    # Format trace data for readability
+    formatted_traces = []
+    for trace, start_time in zip(result, start_times):
+        item_id = trace.get("item_id")
+        formatted_traces.append({
+            "automation_id": f"automation.{item_id}" if item_id else "unknown",
+            "run_id": trace.get("run_id"),
+            "timestamp": start_time,
+            "state": trace.get("state"),
+            "script_execution": trace.get("script_execution"),
+            "last_step": trace.get("last_step"),
+            "error": trace.get("error")
+        })
+
+    return formatted_traces
+
+def list_archived_traces(automation_id=None, since=None, until=None, limit=None):
+    """List traces from the local archive instead of the server."""
+    item_id = automation_id.replace("automation.", "") if automation_id else None
     try:
-        # Parse ISO timestamp (handles both +00:00 and Z formats)
-        dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        # Convert to Mountain Time
-        dt_mountain = dt.astimezone(MOUNTAIN_TZ)
-        # Return formatted string
-        return dt_mountain.strftime("%Y-%m-%d %H:%M:%S %Z")
-    except Exception:
-        return timestamp_str  # Return original if conversion fails
-
-async def list_traces(automation_id=None):
-    """List automation traces, optionally filtered by automation_id."""
-    token = os.environ.get("HA_TOKEN")
-    if not token:
-        print("Error: HA_TOKEN environment variable not set", file=sys.stderr)
+        with TraceStore() as store:
+            runs = list(store.runs(item_id, since=since, until=until, limit=limit))
+            return format_traces(runs, automation_id)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
+async def list_traces(automation_id=None, since=None, until=None, limit=None):
+    """List automation traces, optionally filtered by automation_id."""
+    session = get_session()
+
     try:
-        async with websockets.connect(HA_URL) as websocket:
-            # Step 1: Receive auth_required message
-            msg = await websocket.recv()
-            auth_msg = json.loads(msg)
-
-            if auth_msg.get("type") != "auth_required":
-                print(f"Error: Expected auth_required, got {auth_msg.get('type')}", file=sys.stderr)
-                sys.exit(1)
-
-            # Step 2: Send auth message
-            await websocket.send(json.dumps({
-                "type": "auth",
-                "access_token": token
-            }))
-
-            # Step 3: Receive auth response
-            msg = await websocket.recv()
-            auth_result = json.loads(msg)
-
-            if auth_result.get("type") != "auth_ok":
-                print(f"Error: Authentication failed: {auth_result}", file=sys.stderr)
-                sys.exit(1)
-
-            # Step 4: Send trace/list command
-            command = {
-                "id": 1,
-                "type": "trace/list",
-                "domain": "automation"
-            }
-
-            if automation_id:
-                # Strip "automation." prefix if present
-                item_id = automation_id.replace("automation.", "")
-                command["item_id"] = item_id
-
-            await websocket.send(json.dumps(command))
-
-            # Step 5: Receive response
-            msg = await websocket.recv()
-            response = json.loads(msg)
-
-            if not response.get("success"):
-                error = response.get("error", {})
-                print(f"Error: {error.get('message', 'Unknown error')}", file=sys.stderr)
-                sys.exit(1)
-
-            result = response.get("result", {})
-
-            if not result:
-                if automation_id:
-                    print(f"No traces found for automation: {automation_id}")
-                else:
-                    print("No traces found")
-                return []
-
-            # Format trace data for readability
-            formatted_traces = []
-            for trace in result:
-                item_id = trace.get("item_id")
-                start_time = trace.get("timestamp", {}).get("start")
-                formatted_traces.append({
-                    "automation_id": f"automation.{item_id}" if item_id else "unknown",
-                    "run_id": trace.get("run_id"),
-                    "timestamp": convert_to_mountain_time(start_time),
-                    "state": trace.get("state"),
-                    "script_execution": trace.get("script_execution"),
-                    "last_step": trace.get("last_step"),
-                    "error": trace.get("error")
-                })
-
-            # Sort by timestamp (most recent first)
-            formatted_traces.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-
-            return formatted_traces
+        websocket = await session.websocket()
+
+        command = {"domain": "automation"}
+
+        if automation_id:
+            # Strip "automation." prefix if present
+            item_id = automation_id.replace("automation.", "")
+            command["item_id"] = item_id
+
+        result = await websocket.call("trace/list", **command)
+
+        return format_traces(result, automation_id, since, until, limit)
 
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         import traceback
         traceback.print_exc(file=sys.stderr)
         sys.exit(1)
+    finally:
+        await session.aclose()
 
 def main():
-    automation_id = sys.argv[1] if len(sys.argv) > 1 else None
-    traces = asyncio.run(list_traces(automation_id))
+    parser = argparse.ArgumentParser(description="List automation traces from Home Assistant")
+    parser.add_argument("automation_id", nargs="?", help="Only list runs of this automation")
+    parser.add_argument("--limit", type=int, default=0, help="Only the N most recent runs (0 = all)")
+    parser.add_argument("--since", type=parse_time, help="Only runs started at or after this time")
+    parser.add_argument("--until", type=parse_time, help="Only runs started at or before this time")
+    parser.add_argument("--archive", action="store_true", help="Read the local trace archive instead of the server")
+    add_format_argument(parser)
+    args = parser.parse_args()
+
+    since = args.since.timestamp() if args.since else None
+    until = args.until.timestamp() if args.until else None
+
+    if args.archive:
+        traces = list_archived_traces(args.automation_id, since, until, args.limit)
+    else:
+        traces = asyncio.run(list_traces(args.automation_id, since, until, args.limit))
 
     if traces:
-        print(json.dumps(traces, indent=2))
+        write_records(traces, args.format)
 
 if __name__ == "__main__":
     main()
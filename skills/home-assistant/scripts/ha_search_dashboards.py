@@ -10,78 +10,51 @@ Search for Home Assistant dashboards by name or ID.
 Uses the WebSocket API since Lovelace dashboard endpoints are not available via REST.
 
 Usage:
-    uv run ha_search_dashboards.py [search_pattern]
+    uv run ha_search_dashboards.py [search_pattern] [--configs] [--format json|compact|ndjson]
+    uv run ha_search_dashboards.py --entity ENTITY_ID [--fresh]
+    uv run ha_search_dashboards.py --card-type TYPE [--fresh]
 
 Examples:
     uv run ha_search_dashboards.py                    # List all dashboards
     uv run ha_search_dashboards.py "phone"            # Search for dashboards with "phone" in the name
     uv run ha_search_dashboards.py "firetab8hd"       # Search for specific dashboard
+    uv run ha_search_dashboards.py "phone" --configs  # Full config of every match
+    uv run ha_search_dashboards.py --entity light.kitchen        # Where is light.kitchen shown?
+    uv run ha_search_dashboards.py --entity "binary_sensor.*door*"
+    uv run ha_search_dashboards.py --card-type custom:mushroom-light-card
+
+A single match always includes its full configuration. With --configs the
+configurations of all matches are fetched concurrently on one connection.
+
+The default output is annotated for reading; --format compact or ndjson
+writes only the dashboard records (with a "config" key where fetched).
+
+--entity and --card-type answer from a cached index over every dashboard's
+config (see halib/dashboards.py), listing each dashboard, view and card
+that matches. Patterns may use * and ? wildcards. The index is rebuilt when
+older than HA_REGISTRY_TTL (an hour) or with --fresh.
 
 Requires HA_TOKEN environment variable to be set.
 """
 
-import os
 import sys
 import json
 import asyncio
-import websockets
-
-HA_WS_URL = "wss://ha.cullen.rocks/api/websocket"
-
+import argparse
+from halib.dashboards import DashboardCache, find_card_type, find_entity
+from halib.output import add_format_argument, write_records
+from halib.session import HAError, get_session
 
-async def ws_connect_and_auth():
-    """Connect to HA WebSocket API and authenticate."""
-    token = os.environ.get("HA_TOKEN")
-    if not token:
-        print("Error: HA_TOKEN environment variable not set", file=sys.stderr)
-        sys.exit(1)
-
-    websocket = await websockets.connect(HA_WS_URL)
-
-    # Receive auth_required
-    msg = json.loads(await websocket.recv())
-    if msg.get("type") != "auth_required":
-        print(f"Error: Expected auth_required, got {msg.get('type')}", file=sys.stderr)
-        sys.exit(1)
-
-    # Send auth
-    await websocket.send(json.dumps({
-        "type": "auth",
-        "access_token": token
-    }))
-
-    # Receive auth response
-    msg = json.loads(await websocket.recv())
-    if msg.get("type") != "auth_ok":
-        print(f"Error: Authentication failed: {msg}", file=sys.stderr)
-        sys.exit(1)
-
-    return websocket
-
-
-async def ws_call(websocket, msg_id, msg_type, **kwargs):
-    """Send a WebSocket command and return the result."""
-    command = {"id": msg_id, "type": msg_type, **kwargs}
-    await websocket.send(json.dumps(command))
-
-    response = json.loads(await websocket.recv())
-    if not response.get("success"):
-        error = response.get("error", {})
-        print(f"Error from {msg_type}: {error.get('message', 'Unknown error')}", file=sys.stderr)
-        sys.exit(1)
 
-    return response.get("result")
-
-
-async def run(search_pattern=None):
+async def run(search_pattern=None, with_configs=False, fmt="json"):
     """List dashboards (optionally filtered) and fetch config for single matches."""
-    websocket = await ws_connect_and_auth()
-    msg_id = 1
+    session = get_session()
 
     try:
+        websocket = await session.websocket()
+
         # List all dashboards
-        dashboards = await ws_call(websocket, msg_id, "lovelace/dashboards/list")
-        msg_id += 1
+        dashboards = await websocket.call("lovelace/dashboards/list")
 
         if dashboards is None:
             dashboards = []
@@ -120,28 +93,100 @@ async def run(search_pattern=None):
         if len(dashboards) == 1:
             dashboard = dashboards[0]
             url_path = dashboard.get("url_path")
+            config = None
+            if url_path:
+                try:
+                    config = await websocket.call("lovelace/config", url_path=url_path)
+                except HAError:
+                    # No stored config (config_not_found): report config: null
+                    pass
+
+            if fmt != "json":
+                write_records([{**dashboard, "config": config}], fmt)
+                return
 
             print(f"Found dashboard: {dashboard.get('title', 'Untitled')} (url_path: {url_path})")
             print("\nDashboard metadata:")
             print(json.dumps(dashboard, indent=2))
 
             if url_path:
-                config = await ws_call(websocket, msg_id, "lovelace/config", url_path=url_path)
-                msg_id += 1
                 print(f"\n\nFull dashboard configuration:")
                 print(json.dumps(config, indent=2))
+        elif with_configs:
+            # All configs are requested at once and demultiplexed by message id
+            with_path = [d for d in dashboards if d.get("url_path")]
+            configs = await websocket.call_many(
+                (("lovelace/config", {"url_path": d["url_path"]}) for d in with_path), return_exceptions=True
+            )
+            # Same for each dashboard here: one without a config doesn't fail the rest
+            config_by_path = {
+                d["url_path"]: None if isinstance(config, Exception) else config
+                for d, config in zip(with_path, configs)
+            }
+            records = (
+                {**dashboard, "config": config_by_path.get(dashboard.get("url_path"))}
+                for dashboard in dashboards
+            )
+
+            if fmt != "json":
+                write_records(records, fmt)
+                return
+
+            print(f"Found {len(dashboards)} dashboard(s):\n")
+            for record in records:
+                print(json.dumps(record, indent=2))
+                print()
+        elif fmt != "json":
+            write_records(dashboards, fmt)
         else:
             print(f"Found {len(dashboards)} dashboard(s):\n")
             for dashboard in dashboards:
                 print(json.dumps(dashboard, indent=2))
                 print()
+    except HAError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
     finally:
-        await websocket.close()
+        await session.aclose()
+
+
+def lookup(entity=None, card_type=None, fresh=False, fmt="json"):
+    """Answer an --entity/--card-type query from the dashboard index."""
+    try:
+        index = DashboardCache().index(fresh=fresh)
+    except HAError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if entity:
+        records = find_entity(index, entity)
+    else:
+        records = find_card_type(index, card_type)
+
+    if not records:
+        print(f"No dashboards reference '{entity or card_type}'", file=sys.stderr)
+        sys.exit(1)
+    write_records(records, fmt)
 
 
 def main():
-    search_pattern = sys.argv[1] if len(sys.argv) > 1 else None
-    asyncio.run(run(search_pattern))
+    parser = argparse.ArgumentParser(description="Search for Home Assistant dashboards")
+    parser.add_argument("search_pattern", nargs="?", help="Text to match against id, title or url_path")
+    parser.add_argument("--configs", action="store_true",
+                        help="Include the full configuration of every matching dashboard")
+    parser.add_argument("--entity", help="List the dashboards/views/cards showing this entity (wildcards allowed)")
+    parser.add_argument("--card-type", help="List the dashboards/views using this card type (wildcards allowed)")
+    parser.add_argument("--fresh", action="store_true", help="Rebuild the dashboard index before an --entity/--card-type lookup")
+    add_format_argument(parser)
+    args = parser.parse_args()
+
+    if args.entity or args.card_type:
+        if args.entity and args.card_type:
+            parser.error("use --entity or --card-type, not both")
+        lookup(args.entity, args.card_type, fresh=args.fresh, fmt=args.format)
+        return
+
+    asyncio.run(run(args.search_pattern, with_configs=args.configs, fmt=args.format))
 
 
 if __name__ == "__main__":
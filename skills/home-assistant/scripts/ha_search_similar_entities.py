@@ -2,73 +2,79 @@
 # /// script
 # dependencies = [
 #   "homeassistant-api",
+#   "niquests",
+#   "websockets",
 # ]
 # ///
 """
 Search for entities similar to a given pattern or domain.
 Useful for finding examples when building automations.
 
+Matches are fuzzy and ranked: the pattern is compared against each
+entity's entity_id, friendly_name, area, device and domain by trigram
+overlap, so typos still find results and the best matches come first.
+With ha_agent.py running, the agent answers from an index it keeps in
+memory; otherwise the cached state snapshot is scanned.
+
 Usage:
-    uv run ha_search_similar_entities.py <pattern>
+    uv run ha_search_similar_entities.py <pattern> [--limit N] [--fresh] [--fields a,b.c] [--format json|compact|ndjson]
 
 Examples:
     uv run ha_search_similar_entities.py "bedroom light"
     uv run ha_search_similar_entities.py "motion"
     uv run ha_search_similar_entities.py "temperature"
+    uv run ha_search_similar_entities.py "kitchn" --limit 5    # Typos still match
+    uv run ha_search_similar_entities.py "motion" --fields entity_id,area,score
 
 Requires HA_TOKEN environment variable to be set.
 """
 
-import os
 import sys
-import json
-from homeassistant_api import Client
-
-HA_URL = "https://ha.cullen.rocks/api"
-
-def search_entities(pattern):
-    """Search for entities matching a pattern."""
-    token = os.environ.get("HA_TOKEN")
-    if not token:
-        print("Error: HA_TOKEN environment variable not set", file=sys.stderr)
-        sys.exit(1)
+import argparse
+from halib.cache import RegistryCache, get_states
+from halib.output import add_fields_argument, add_format_argument, project, write_records
+from halib.search import search
 
+def search_entities(pattern, limit=25, fresh=False, fields=None):
+    """Search for entities matching a pattern, best matches first."""
     try:
-        with Client(HA_URL, token) as client:
-            entities = client.get_states()
+        entities = get_states(fresh=fresh)
+        locations = RegistryCache().locations(fresh=fresh)
+        by_id = {entity["entity_id"]: entity for entity in entities}
+        matching = []
 
-            pattern_lower = pattern.lower()
-            matching = []
+        for score, entity_id in search(entities, locations, pattern, limit=limit):
+            entity_dict = by_id[entity_id]
+            location = locations.get(entity_id, {})
+            matching.append(project({
+                "entity_id": entity_id,
+                "friendly_name": entity_dict.get("attributes", {}).get("friendly_name", ""),
+                "state": entity_dict["state"],
+                "domain": entity_id.split(".")[0],
+                "area": location.get("area"),
+                "device": location.get("device"),
+                "score": score,
+                "attributes": entity_dict.get("attributes", {})
+            }, fields))
 
-            for entity in entities:
-                entity_dict = entity.model_dump(mode='json')
-                entity_id = entity_dict["entity_id"].lower()
-                friendly_name = entity_dict.get("attributes", {}).get("friendly_name", "").lower()
-
-                if pattern_lower in entity_id or pattern_lower in friendly_name:
-                    matching.append({
-                        "entity_id": entity_dict["entity_id"],
-                        "friendly_name": entity_dict.get("attributes", {}).get("friendly_name", ""),
-                        "state": entity_dict["state"],
-                        "domain": entity_dict["entity_id"].split(".")[0],
-                        "attributes": entity_dict.get("attributes", {})
-                    })
-
-            return matching
+        return matching
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: uv run ha_search_similar_entities.py <pattern>", file=sys.stderr)
-        sys.exit(1)
-
-    pattern = sys.argv[1]
-    matches = search_entities(pattern)
+    parser = argparse.ArgumentParser(description="Search for entities matching a pattern")
+    parser.add_argument("pattern", help="Text to look for in entity_id, friendly_name, area, device or domain")
+    parser.add_argument("--limit", type=int, default=25, help="Maximum results to return, 0 for all (default: 25)")
+    parser.add_argument("--fresh", action="store_true", help="Bypass the cached state snapshot and registries")
+    add_fields_argument(parser)
+    add_format_argument(parser)
+    args = parser.parse_args()
 
+    pattern = args.pattern
+    matches = search_entities(pattern, limit=args.limit, fresh=args.fresh, fields=args.fields)
     if matches:
-        print(json.dumps(matches, indent=2))
+        write_records(matches, args.format)
     else:
         print(f"No entities found matching '{pattern}'", file=sys.stderr)
 
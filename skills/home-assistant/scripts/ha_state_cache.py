@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# /// script
+# dependencies = [
+#   "homeassistant-api",
+#   "niquests",
+#   "websockets",
+# ]
+# ///
+"""
+Inspect and maintain the local /api/states snapshot used by the entity scripts.
+
+Usage:
+    uv run ha_state_cache.py status                 # Snapshot age, size and TTL
+    uv run ha_state_cache.py refresh                # Fetch a new snapshot now
+    uv run ha_state_cache.py clear                  # Delete the snapshot
+    uv run ha_state_cache.py follow [--flush 5]     # Keep it current from state_changed events
+
+`follow` runs until interrupted. It fetches one snapshot, then applies
+state_changed events to it and rewrites it every --flush seconds, so the
+entity scripts keep hitting the cache instead of refetching the full table.
+
+Requires HA_TOKEN environment variable to be set.
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from halib.cache import StateCache, apply_state_changed, read_json
+from halib.session import get_session
+
+def status():
+    """Describe the current snapshot."""
+    cache = StateCache()
+    snapshot = read_json(cache.path)
+    info = {"path": str(cache.path), "ttl_seconds": cache.ttl, "exists": snapshot is not None}
+    if snapshot:
+        age = time.time() - snapshot.get("synced_at", 0)
+        info.update({
+            "age_seconds": round(age, 1),
+            "fresh": 0 < cache.ttl and age <= cache.ttl,
+            "entities": len(snapshot.get("states", [])),
+        })
+    return info
+
+async def follow(flush_interval):
+    """Apply state_changed events to the snapshot until interrupted."""
+    session = get_session()
+    cache = StateCache(session)
+    next_event = None
+
+    try:
+        websocket = await session.websocket()
+        # Subscribe before fetching so no change between the two is lost;
+        # events queue on the socket while the snapshot downloads.
+        subscription = await websocket.subscribe("state_changed")
+        # Fetched on the loop so the WebSocket keeps answering pings meanwhile
+        states_by_id = {state["entity_id"]: state for state in await cache.fetch_async()}
+        print(f"Following state_changed with {len(states_by_id)} entities cached", file=sys.stderr)
+
+        events = websocket.events(subscription)
+        next_event = asyncio.ensure_future(anext(events))
+        pending = 0
+        deadline = time.monotonic() + flush_interval
+        while True:
+            # asyncio.wait (unlike wait_for) leaves the read running on
+            # timeout, so the event generator is never cancelled mid-recv.
+            done, _ = await asyncio.wait({next_event}, timeout=max(deadline - time.monotonic(), 0))
+            if done:
+                apply_state_changed(states_by_id, next_event.result())
+                pending += 1
+                next_event = asyncio.ensure_future(anext(events))
+
+            # Rewrite on every interval, even without changes, so the
+            # snapshot's age stays within readers' TTL.
+            if time.monotonic() >= deadline:
+                cache.store(list(states_by_id.values()))
+                if pending:
+                    print(f"Applied {pending} state change(s)", file=sys.stderr)
+                pending = 0
+                deadline = time.monotonic() + flush_interval
+    finally:
+        if next_event is not None:
+            next_event.cancel()
+        await session.aclose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local HA state snapshot")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Show snapshot age and size")
+    sub.add_parser("refresh", help="Fetch a new snapshot")
+    sub.add_parser("clear", help="Delete the snapshot")
+    follow_parser = sub.add_parser("follow", help="Keep the snapshot current from state_changed events")
+    follow_parser.add_argument("--flush", type=float, default=5.0,
+                               help="Seconds between snapshot rewrites (default: 5)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "status":
+            print(json.dumps(status(), indent=2))
+        elif args.command == "refresh":
+            states = StateCache().fetch()
+            print(f"Cached {len(states)} entities", file=sys.stderr)
+        elif args.command == "clear":
+            StateCache().clear()
+        elif args.command == "follow":
+            asyncio.run(follow(args.flush))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# /// script
+# dependencies = [
+#   "websockets",
+# ]
+# ///
+"""
+Stream live state changes, automation triggers and finished traces as NDJSON.
+
+Usage:
+    uv run ha_tail.py [--events KIND,...] [--entity ENTITY_ID ...] [--domain DOMAIN ...] [--buffer N]
+
+Examples:
+    uv run ha_tail.py                                           # Everything
+    uv run ha_tail.py --entity light.kitchen --entity automation.kitchen_motion
+    uv run ha_tail.py --domain automation --events automation_triggered,trace
+    uv run ha_tail.py --domain binary_sensor --events state_changed
+
+KIND is any of state_changed, automation_triggered and trace (default:
+all three). A trace line is written when a run started by an
+automation_triggered event has finished, so a misbehaving automation can be
+watched without re-running ha_list_traces.py.
+
+With --entity/--domain the filtering happens in Home Assistant: the tail
+subscribes to a subscribe_trigger list of state triggers (and
+automation_triggered event triggers) for exactly those entities, so
+unrelated changes never cross the socket. Domains are expanded to entity
+ids from the state snapshot.
+
+Runs until interrupted. All subscriptions share one connection and one
+buffer of --buffer events (default 10000); if output can't keep up, the
+oldest buffered events are dropped and a {"type": "dropped"} line says how
+many.
+
+Requires HA_TOKEN environment variable to be set.
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+from halib.cache import peek_states
+from halib.session import HAError, get_session
+from halib.websocket import EventBuffer
+
+EVENT_KINDS = ("state_changed", "automation_triggered", "trace")
+
+# How long to wait for a triggered run to finish before giving up on its trace
+TRACE_POLL_INTERVAL = 1.0
+TRACE_POLL_ATTEMPTS = 30
+
+def parse_kinds(value):
+    """argparse type for --events: a comma-separated subset of EVENT_KINDS."""
+    kinds = {kind.strip() for kind in value.split(",") if kind.strip()}
+    unknown = kinds - set(EVENT_KINDS)
+    if unknown or not kinds:
+        raise argparse.ArgumentTypeError(f"choose from {', '.join(EVENT_KINDS)}")
+    return kinds
+
+def state_line(entity_id, old_state, new_state, time_fired):
+    return {
+        "type": "state_changed",
+        "time": time_fired or (new_state or {}).get("last_updated"),
+        "entity_id": entity_id,
+        "from": (old_state or {}).get("state"),
+        "to": (new_state or {}).get("state"),
+    }
+
+def triggered_line(event):
+    data = event.get("data", {})
+    return {
+        "type": "automation_triggered",
+        "time": event.get("time_fired"),
+        "entity_id": data.get("entity_id"),
+        "name": data.get("name"),
+        "source": data.get("source"),
+    }
+
+def trace_line(run):
+    timestamp = run.get("timestamp", {})
+    return {
+        "type": "trace",
+        "automation_id": f"automation.{run.get('item_id')}",
+        "run_id": run.get("run_id"),
+        "start": timestamp.get("start"),
+        "finish": timestamp.get("finish"),
+        "state": run.get("state"),
+        "script_execution": run.get("script_execution"),
+        "last_step": run.get("last_step"),
+        "error": run.get("error"),
+    }
+
+def normalize(event):
+    """Turn a subscribe_events or subscribe_trigger payload into (kind, line)."""
+    if "variables" in event:
+        trigger = event["variables"].get("trigger", {})
+        if trigger.get("platform") == "state":
+            return "state_changed", state_line(
+                trigger.get("entity_id"), trigger.get("from_state"), trigger.get("to_state"), None
+            )
+        event = trigger.get("event") or {}
+
+    if event.get("event_type") == "state_changed":
+        data = event.get("data", {})
+        return "state_changed", state_line(
+            data.get("entity_id"), data.get("old_state"), data.get("new_state"), event.get("time_fired")
+        )
+    if event.get("event_type") == "automation_triggered":
+        return "automation_triggered", triggered_line(event)
+    return None, None
+
+def resolve_entities(states, entity_ids, domains):
+    """Explicit entity ids plus every known entity in the given domains."""
+    selected = set(entity_ids)
+    prefixes = tuple(f"{domain}." for domain in domains)
+    if prefixes:
+        selected.update(state["entity_id"] for state in states if state["entity_id"].startswith(prefixes))
+    return sorted(selected)
+
+class TraceFollower:
+    """Emit each triggered automation's new runs once they finish.
+
+    Memory stays bounded: per automation only the run_ids HA currently
+    lists are remembered, and at most one poll per automation is pending.
+    """
+
+    def __init__(self, websocket, emit):
+        self.websocket = websocket
+        self.emit = emit
+        self.seen = {}
+        self.polling = set()
+        self.tasks = set()
+
+    async def prime(self):
+        for run in await self.websocket.call("trace/list", domain="automation") or []:
+            self.seen.setdefault(run.get("item_id"), set()).add(run.get("run_id"))
+
+    def triggered(self, item_id):
+        if item_id is None or item_id in self.polling:
+            return
+        self.polling.add(item_id)
+        task = asyncio.create_task(self._poll(item_id))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _poll(self, item_id):
+        try:
+            for _ in range(TRACE_POLL_ATTEMPTS):
+                await asyncio.sleep(TRACE_POLL_INTERVAL)
+                runs = await self.websocket.call("trace/list", domain="automation", item_id=item_id) or []
+                seen = self.seen.get(item_id, set())
+                running = False
+                for run in sorted(runs, key=lambda run: run.get("timestamp", {}).get("start") or ""):
+                    if run.get("run_id") in seen:
+                        continue
+                    if run.get("state") == "running":
+                        running = True
+                        continue
+                    self.emit(trace_line(run))
+                sys.stdout.flush()
+                # Forget runs HA has rotated out; keep running ones unseen
+                self.seen[item_id] = {
+                    run.get("run_id") for run in runs if run.get("state") != "running"
+                }
+                if not running:
+                    return
+        except HAError as e:
+            print(f"Warning: trace lookup for {item_id} failed: {e}", file=sys.stderr)
+        finally:
+            self.polling.discard(item_id)
+
+    def cancel(self):
+        for task in self.tasks:
+            task.cancel()
+
+async def tail(kinds, entity_ids=(), domains=(), buffer_size=10000):
+    """Subscribe and write NDJSON lines until the connection drops."""
+    session = get_session()
+    follower = None
+    buffer = EventBuffer(buffer_size)
+
+    def emit(line):
+        sys.stdout.write(json.dumps(line) + "\n")
+
+    try:
+        websocket = await session.websocket()
+
+        states = []
+        if domains or "trace" in kinds:
+            states = peek_states() or await websocket.call("get_states")
+        automation_item_ids = {
+            state["entity_id"]: state["attributes"].get("id")
+            for state in states if state["entity_id"].startswith("automation.")
+        }
+
+        want_triggers = bool({"automation_triggered", "trace"} & kinds)
+        if entity_ids or domains:
+            selected = resolve_entities(states, entity_ids, domains)
+            if not selected:
+                print("Error: no entities match the given --entity/--domain filters", file=sys.stderr)
+                sys.exit(1)
+            triggers = []
+            if "state_changed" in kinds:
+                triggers.append({"platform": "state", "entity_id": selected})
+            if want_triggers:
+                triggers.extend(
+                    {"platform": "event", "event_type": "automation_triggered", "event_data": {"entity_id": entity_id}}
+                    for entity_id in selected if entity_id.startswith("automation.")
+                )
+            if not triggers:
+                print("Error: the filters select no entities for the requested event kinds", file=sys.stderr)
+                sys.exit(1)
+            subscription = await websocket.subscribe_trigger(triggers, queue=buffer)
+        else:
+            subscription = None
+            if "state_changed" in kinds:
+                subscription = await websocket.subscribe("state_changed", queue=buffer)
+            if want_triggers:
+                subscription = await websocket.subscribe("automation_triggered", queue=buffer)
+
+        if "trace" in kinds:
+            follower = TraceFollower(websocket, emit)
+            await follower.prime()
+
+        print(f"Tailing {', '.join(sorted(kinds))}", file=sys.stderr)
+
+        dropped = 0
+        # Everything buffered is written in one go, so a burst costs one
+        # flush rather than one per event.
+        async for batch in websocket.event_batches(subscription):
+            for event in batch:
+                kind, line = normalize(event)
+                if kind == "automation_triggered" and follower is not None:
+                    follower.triggered(automation_item_ids.get(line["entity_id"]))
+                if kind in kinds:
+                    emit(line)
+            if buffer.dropped != dropped:
+                emit({"type": "dropped", "count": buffer.dropped - dropped})
+                dropped = buffer.dropped
+            sys.stdout.flush()
+
+    except HAError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if follower is not None:
+            follower.cancel()
+        await session.aclose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream live Home Assistant events as NDJSON")
+    parser.add_argument("--events", type=parse_kinds, default=set(EVENT_KINDS),
+                        help=f"Comma-separated kinds to stream (default: {','.join(EVENT_KINDS)})")
+    parser.add_argument("--entity", action="append", default=[], help="Only this entity (repeatable)")
+    parser.add_argument("--domain", action="append", default=[], help="Only entities in this domain (repeatable)")
+    parser.add_argument("--buffer", type=int, default=10000,
+                        help="Events buffered before the oldest are dropped (default: 10000)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(tail(args.events, args.entity, args.domain, max(args.buffer, 1)))
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        # Reader went away (e.g. piped into head); silence the flush at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# /// script
+# dependencies = [
+#   "websockets",
+# ]
+# ///
+"""
+Maintain a local SQLite archive of automation traces.
+
+Home Assistant only keeps the last few runs per automation. Syncing
+regularly accumulates them locally, fetching only run_ids not already
+archived, so ha_list_traces.py and ha_trace_summary.py can look back over
+weeks of history with --archive. Runs archived with --no-details get their
+details on a later sync without it, as long as HA still holds them.
+
+Usage:
+    uv run ha_trace_archive.py sync [automation_id ...] [--concurrency N] [--no-details]
+    uv run ha_trace_archive.py status
+
+Examples:
+    uv run ha_trace_archive.py sync                      # New runs of every automation
+    uv run ha_trace_archive.py sync 1761430536701        # Just one automation
+    uv run ha_trace_archive.py sync --no-details         # Only trace/list summaries (faster)
+
+Requires HA_TOKEN environment variable to be set.
+"""
+
+import sys
+import json
+import asyncio
+import argparse
+from halib.session import get_session
+from halib.trace_store import TraceStore, sync_traces
+
+async def sync(automation_ids, concurrency, details):
+    """Archive any runs not yet stored."""
+    session = get_session()
+
+    try:
+        websocket = await session.websocket()
+        item_ids = [automation_id.replace("automation.", "") for automation_id in automation_ids]
+        with TraceStore() as store:
+            listed, added = await sync_traces(store, websocket, item_ids, concurrency, details)
+            return {"listed": listed, "added": added, **store.status()}
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        await session.aclose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the local automation trace archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sync_parser = sub.add_parser("sync", help="Archive runs not seen before")
+    sync_parser.add_argument("automation_ids", nargs="*", metavar="automation_id",
+                             help="Only sync these automations (default: all)")
+    sync_parser.add_argument("--concurrency", type=int, default=8,
+                             help="trace/get requests in flight at once (default: 8)")
+    sync_parser.add_argument("--no-details", action="store_true",
+                             help="Store trace/list summaries only, skip trace/get")
+    sub.add_parser("status", help="Show what the archive holds")
+    args = parser.parse_args()
+
+    if args.command == "sync":
+        result = asyncio.run(sync(args.automation_ids, max(args.concurrency, 1), not args.no_details))
+    else:
+        with TraceStore() as store:
+            result = store.status()
+
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -8,99 +8,181 @@
 Get summary statistics for automation runs from traces.
 
 Usage:
-    uv run ha_trace_summary.py <automation_id>
+    uv run ha_trace_summary.py <automation_id> [--archive] [--steps]
+    uv run ha_trace_summary.py --all [--archive] [--sort failures|slowest] [--limit N]
 
-Example:
+Both accept --format json|compact|ndjson; with --all, ndjson writes one
+line per automation.
+
+Examples:
     uv run ha_trace_summary.py automation.notify_on_door_open
+    uv run ha_trace_summary.py 1761430536701 --archive      # Over all archived runs
+    uv run ha_trace_summary.py 1761430536701 --steps        # Add per-step timings
+    uv run ha_trace_summary.py --all                        # Every automation, worst failure rate first
+    uv run ha_trace_summary.py --all --sort slowest --limit 10
+
+Execution times are reported as average/min/max, p50/p90/p99 and a
+histogram. --steps also breaks the time down per trigger/condition/action
+step; live, that costs one trace/get per run (pipelined), while archived
+runs use the detail stored at sync time.
+
+--all summarizes every automation from a single trace/list call (or one
+archive query) and ranks them by failure rate, or by p90 execution time
+with --sort slowest.
+
+--archive summarizes the local trace archive (see ha_trace_archive.py)
+instead of the few runs the server still holds.
 
 Requires HA_TOKEN environment variable to be set.
 """
 
-import os
 import sys
-import json
 import asyncio
-import websockets
+import argparse
 from datetime import datetime
+from halib.output import add_format_argument, write, write_records
+from halib.session import HAError, get_session
+from halib.stats import latency_summary, percentile, step_summary
+from halib.trace_store import TraceStore
 
-HA_URL = "wss://ha.cullen.rocks/api/websocket"
-
-async def get_trace_summary(automation_id):
+async def get_trace_summary(automation_id, with_steps=False):
     """Get summary statistics for an automation's trace history."""
-    token = os.environ.get("HA_TOKEN")
-    if not token:
-        print("Error: HA_TOKEN environment variable not set", file=sys.stderr)
-        sys.exit(1)
+    session = get_session()
 
     try:
-        async with websockets.connect(HA_URL) as websocket:
-            # Step 1: Receive auth_required message
-            msg = await websocket.recv()
-            auth_msg = json.loads(msg)
-
-            if auth_msg.get("type") != "auth_required":
-                print(f"Error: Expected auth_required, got {auth_msg.get('type')}", file=sys.stderr)
-                sys.exit(1)
-
-            # Step 2: Send auth message
-            await websocket.send(json.dumps({
-                "type": "auth",
-                "access_token": token
-            }))
-
-            # Step 3: Receive auth response
-            msg = await websocket.recv()
-            auth_result = json.loads(msg)
-
-            if auth_result.get("type") != "auth_ok":
-                print(f"Error: Authentication failed: {auth_result}", file=sys.stderr)
-                sys.exit(1)
+        websocket = await session.websocket()
+
+        # Strip "automation." prefix if present
+        item_id = automation_id.replace("automation.", "")
+
+        result = await websocket.call(
+            "trace/list",
+            domain="automation",
+            item_id=item_id
+        )
+
+        if not result:
+            print(f"No traces found for automation: {automation_id}", file=sys.stderr)
+            sys.exit(1)
+
+        # Filter traces for this automation
+        runs = [trace for trace in result if trace.get("item_id") == item_id]
+
+        if not runs:
+            print(f"No traces found for automation: {automation_id}", file=sys.stderr)
+            sys.exit(1)
+
+        trace_details = None
+        if with_steps:
+            results = await websocket.call_many(
+                (("trace/get", {"domain": "automation", "item_id": item_id, "run_id": run["run_id"]})
+                 for run in runs),
+                return_exceptions=True,
+            )
+            trace_details = []
+            for run, result in zip(runs, results):
+                if isinstance(result, HAError):
+                    # Aged out between list and get: left out of the step timings
+                    print(f"Warning: skipped run {run['run_id']}: {result}", file=sys.stderr)
+                elif isinstance(result, BaseException):
+                    raise result
+                else:
+                    trace_details.append(result)
+
+        # Calculate statistics
+        summary = calculate_summary(runs, automation_id, trace_details)
+        return summary
 
-            # Step 4: Send trace/list command
-            # Strip "automation." prefix if present
-            item_id = automation_id.replace("automation.", "")
-
-            command = {
-                "id": 1,
-                "type": "trace/list",
-                "domain": "automation",
-                "item_id": item_id
-            }
-
-            await websocket.send(json.dumps(command))
-
-            # Step 5: Receive response
-            msg = await websocket.recv()
-            response = json.loads(msg)
-
-            if not response.get("success"):
-                error = response.get("error", {})
-                print(f"Error: {error.get('message', 'Unknown error')}", file=sys.stderr)
-                sys.exit(1)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        await session.aclose()
 
-            result = response.get("result", [])
+def get_archived_summary(automation_id, with_steps=False):
+    """Summary statistics over every archived run of an automation."""
+    item_id = automation_id.replace("automation.", "")
+    trace_details = None
+    try:
+        with TraceStore() as store:
+            if with_steps:
+                rows = list(store.runs(item_id, with_detail=True))
+                runs = [run for run, _ in rows]
+                trace_details = [detail for _, detail in rows if detail]
+            else:
+                runs = list(store.runs(item_id))
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
 
-            if not result:
-                print(f"No traces found for automation: {automation_id}", file=sys.stderr)
-                sys.exit(1)
+    if not runs:
+        print(f"No archived traces for automation: {automation_id}", file=sys.stderr)
+        sys.exit(1)
 
-            # Filter traces for this automation
-            runs = [trace for trace in result if trace.get("item_id") == item_id]
+    return calculate_summary(runs, automation_id, trace_details)
 
-            if not runs:
-                print(f"No traces found for automation: {automation_id}", file=sys.stderr)
-                sys.exit(1)
+async def get_fleet_runs():
+    """Every run HA holds, for all automations, from one trace/list call."""
+    session = get_session()
 
-            # Calculate statistics
-            summary = calculate_summary(runs, automation_id)
-            return summary
+    try:
+        websocket = await session.websocket()
+        return await websocket.call("trace/list", domain="automation") or []
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        await session.aclose()
 
+def get_archived_fleet_runs():
+    """Every archived run, for all automations."""
+    try:
+        with TraceStore() as store:
+            return list(store.runs())
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
-def calculate_summary(runs, automation_id):
-    """Calculate summary statistics from trace runs."""
+def calculate_fleet_summary(runs, sort="failures", limit=None):
+    """Per-automation summaries of a mixed trace/list, worst first.
+
+    "failures" ranks by failure rate (then failure count), "slowest" by
+    p90 execution time.
+    """
+    by_automation = {}
+    for run in runs:
+        by_automation.setdefault(run.get("item_id"), []).append(run)
+
+    ranked = []
+    for item_id, automation_runs in by_automation.items():
+        # Parsed once per run, for the summary and the ranking both
+        durations = [calculate_execution_time(run) for run in automation_runs]
+        summary = calculate_summary(automation_runs, item_id, with_histogram=False, durations=durations)
+        if sort == "slowest":
+            measured = sorted(duration for duration in durations if duration is not None)
+            key = (percentile(measured, 90) or 0, summary["total_runs"])
+        else:
+            key = (summary["failed_runs"] / summary["total_runs"], summary["failed_runs"])
+        ranked.append((key, summary))
+    ranked.sort(key=lambda entry: entry[0], reverse=True)
+
+    automations = [summary for _, summary in ranked]
+    if limit:
+        automations = automations[:limit]
+
+    return {
+        "automations": len(by_automation),
+        "total_runs": len(runs),
+        "failed_runs": sum(summary["failed_runs"] for _, summary in ranked),
+        "ranked_by": sort,
+        "summaries": automations,
+    }
+
+def calculate_summary(runs, automation_id, trace_details=None, with_histogram=True, durations=None):
+    """Calculate summary statistics from trace runs (and per-step timings from trace details).
+
+    durations, if given, holds each run's calculate_execution_time() result.
+    """
     total_runs = len(runs)
     successful_runs = 0
     failed_runs = 0
@@ -108,7 +190,10 @@ def calculate_summary(runs, automation_id):
     errors = {}
     last_steps = {}
 
-    for run in runs:
+    if durations is None:
+        durations = map(calculate_execution_time, runs)
+
+    for run, exec_time in zip(runs, durations):
         state = run.get("state")
         script_execution = run.get("script_execution")
 
@@ -121,7 +206,6 @@ def calculate_summary(runs, automation_id):
             failed_runs += 1
 
         # Track execution times
-        exec_time = calculate_execution_time(run)
         if exec_time is not None:
             execution_times.append(exec_time)
 
@@ -135,11 +219,6 @@ def calculate_summary(runs, automation_id):
         last_step = run.get("last_step", "unknown")
         last_steps[last_step] = last_steps.get(last_step, 0) + 1
 
-    # Calculate average execution time
-    avg_exec_time = sum(execution_times) / len(execution_times) if execution_times else 0
-    min_exec_time = min(execution_times) if execution_times else 0
-    max_exec_time = max(execution_times) if execution_times else 0
-
     # Build summary
     summary = {
         "automation_id": automation_id,
@@ -147,15 +226,14 @@ def calculate_summary(runs, automation_id):
         "successful_runs": successful_runs,
         "failed_runs": failed_runs,
         "success_rate": f"{(successful_runs / total_runs * 100):.1f}%" if total_runs > 0 else "0%",
-        "execution_time": {
-            "average": f"{avg_exec_time:.2f}s" if avg_exec_time > 0 else "N/A",
-            "min": f"{min_exec_time:.2f}s" if min_exec_time > 0 else "N/A",
-            "max": f"{max_exec_time:.2f}s" if max_exec_time > 0 else "N/A"
-        },
+        "execution_time": latency_summary(execution_times, with_histogram),
         "last_steps": last_steps,
         "error_patterns": errors if errors else "No errors"
     }
 
+    if trace_details is not None:
+        summary["step_timings"] = step_summary(trace_details)
+
     return summary
 
 def calculate_execution_time(run):
@@ -177,13 +255,36 @@ def calculate_execution_time(run):
         return None
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: uv run ha_trace_summary.py <automation_id>", file=sys.stderr)
-        sys.exit(1)
-
-    automation_id = sys.argv[1]
-    summary = asyncio.run(get_trace_summary(automation_id))
-    print(json.dumps(summary, indent=2))
+    parser = argparse.ArgumentParser(description="Summarize an automation's trace history")
+    parser.add_argument("automation_id", nargs="?", help="Numeric automation id (or automation.<id>)")
+    parser.add_argument("--all", action="store_true", help="Summarize every automation, worst first")
+    parser.add_argument("--archive", action="store_true", help="Summarize the local trace archive instead of the server")
+    parser.add_argument("--steps", action="store_true", help="Include per-step timings")
+    parser.add_argument("--sort", choices=["failures", "slowest"], default="failures",
+                        help="--all: rank by failure rate or by p90 execution time (default: failures)")
+    parser.add_argument("--limit", type=int, default=0, help="--all: only the N worst automations (0 = all)")
+    add_format_argument(parser)
+    args = parser.parse_args()
+
+    if args.all == bool(args.automation_id):
+        parser.error("give an automation_id or --all")
+    if args.all and args.steps:
+        parser.error("--steps needs a single automation_id")
+
+    if args.all:
+        runs = get_archived_fleet_runs() if args.archive else asyncio.run(get_fleet_runs())
+        if not runs:
+            print("No traces found", file=sys.stderr)
+            sys.exit(1)
+        summary = calculate_fleet_summary(runs, args.sort, args.limit)
+        if args.format == "ndjson":
+            write_records(summary["summaries"], args.format)
+            return
+    elif args.archive:
+        summary = get_archived_summary(args.automation_id, with_steps=args.steps)
+    else:
+        summary = asyncio.run(get_trace_summary(args.automation_id, with_steps=args.steps))
+    write(summary, args.format)
 
 if __name__ == "__main__":
     main()
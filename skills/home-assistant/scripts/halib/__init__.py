@@ -0,0 +1,6 @@
+"""
+Shared helpers for the Home Assistant skill scripts.
+
+The ha_*.py files next to this package are the entry points; everything in
+here is imported by them and is not meant to be run directly.
+"""
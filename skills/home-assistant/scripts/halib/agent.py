@@ -0,0 +1,262 @@
+"""
+Client side of the optional local agent (ha_agent.py).
+
+The agent is one long-running process per HA instance. It keeps an
+authenticated WebSocket open, keeps the state table, /api/config and the
+registry cache current from events, and answers requests on a Unix socket
+in the cache directory (agent-<instance>.sock, mode 0600).
+
+HASession forwards to it whenever that socket answers:
+
+- get_json/get_json_async become "get" requests. /api/states,
+  /api/states/<entity_id> and /api/config are answered from the agent's
+  memory; other paths are fetched on the agent's own pool.
+- websocket() returns an AgentWebSocket. Commands run on the agent's
+  connection, so a script pays neither a TLS nor an auth handshake.
+  Subscriptions still open a WebSocket of their own.
+- halib.search.search() sends a "search" request, answered from the
+  agent's in-memory trigram index.
+
+If no agent is running, it rejects the token, or it goes away mid-run, the
+session talks to HA directly as before. HA_AGENT=0 turns forwarding off.
+
+Protocol: newline-delimited JSON. A connection opens with
+{"op": "hello", "token": <sha256 of HA_TOKEN>}. After that each request
+carries an "id", requests may be pipelined, and each is answered (in any
+order) with {"id", "ok": true, "result"} or {"id", "ok": false, "error"}.
+An HTTP error also carries status_code, reason and url; a failed WebSocket
+command carries HA's error code.
+"""
+
+import hashlib
+import json
+
+from halib.cache import cache_path
+from halib.session import HAError, HTTPStatusError
+
+# Replies are single lines, and the state table is tens of MB on a large install
+READ_LIMIT = 2 ** 31 - 1
+
+
+class AgentUnavailable(Exception):
+    """No agent answered on the socket, or the connection to it was lost."""
+
+
+def socket_path(session):
+    return cache_path("agent", session, suffix=".sock")
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _hello(session):
+    return json.dumps({"op": "hello", "token": token_digest(session.token)}).encode() + b"\n"
+
+
+def _result(reply):
+    """A reply's result, or the exception the direct path would have raised."""
+    if reply.get("ok"):
+        return reply.get("result")
+    if "status_code" in reply:
+        raise HTTPStatusError(reply["status_code"], reply["reason"], reply["url"])
+    raise HAError(reply.get("error", "agent request failed"), code=reply.get("code"))
+
+
+class AgentClient:
+    """A blocking connection to the agent, one request at a time."""
+
+    def __init__(self, session):
+        import socket
+
+        path = socket_path(session)
+        if not path.exists():
+            raise AgentUnavailable(f"no agent socket at {path}")
+        self._sock = socket.socket(socket.AF_UNIX)
+        try:
+            self._sock.connect(str(path))
+            self._file = self._sock.makefile("rwb")
+            self._file.write(_hello(session))
+            self._file.flush()
+            hello = json.loads(self._file.readline() or b"{}")
+        except (OSError, ValueError) as e:
+            self._sock.close()
+            raise AgentUnavailable(f"agent at {path}: {e}")
+        if not hello.get("ok"):
+            self._sock.close()
+            raise AgentUnavailable(hello.get("error", "agent refused the connection"))
+        self._next_id = 0
+
+    def request(self, op, **fields):
+        self._next_id += 1
+        try:
+            self._file.write(json.dumps({"id": self._next_id, "op": op, **fields}).encode() + b"\n")
+            self._file.flush()
+            line = self._file.readline()
+        except OSError as e:
+            raise AgentUnavailable(str(e))
+        if not line:
+            raise AgentUnavailable("agent closed the connection")
+        return _result(json.loads(line))
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+
+class AsyncAgentClient:
+    """A pipelined agent connection for use inside an event loop.
+
+    Like HAWebSocket: every request gets an id and a future, and one reader
+    task routes each reply to its future, so gathered requests share the
+    connection.
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._next_id = 0
+        self._pending = {}
+        self._read_task = None
+        self.closed = False
+
+    @classmethod
+    async def connect(cls, session):
+        import asyncio
+
+        path = socket_path(session)
+        if not path.exists():
+            raise AgentUnavailable(f"no agent socket at {path}")
+        try:
+            reader, writer = await asyncio.open_unix_connection(str(path), limit=READ_LIMIT)
+            writer.write(_hello(session))
+            await writer.drain()
+            hello = json.loads(await reader.readline() or b"{}")
+        except (OSError, ValueError) as e:
+            raise AgentUnavailable(f"agent at {path}: {e}")
+        if not hello.get("ok"):
+            writer.close()
+            raise AgentUnavailable(hello.get("error", "agent refused the connection"))
+        client = cls(reader, writer)
+        client._read_task = asyncio.create_task(client._read_loop())
+        return client
+
+    async def _read_loop(self):
+        error = AgentUnavailable("agent closed the connection")
+        try:
+            while line := await self._reader.readline():
+                reply = json.loads(line)
+                future = self._pending.pop(reply.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        except Exception as e:
+            error = AgentUnavailable(f"agent connection lost: {e}")
+        finally:
+            self.closed = True
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+
+    async def request(self, op, **fields):
+        import asyncio
+
+        if self.closed:
+            raise AgentUnavailable("agent connection closed")
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[self._next_id] = future
+        try:
+            self._writer.write(json.dumps({"id": self._next_id, "op": op, **fields}).encode() + b"\n")
+            await self._writer.drain()
+        except OSError as e:
+            self._pending.pop(self._next_id, None)
+            raise AgentUnavailable(str(e))
+        return _result(await future)
+
+    async def close(self):
+        import asyncio
+
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except OSError:
+            pass
+        if self._read_task is not None:
+            await asyncio.gather(self._read_task, return_exceptions=True)
+            self._read_task = None
+
+
+class AgentWebSocket:
+    """HAWebSocket's interface, with commands run on the agent's connection.
+
+    Subscriptions need an event stream of their own, so subscribe() opens a
+    direct WebSocket on first use. If the agent goes away, commands fall
+    back to that direct connection too.
+    """
+
+    def __init__(self, session, agent):
+        import asyncio
+
+        self.session = session
+        self.agent = agent
+        self._direct = None
+        self._direct_lock = asyncio.Lock()
+
+    async def _direct_websocket(self):
+        async with self._direct_lock:
+            if self._direct is None:
+                from halib.websocket import HAWebSocket
+
+                self._direct = await HAWebSocket(self.session).connect()
+        return self._direct
+
+    async def call(self, msg_type, **kwargs):
+        """Send a command and return its result, raising HAError on failure."""
+        if self.agent is not None:
+            try:
+                result = await self.agent.request("ws", type=msg_type, kwargs=kwargs)
+            except AgentUnavailable:
+                self.agent = None
+            else:
+                self.session.stats.agent_requests += 1
+                return result
+        return await (await self._direct_websocket()).call(msg_type, **kwargs)
+
+    async def call_many(self, commands, return_exceptions=False):
+        """Run (msg_type, kwargs) commands concurrently; results come back in order."""
+        import asyncio
+
+        return await asyncio.gather(
+            *(self.call(msg_type, **kwargs) for msg_type, kwargs in commands),
+            return_exceptions=return_exceptions,
+        )
+
+    async def subscribe(self, event_type=None, queue=None):
+        return await (await self._direct_websocket()).subscribe(event_type, queue)
+
+    async def subscribe_trigger(self, trigger, queue=None):
+        return await (await self._direct_websocket()).subscribe_trigger(trigger, queue)
+
+    def events(self, subscription_id):
+        return self._direct.events(subscription_id)
+
+    def event_batches(self, subscription_id):
+        return self._direct.event_batches(subscription_id)
+
+    async def close(self):
+        if self._direct is not None:
+            await self._direct.close()
+            self._direct = None
+
+
+def agent_status(session):
+    """The running agent's status, or None if there isn't one."""
+    try:
+        client = AgentClient(session)
+    except AgentUnavailable:
+        return None
+    try:
+        return client.request("status")
+    finally:
+        client.close()
@@ -0,0 +1,311 @@
+"""
+Cached automation configs, refreshed incrementally.
+
+/api/states only carries an automation's name and status; its triggers,
+conditions and actions come from the automation/config WebSocket command,
+one automation at a time. AutomationConfigCache keeps every config on disk
+keyed by entity_id together with the state's last_updated at fetch time.
+A sync compares those stamps against the current state snapshot and fetches
+only automations that are new or changed (pipelined on one socket), and
+drops the ones that no longer exist.
+
+config_features() reduces a config to what it references: trigger and
+condition types, the entities each section uses, the services actions call
+and which entities each call targets. AutomationIndex keeps those features
+on disk (re-extracting only automations a sync changed) and answers
+queries like "calls light.turn_on on kitchen entities" from postings
+built in memory, without touching HA.
+"""
+
+import fnmatch
+import re
+import time
+
+from halib.cache import cache_path, read_json, write_json_atomic
+from halib.session import HAError, get_session
+
+INDEX_VERSION = 1
+
+ENTITY_ID = re.compile(r"^[a-z0-9_]+\.[a-z0-9_]+$")
+ENTITY_KEYS = {"entity_id", "entity"}
+# Keys inside actions whose values are nested conditions / nested actions
+NESTED_CONDITIONS = ("if", "while", "until", "conditions")
+NESTED_ACTIONS = ("then", "else", "sequence", "default", "parallel", "choose", "repeat")
+
+# Queryable facets of an automation
+FACETS = (
+    "trigger_types", "trigger_entities",
+    "condition_types", "condition_entities",
+    "services", "action_entities",
+)
+
+
+def automation_stamps(states):
+    """{entity_id: last_updated} for every automation in a state snapshot."""
+    return {
+        state["entity_id"]: state.get("last_updated")
+        for state in states
+        if state["entity_id"].startswith("automation.")
+    }
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _section(config, *keys):
+    for key in keys:
+        if key in config:
+            return _as_list(config[key])
+    return []
+
+
+def _entity_strings(value):
+    if isinstance(value, str):
+        # entity_id: "light.a, light.b" is accepted by HA too
+        value = [part.strip() for part in value.split(",")]
+    for item in _as_list(value):
+        if isinstance(item, str) and ENTITY_ID.match(item):
+            yield item
+
+
+def _entities(node):
+    """Every entity_id named under entity_id/entity keys anywhere below node."""
+    found = set()
+    if isinstance(node, list):
+        for item in node:
+            found |= _entities(item)
+    elif isinstance(node, dict):
+        for key, value in node.items():
+            if key in ENTITY_KEYS:
+                found.update(_entity_strings(value))
+            else:
+                found |= _entities(value)
+    return found
+
+
+def config_features(config):
+    """What one automation config references, as {facet: sorted list}.
+
+    "calls" holds [service, entity_id] for every entity a service call
+    targets, so a service and a target can be matched on the same action.
+    """
+    features = {facet: set() for facet in FACETS}
+    calls = set()
+    if not isinstance(config, dict):
+        return {**{facet: [] for facet in FACETS}, "calls": []}
+
+    for trigger in _section(config, "triggers", "trigger"):
+        if isinstance(trigger, dict):
+            trigger_type = trigger.get("trigger") or trigger.get("platform")
+            if isinstance(trigger_type, str):
+                features["trigger_types"].add(trigger_type)
+            features["trigger_entities"] |= _entities(trigger)
+
+    def condition(node):
+        if isinstance(node, list):
+            for item in node:
+                condition(item)
+        elif isinstance(node, str):
+            # Shorthand template condition: "{{ ... }}"
+            features["condition_types"].add("template")
+        elif isinstance(node, dict):
+            condition_type = node.get("condition")
+            if isinstance(condition_type, str):
+                features["condition_types"].add(condition_type)
+            features["condition_entities"] |= _entities(
+                {key: value for key, value in node.items() if key != "conditions"}
+            )
+            condition(node.get("conditions"))
+
+    def action(node):
+        if isinstance(node, list):
+            for item in node:
+                action(item)
+            return
+        if not isinstance(node, dict):
+            return
+        if isinstance(node.get("condition"), str):
+            # An inline condition step
+            condition(node)
+            return
+
+        service = node.get("action") or node.get("service")
+        if isinstance(service, str) and ENTITY_ID.match(service):
+            features["services"].add(service)
+            targets = _entities({key: node.get(key) for key in ("target", "data", "entity_id")})
+            features["action_entities"] |= targets
+            calls.update((service, entity_id) for entity_id in targets)
+        if isinstance(node.get("scene"), str):
+            features["action_entities"].update(_entity_strings(node["scene"]))
+
+        for key in NESTED_CONDITIONS:
+            if key in node and isinstance(node[key], (list, dict, str)):
+                condition(node[key])
+        for key in NESTED_ACTIONS:
+            if key in node:
+                action(node[key])
+
+    for item in _section(config, "conditions", "condition"):
+        condition(item)
+    action(_section(config, "actions", "action"))
+
+    return {**{facet: sorted(values) for facet, values in features.items()}, "calls": sorted(calls)}
+
+
+class AutomationConfigCache:
+    """Every automation config for one HA instance."""
+
+    def __init__(self, session=None):
+        self.session = session or get_session()
+        self.path = cache_path("automation-configs", self.session)
+
+    def load(self):
+        """{entity_id: {"last_updated": ..., "config": ...}} as last stored."""
+        cached = read_json(self.path)
+        return cached["automations"] if cached else {}
+
+    async def sync_async(self, states, fresh=False):
+        """Bring the cache in line with a state snapshot.
+
+        Returns (automations, changed) where changed is the set of entity_ids
+        fetched or removed by this sync.
+        """
+        stamps = automation_stamps(states)
+        cached = {} if fresh else self.load()
+
+        stale = [
+            entity_id for entity_id, stamp in stamps.items()
+            if entity_id not in cached or cached[entity_id].get("last_updated") != stamp
+        ]
+        removed = [entity_id for entity_id in cached if entity_id not in stamps]
+
+        automations = {entity_id: entry for entity_id, entry in cached.items() if entity_id in stamps}
+        failed = None
+        if stale:
+            websocket = await self.session.websocket()
+            results = await websocket.call_many(
+                (("automation/config", {"entity_id": entity_id}) for entity_id in stale),
+                return_exceptions=True,
+            )
+            for entity_id, result in zip(stale, results):
+                if isinstance(result, Exception):
+                    # Automations HA has no config for (e.g. defined in
+                    # YAML without an id) are kept with None so they aren't
+                    # refetched until they change. Other failures are not
+                    # stored, so the next sync tries them again.
+                    if not (isinstance(result, HAError) and result.not_found):
+                        failed = failed or result
+                        continue
+                    result = None
+                config = (result or {}).get("config")
+                automations[entity_id] = {"last_updated": stamps[entity_id], "config": config}
+
+        if stale or removed or fresh:
+            write_json_atomic(self.path, {"synced_at": time.time(), "automations": automations})
+            self.session.stats.cache_misses += 1
+        else:
+            self.session.stats.cache_hits += 1
+        if failed is not None:
+            raise failed
+
+        return automations, set(stale) | set(removed)
+
+
+def _matching(keys, pattern):
+    """Keys equal to pattern, or matching it as a glob (light.*kitchen*)."""
+    if any(char in pattern for char in "*?["):
+        return fnmatch.filter(keys, pattern)
+    return [pattern] if pattern in keys else []
+
+
+class AutomationIndex:
+    """Config features of every automation, with postings per facet."""
+
+    def __init__(self, session=None):
+        self.session = session or get_session()
+        self.path = cache_path("automation-index", self.session)
+        cached = read_json(self.path)
+        if cached and cached.get("version") == INDEX_VERSION:
+            self.entries = cached["automations"]
+        else:
+            self.entries = {}
+        self._postings = None
+
+    def update(self, automations, changed=None):
+        """Re-extract features for changed (or unindexed) automations, drop removed ones.
+
+        automations is AutomationConfigCache's {entity_id: {"last_updated", "config"}}.
+        """
+        entries = {}
+        rebuilt = 0
+        for entity_id, automation in automations.items():
+            previous = self.entries.get(entity_id)
+            if previous and previous["last_updated"] == automation.get("last_updated") and entity_id not in (changed or ()):
+                entries[entity_id] = previous
+            else:
+                entries[entity_id] = {
+                    "last_updated": automation.get("last_updated"),
+                    "features": config_features(automation.get("config")),
+                }
+                rebuilt += 1
+
+        if rebuilt or len(entries) != len(self.entries):
+            self.entries = entries
+            self._postings = None
+            write_json_atomic(self.path, {"version": INDEX_VERSION, "automations": entries})
+        return rebuilt
+
+    def postings(self):
+        """{facet: {value: set(entity_ids)}}, built on first use."""
+        if self._postings is None:
+            postings = {facet: {} for facet in FACETS}
+            for entity_id, entry in self.entries.items():
+                for facet in FACETS:
+                    for value in entry["features"][facet]:
+                        postings[facet].setdefault(value, set()).add(entity_id)
+            self._postings = postings
+        return self._postings
+
+    def features(self, entity_id):
+        entry = self.entries.get(entity_id)
+        return entry["features"] if entry else None
+
+    def query(self, entity=None, **filters):
+        """entity_ids of automations matching every given filter.
+
+        Filters are facet=pattern (e.g. services="light.turn_on",
+        trigger_entities="binary_sensor.*door*"); entity matches a reference
+        in any section. With both services and action_entities, the service
+        must be called on a matching entity in the same action.
+        """
+        postings = self.postings()
+        result = set(self.entries)
+
+        for facet, pattern in filters.items():
+            if pattern is None:
+                continue
+            matched = set()
+            for value in _matching(postings[facet].keys(), pattern):
+                matched |= postings[facet][value]
+            result &= matched
+
+        if entity is not None:
+            matched = set()
+            for facet in ("trigger_entities", "condition_entities", "action_entities"):
+                for value in _matching(postings[facet].keys(), entity):
+                    matched |= postings[facet][value]
+            result &= matched
+
+        service, target = filters.get("services"), filters.get("action_entities")
+        if service is not None and target is not None:
+            result = {
+                entity_id for entity_id in result
+                if any(
+                    _matching([called], service) and _matching([targeted], target)
+                    for called, targeted in self.entries[entity_id]["features"]["calls"]
+                )
+            }
+        return result
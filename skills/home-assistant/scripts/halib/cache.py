@@ -0,0 +1,244 @@
+"""
+On-disk snapshot of /api/states shared by the entity and automation scripts.
+
+Scripts that need the full state table call get_states(); the first call
+within HA_CACHE_TTL seconds (default 60) fetches and stores the snapshot,
+later calls read it from disk. Pass fresh=True (the scripts' --fresh flag)
+to bypass it. Hits and misses are counted in the session stats.
+
+Fetches decode /api/states straight into plain dicts. Going through
+homeassistant_api's pydantic State models only to dump them back to dicts
+costs several times more per entity; HA_STATES_DECODE=typed restores that
+path (e.g. to validate a payload against the models).
+
+ha_state_cache.py follow keeps the snapshot current from the
+subscribe_events state_changed stream, so readers stay on the cached copy
+without anyone refetching the whole table.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from halib.session import get_session
+
+DEFAULT_TTL = 60
+DEFAULT_REGISTRY_TTL = 3600
+# /api/states on a large install can take a while to render
+STATES_TIMEOUT = 30
+
+
+def cache_dir():
+    """Directory for cached snapshots (HA_CACHE_DIR, else XDG cache)."""
+    if os.environ.get("HA_CACHE_DIR"):
+        return Path(os.environ["HA_CACHE_DIR"])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "ha-skill"
+
+
+def cache_ttl():
+    """Snapshot lifetime in seconds; HA_CACHE_TTL=0 disables the cache."""
+    return float(os.environ.get("HA_CACHE_TTL", DEFAULT_TTL))
+
+
+def states_decode():
+    """How fetched states are decoded: "raw" (plain dicts, default) or "typed"."""
+    return "typed" if os.environ.get("HA_STATES_DECODE") == "typed" else "raw"
+
+
+def registry_ttl():
+    """Lifetime of slow-changing caches (registries, dashboards): HA_REGISTRY_TTL."""
+    return float(os.environ.get("HA_REGISTRY_TTL", DEFAULT_REGISTRY_TTL))
+
+
+def cache_path(name, session=None, suffix=".json"):
+    """Path for a named cache file, keyed by the HA instance it came from."""
+    session = session or get_session()
+    instance = hashlib.sha1(session.base_url.encode()).hexdigest()[:12]
+    return cache_dir() / f"{name}-{instance}{suffix}"
+
+
+def write_json_atomic(path, data):
+    """Write JSON via a temp file + rename so readers never see half a file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class StateCache:
+    """The cached /api/states snapshot for one HA instance."""
+
+    def __init__(self, session=None, ttl=None):
+        self.session = session or get_session()
+        self.ttl = cache_ttl() if ttl is None else ttl
+        self.path = cache_path("states", self.session)
+
+    def load(self):
+        """Return the cached states if the snapshot is within the TTL, else None."""
+        if self.ttl <= 0:
+            return None
+        snapshot = read_json(self.path)
+        if not snapshot or time.time() - snapshot.get("synced_at", 0) > self.ttl:
+            return None
+        return snapshot["states"]
+
+    def store(self, states):
+        write_json_atomic(self.path, {"synced_at": time.time(), "states": states})
+
+    def fetch(self):
+        """Download the full state table and store it."""
+        if states_decode() == "typed":
+            states = [entity.model_dump(mode='json') for entity in self.session.client().get_states()]
+        else:
+            states = self.session.get_json("/api/states", timeout=STATES_TIMEOUT)
+        self.store(states)
+        return states
+
+    async def fetch_async(self):
+        """fetch() on the session's async HTTP pool, for use alongside other requests."""
+        states = await self.session.get_json_async("/api/states", timeout=STATES_TIMEOUT)
+        if states_decode() == "typed":
+            from homeassistant_api import State
+
+            states = [State.from_json(entity).model_dump(mode='json') for entity in states]
+        self.store(states)
+        return states
+
+    def states(self, fresh=False):
+        """Cached states when available, otherwise a fresh fetch."""
+        states = None if fresh else self.load()
+        if states is not None:
+            self.session.stats.cache_hits += 1
+            return states
+        self.session.stats.cache_misses += 1
+        return self.fetch()
+
+    async def states_async(self, fresh=False):
+        """Async states(): cached states when available, otherwise a fresh fetch."""
+        states = None if fresh else self.load()
+        if states is not None:
+            self.session.stats.cache_hits += 1
+            return states
+        self.session.stats.cache_misses += 1
+        return await self.fetch_async()
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+class RegistryCache:
+    """Area and device names per entity, from the WebSocket registries.
+
+    The registries only change when devices or areas are edited, so they are
+    kept for HA_REGISTRY_TTL seconds (default an hour) rather than the
+    state snapshot's TTL.
+    """
+
+    def __init__(self, session=None, ttl=None):
+        self.session = session or get_session()
+        self.ttl = registry_ttl() if ttl is None else ttl
+        self.path = cache_path("registry", self.session)
+
+    async def fetch_async(self):
+        """Fetch the entity, device and area registries and store the join."""
+        websocket = await self.session.websocket()
+        entities, devices, areas = await websocket.call_many([
+            ("config/entity_registry/list", {}),
+            ("config/device_registry/list", {}),
+            ("config/area_registry/list", {}),
+        ])
+
+        area_names = {area["area_id"]: area.get("name") for area in areas}
+        devices_by_id = {device["id"]: device for device in devices}
+        locations = {}
+        for entry in entities:
+            device = devices_by_id.get(entry.get("device_id")) or {}
+            area_id = entry.get("area_id") or device.get("area_id")
+            locations[entry["entity_id"]] = {
+                "area": area_names.get(area_id),
+                "device": device.get("name_by_user") or device.get("name"),
+            }
+
+        write_json_atomic(self.path, {"synced_at": time.time(), "locations": locations})
+        return locations
+
+    def load(self, fresh=False):
+        """The cached locations if within the TTL (counted as a hit), else None."""
+        if not fresh and self.ttl > 0:
+            cached = read_json(self.path)
+            if cached and time.time() - cached.get("synced_at", 0) <= self.ttl:
+                self.session.stats.cache_hits += 1
+                return cached["locations"]
+        return None
+
+    async def locations_async(self, fresh=False):
+        """{entity_id: {"area": ..., "device": ...}}, cached for the TTL."""
+        locations = self.load(fresh)
+        if locations is not None:
+            return locations
+        self.session.stats.cache_misses += 1
+        return await self.fetch_async()
+
+    def locations(self, fresh=False):
+        """Synchronous wrapper around locations_async for REST-only scripts.
+
+        A cache hit returns without starting an event loop (or importing
+        asyncio and websockets).
+        """
+        locations = self.load(fresh)
+        if locations is not None:
+            return locations
+        import asyncio
+
+        async def run():
+            try:
+                self.session.stats.cache_misses += 1
+                return await self.fetch_async()
+            finally:
+                await self.session.aclose()
+        return asyncio.run(run())
+
+
+def get_states(fresh=False):
+    """All entity states as JSON-ready dicts, served from the snapshot when fresh."""
+    return StateCache().states(fresh=fresh)
+
+
+def peek_states():
+    """Cached states if a fresh snapshot exists, without ever fetching."""
+    cache = StateCache()
+    states = cache.load()
+    if states is None:
+        cache.session.stats.cache_misses += 1
+    else:
+        cache.session.stats.cache_hits += 1
+    return states
+
+
+def apply_state_changed(states_by_id, event):
+    """Fold one state_changed event into a {entity_id: state} mapping.
+
+    Events that queued up while the snapshot was being fetched can be older
+    than what it already holds, so they only win if they are at least as new.
+    """
+    data = event.get("data", {})
+    entity_id = data.get("entity_id")
+    new_state = data.get("new_state")
+    if new_state is None:
+        states_by_id.pop(entity_id, None)
+        return
+    current = states_by_id.get(entity_id)
+    if current is None or new_state.get("last_updated", "") >= current.get("last_updated", ""):
+        states_by_id[entity_id] = new_state
@@ -0,0 +1,224 @@
+"""
+Cached Lovelace dashboard configs and a reverse index over them.
+
+DashboardCache fetches the config of every dashboard at once (one
+lovelace/config per dashboard, pipelined on the shared WebSocket) and
+stores two files next to the other caches:
+
+- dashboards-<instance>.json: every config, keyed by dashboard url_path
+- dashboard-index-<instance>.json: entity_id → the dashboards, views and
+  cards that show it, and card type → the dashboards and views using it
+
+Lookups read only the small index file, so "which dashboards reference
+light.kitchen" is a dict lookup rather than N config fetches. Dashboards,
+like the registries, only change when someone edits them, so both files
+are kept for HA_REGISTRY_TTL seconds (default an hour).
+"""
+
+import fnmatch
+import re
+import time
+
+from halib.cache import cache_path, read_json, registry_ttl, write_json_atomic
+from halib.session import HAError, get_session
+
+# url_path the default dashboard is served under
+DEFAULT_DASHBOARD = "lovelace"
+
+# Card keys whose values name entities (a string, or a list of strings/dicts)
+ENTITY_KEYS = {"entity", "entity_id", "entities", "camera_image", "badges"}
+
+ENTITY_ID = re.compile(r"^[a-z0-9_]+\.[a-z0-9_]+$")
+
+# Tap/hold action keys naming the service they call
+SERVICE_KEYS = {"perform_action", "service"}
+
+
+def _entity_strings(value):
+    if isinstance(value, str):
+        value = [value]
+    if isinstance(value, list):
+        for item in value:
+            if isinstance(item, str) and ENTITY_ID.match(item):
+                yield item
+
+
+def _walk(node, dashboard, view, card, entities, card_types):
+    """Record entity references and card types below one view."""
+    if isinstance(node, list):
+        for item in node:
+            _walk(item, dashboard, view, card, entities, card_types)
+        return
+    if not isinstance(node, dict):
+        return
+
+    card_type = node.get("type")
+    if isinstance(card_type, str):
+        card_types.setdefault(card_type, set()).add((dashboard, view))
+        card = card_type
+
+    for key, value in node.items():
+        if key in ENTITY_KEYS:
+            for entity_id in _entity_strings(value):
+                entities.setdefault(entity_id, set()).add((dashboard, view, card))
+        _walk(value, dashboard, view, card, entities, card_types)
+
+
+def references(config):
+    """(entity_ids, services) a dashboard config refers to, e.g. for the entity graph."""
+    entities = {}
+    card_types = {}
+    services = set()
+
+    def walk_services(node):
+        if isinstance(node, list):
+            for item in node:
+                walk_services(item)
+        elif isinstance(node, dict):
+            for key, value in node.items():
+                if key in SERVICE_KEYS and isinstance(value, str) and ENTITY_ID.match(value):
+                    services.add(value)
+                walk_services(value)
+
+    if isinstance(config, dict):
+        _walk(config.get("views") or [], None, None, None, entities, card_types)
+        walk_services(config)
+    return set(entities), services
+
+
+def build_index(dashboards):
+    """Index {url_path: {"config": ...}} by entity_id and by card type."""
+    entities = {}
+    card_types = {}
+    for url_path, dashboard in dashboards.items():
+        config = dashboard.get("config")
+        if not isinstance(config, dict):
+            continue
+        for position, view in enumerate(config.get("views") or []):
+            if not isinstance(view, dict):
+                continue
+            view_path = view.get("path") or str(position)
+            # The view's own "type" is its layout, not a card
+            for key, value in view.items():
+                if key == "type":
+                    continue
+                if key in ENTITY_KEYS:
+                    for entity_id in _entity_strings(value):
+                        entities.setdefault(entity_id, set()).add((url_path, view_path, None))
+                _walk(value, url_path, view_path, None, entities, card_types)
+
+    return {
+        "entities": {
+            entity_id: sorted(refs, key=lambda ref: (ref[0], ref[1], ref[2] or ""))
+            for entity_id, refs in entities.items()
+        },
+        "card_types": {card_type: sorted(refs) for card_type, refs in card_types.items()},
+        "titles": {url_path: dashboard.get("title") for url_path, dashboard in dashboards.items()},
+    }
+
+
+def _matching(keys, pattern):
+    """Keys equal to pattern, or matching it as a glob (light.*)."""
+    if any(char in pattern for char in "*?["):
+        return sorted(fnmatch.filter(keys, pattern))
+    return [pattern] if pattern in keys else []
+
+
+def find_entity(index, pattern):
+    """Where entities matching pattern appear: one record per dashboard/view/card."""
+    titles = index.get("titles", {})
+    return [
+        {"entity_id": entity_id, "dashboard": dashboard, "title": titles.get(dashboard), "view": view, "card": card}
+        for entity_id in _matching(index["entities"].keys(), pattern)
+        for dashboard, view, card in index["entities"][entity_id]
+    ]
+
+
+def find_card_type(index, pattern):
+    """Where card types matching pattern are used: one record per dashboard/view."""
+    titles = index.get("titles", {})
+    return [
+        {"card_type": card_type, "dashboard": dashboard, "title": titles.get(dashboard), "view": view}
+        for card_type in _matching(index["card_types"].keys(), pattern)
+        for dashboard, view in index["card_types"][card_type]
+    ]
+
+
+class DashboardCache:
+    """Every dashboard config for one HA instance, plus the reverse index."""
+
+    def __init__(self, session=None, ttl=None):
+        self.session = session or get_session()
+        self.ttl = registry_ttl() if ttl is None else ttl
+        self.configs_path = cache_path("dashboards", self.session)
+        self.index_path = cache_path("dashboard-index", self.session)
+
+    async def fetch_async(self):
+        """Fetch every dashboard config concurrently, store them and the index."""
+        websocket = await self.session.websocket()
+        listed = await websocket.call("lovelace/dashboards/list") or []
+
+        targets = [(DEFAULT_DASHBOARD, "Overview", {})] + [
+            (dashboard["url_path"], dashboard.get("title"), {"url_path": dashboard["url_path"]})
+            for dashboard in listed if dashboard.get("url_path")
+        ]
+        configs = await websocket.call_many(
+            (("lovelace/config", kwargs) for _, _, kwargs in targets), return_exceptions=True
+        )
+
+        dashboards = {}
+        for (url_path, title, _), config in zip(targets, configs):
+            if isinstance(config, Exception):
+                # An auto-generated default dashboard has no stored config.
+                # Anything else (e.g. a dropped connection) fails the fetch
+                # before a partial result can be cached.
+                if not (isinstance(config, HAError) and config.not_found):
+                    raise config
+                config = None
+            dashboards[url_path] = {"title": title, "config": config}
+
+        index = build_index(dashboards)
+        synced_at = time.time()
+        write_json_atomic(self.configs_path, {"synced_at": synced_at, "dashboards": dashboards})
+        write_json_atomic(self.index_path, {"synced_at": synced_at, **index})
+        return dashboards, index
+
+    def _load(self, path):
+        if self.ttl <= 0:
+            return None
+        cached = read_json(path)
+        if cached and time.time() - cached.get("synced_at", 0) <= self.ttl:
+            self.session.stats.cache_hits += 1
+            return cached
+        return None
+
+    async def index_async(self, fresh=False):
+        """The reverse index, cached for the TTL."""
+        cached = None if fresh else self._load(self.index_path)
+        if cached is not None:
+            return cached
+        self.session.stats.cache_misses += 1
+        return (await self.fetch_async())[1]
+
+    async def configs_async(self, fresh=False):
+        """{url_path: {"title", "config"}} for every dashboard, cached for the TTL."""
+        cached = None if fresh else self._load(self.configs_path)
+        if cached is not None:
+            return cached["dashboards"]
+        self.session.stats.cache_misses += 1
+        return (await self.fetch_async())[0]
+
+    def index(self, fresh=False):
+        """Synchronous wrapper around index_async."""
+        import asyncio
+
+        async def run():
+            try:
+                return await self.index_async(fresh=fresh)
+            finally:
+                await self.session.aclose()
+        return asyncio.run(run())
+
+    def clear(self):
+        self.configs_path.unlink(missing_ok=True)
+        self.index_path.unlink(missing_ok=True)
@@ -0,0 +1,153 @@
+"""
+Reference graph between entities, automations, dashboards and services.
+
+Edges point from whatever holds the reference to what it refers to:
+
+- automation.x  triggered_by  light.y        (entity in a trigger)
+- automation.x  checks        sensor.y       (entity in a condition)
+- automation.x  acts_on       light.y        (entity targeted by an action)
+- automation.x  calls         service:light.turn_on
+- dashboard:url displays      light.y
+- dashboard:url calls         service:light.toggle   (tap/hold actions)
+
+Entities (automations included) are named by entity_id; dashboards and
+services carry a "dashboard:" / "service:" prefix.
+
+The graph is stored per source (one automation or dashboard) with a stamp
+of what it was built from: an automation's last_updated, a hash of a
+dashboard's config. A rebuild re-extracts only the sources whose stamp
+changed. Forward and reverse adjacency are derived in memory on load.
+"""
+
+import fnmatch
+import hashlib
+import json
+import time
+
+from halib.automations import config_features
+from halib.cache import cache_path, read_json, write_json_atomic
+from halib.dashboards import references
+from halib.session import get_session
+
+GRAPH_VERSION = 2
+
+# Relation each automation feature becomes
+AUTOMATION_RELATIONS = {
+    "trigger_entities": "triggered_by",
+    "condition_entities": "checks",
+    "action_entities": "acts_on",
+}
+
+
+def automation_edges(config):
+    """[(relation, target)] for one automation config."""
+    features = config_features(config)
+    edges = {
+        (relation, entity_id)
+        for facet, relation in AUTOMATION_RELATIONS.items()
+        for entity_id in features[facet]
+    }
+    edges.update(("calls", f"service:{service}") for service in features["services"])
+    return sorted(edges)
+
+
+def dashboard_edges(config):
+    """[(relation, target)] for one dashboard config."""
+    entities, services = references(config)
+    return sorted(
+        [("displays", entity_id) for entity_id in entities]
+        + [("calls", f"service:{service}") for service in services]
+    )
+
+
+def _config_hash(config):
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+class EntityGraph:
+    """The cached reference graph for one HA instance."""
+
+    def __init__(self, session=None):
+        self.session = session or get_session()
+        self.path = cache_path("entity-graph", self.session)
+        cached = read_json(self.path)
+        if cached and cached.get("version") == GRAPH_VERSION:
+            self.sources = cached["sources"]
+            self.built_at = cached.get("built_at")
+        else:
+            self.sources = {}
+            self.built_at = None
+        self._forward = None
+        self._reverse = None
+
+    def update(self, automations, dashboards):
+        """Re-extract sources whose stamp changed; returns (rebuilt, reused, removed).
+
+        automations: {entity_id: {"last_updated", "config"}} (AutomationConfigCache)
+        dashboards: {url_path: {"config"}} (DashboardCache)
+        """
+        current = {}
+        for entity_id, entry in automations.items():
+            current[entity_id] = (entry.get("last_updated"), automation_edges, entry.get("config"))
+        for url_path, entry in dashboards.items():
+            config = entry.get("config")
+            current[f"dashboard:{url_path}"] = (_config_hash(config), dashboard_edges, config)
+
+        rebuilt = reused = 0
+        sources = {}
+        for source, (stamp, extract, config) in current.items():
+            previous = self.sources.get(source)
+            if previous and previous["stamp"] == stamp:
+                sources[source] = previous
+                reused += 1
+            else:
+                sources[source] = {"stamp": stamp, "edges": extract(config)}
+                rebuilt += 1
+        removed = len(set(self.sources) - set(sources))
+
+        if rebuilt or removed or self.built_at is None:
+            self.sources = sources
+            self.built_at = time.time()
+            self._forward = self._reverse = None
+            write_json_atomic(self.path, {"version": GRAPH_VERSION, "built_at": self.built_at, "sources": sources})
+        return rebuilt, reused, removed
+
+    def _adjacency(self):
+        if self._forward is None:
+            forward, reverse = {}, {}
+            for source, entry in self.sources.items():
+                for relation, target in entry["edges"]:
+                    forward.setdefault(source, []).append((relation, target))
+                    reverse.setdefault(target, []).append((relation, source))
+            self._forward, self._reverse = forward, reverse
+        return self._forward, self._reverse
+
+    def nodes(self):
+        forward, reverse = self._adjacency()
+        return forward.keys() | reverse.keys()
+
+    def match(self, pattern):
+        """Node names equal to pattern, or matching it as a glob."""
+        nodes = self.nodes()
+        if any(char in pattern for char in "*?["):
+            return sorted(fnmatch.filter(nodes, pattern))
+        return [pattern] if pattern in nodes else []
+
+    def lookup(self, node):
+        """What a node refers to (uses) and what refers to it (used_by)."""
+        forward, reverse = self._adjacency()
+        return {
+            "node": node,
+            "uses": [{"relation": relation, "target": target} for relation, target in forward.get(node, [])],
+            "used_by": [{"relation": relation, "source": source} for relation, source in reverse.get(node, [])],
+        }
+
+    def status(self):
+        forward, reverse = self._adjacency()
+        return {
+            "path": str(self.path),
+            "built_at": self.built_at,
+            "sources": len(self.sources),
+            "nodes": len(forward.keys() | reverse.keys()),
+            "edges": sum(len(edges) for edges in forward.values()),
+        }
@@ -0,0 +1,112 @@
+"""
+Output formats shared by the query scripts.
+
+--format json (the default) is the indented JSON the scripts have always
+printed, compact is the same without whitespace, and ndjson writes one
+record per line. write_records() serializes records as they are produced,
+so a script that yields its results never holds the whole serialized
+output in memory (in ndjson mode, not even the full result list).
+
+--fields takes dotted paths (entity_id,state,attributes.friendly_name) and
+project() copies just those out of each record before it is serialized, so
+output size follows what was asked for rather than the full state object.
+"""
+
+import argparse
+import json
+import sys
+
+FORMATS = ("json", "compact", "ndjson")
+
+
+def add_format_argument(parser, default="json", help=None):
+    parser.add_argument("--format", choices=FORMATS, default=default,
+                        help=help or f"Output format (default: {default})")
+
+
+def parse_fields(value):
+    """argparse type for --fields: comma-separated dotted paths.
+
+    A path already covered by a shorter one (attributes vs
+    attributes.friendly_name) is dropped.
+    """
+    paths = list(dict.fromkeys(tuple(field.strip().split(".")) for field in value.split(",") if field.strip()))
+    if not paths:
+        raise argparse.ArgumentTypeError("expected comma-separated field names")
+    return [
+        path for path in paths
+        if not any(other != path and path[:len(other)] == other for other in paths)
+    ]
+
+
+def add_fields_argument(parser):
+    parser.add_argument("--fields", type=parse_fields,
+                        help="Only output these comma-separated fields, e.g. entity_id,state,attributes.friendly_name")
+
+
+def project(record, fields):
+    """The record reduced to the given paths, nesting kept; missing paths are skipped.
+
+    Without fields the record is returned as is.
+    """
+    if not fields:
+        return record
+    result = {}
+    for path in fields:
+        value = record
+        for key in path:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = result
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = value
+    return result
+
+
+def dumps(data, fmt="json"):
+    if fmt == "json":
+        return json.dumps(data, indent=2)
+    return json.dumps(data, separators=(",", ":"))
+
+
+def write(data, fmt="json", stream=None):
+    """Write one result. In ndjson mode a list becomes one line per item."""
+    stream = stream or sys.stdout
+    if fmt == "ndjson" and isinstance(data, list):
+        write_records(data, fmt, stream)
+    else:
+        stream.write(dumps(data, fmt) + "\n")
+
+
+def write_records(records, fmt="json", stream=None):
+    """Write an iterable of records as they arrive and return how many.
+
+    json and compact produce exactly what dumping the whole list would.
+    ndjson flushes each line only on a terminal, so someone watching sees
+    records as they come; piped output is left to the stream's buffering.
+    """
+    stream = stream or sys.stdout
+    count = 0
+
+    if fmt == "ndjson":
+        interactive = stream.isatty()
+        for record in records:
+            stream.write(dumps(record, fmt) + "\n")
+            if interactive:
+                stream.flush()
+            count += 1
+        stream.flush()
+        return count
+
+    opening, separator, closing = ("[\n  ", ",\n  ", "\n]") if fmt == "json" else ("[", ",", "]")
+    for record in records:
+        text = dumps(record, fmt)
+        if fmt == "json":
+            text = text.replace("\n", "\n  ")
+        stream.write((separator if count else opening) + text)
+        count += 1
+    stream.write((closing if count else "[]") + "\n")
+    return count
@@ -0,0 +1,227 @@
+"""
+Fuzzy entity search over entity_id, friendly_name, area, device and domain.
+
+Each entity is matched by the trigrams of those fields. A query is split
+into the same trigrams, so near misses ("kitchn", "bedrom") still match,
+and results are ranked by how many of the query's trigrams they contain.
+
+A script searches with search(), which scans every entity: the trigrams
+are checked as substrings of one normalized string per entity, so there is
+nothing to build or load first. Measured against a trigram index saved
+next to the snapshot, that scan wins at every install size, because
+loading (or rebuilding) the index costs more than the scan itself.
+
+The agent (ha_agent.py) is the exception: it keeps an EntityIndex in
+memory, updated from the same events as its state table, and search()
+asks it first when one is running.
+"""
+
+import heapq
+import operator
+import re
+from collections import Counter, defaultdict
+from itertools import repeat
+
+MIN_COVERAGE = 0.4
+TOKEN_BONUS = 0.25
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SEPARATOR_RE = re.compile(r"[^a-z0-9\n]+")
+# Byte table mapping every ASCII separator to a space, for the common case
+# of all-ASCII names (much faster than _SEPARATOR_RE)
+_ASCII_SEPARATORS = bytes(
+    byte if chr(byte).isascii() and (chr(byte).isalnum() or chr(byte) == "\n") else ord(" ")
+    for byte in range(256)
+)
+
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens; '.', '_' and spaces all separate words."""
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def trigrams(tokens):
+    """pg_trgm-style trigrams: each token padded as '  tok ' before slicing."""
+    grams = set()
+    for token in tokens:
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def document(state, location=None):
+    """The searchable fields for one entity, in a fixed order."""
+    entity_id = state["entity_id"]
+    location = location or {}
+    return (
+        entity_id,
+        state.get("attributes", {}).get("friendly_name") or "",
+        location.get("area") or "",
+        location.get("device") or "",
+        entity_id.split(".", 1)[0],
+    )
+
+
+def _score(doc, coverage, pattern, exact_tokens, query_tokens):
+    """Ranking shared by the scan and the index.
+
+    A plain substring hit is what the old search returned, so it always
+    outranks a fuzzy-only match. Entities containing a query word exactly
+    (not just its trigrams) get up to TOKEN_BONUS on top.
+    """
+    substring = pattern in doc[0].lower() or pattern in doc[1].lower()
+    score = coverage + (1.0 if substring else 0.0) + TOKEN_BONUS * exact_tokens / len(query_tokens)
+    return round(score, 4)
+
+
+def _best(scored, limit):
+    # Ties go to the shorter (usually more canonical) entity_id, then by name
+    key = lambda item: (-item[0], len(item[1]), item[1])
+    if limit:
+        return heapq.nsmallest(limit, scored, key=key)
+    return sorted(scored, key=key)
+
+
+class EntityIndex:
+    """Trigram and whole-token → entity_id postings, plus the source documents.
+
+    Kept in memory by the agent; building one costs far more than a scan,
+    so it only pays off in a process that answers many searches.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.postings = defaultdict(set)
+        self.token_postings = defaultdict(set)
+
+    @staticmethod
+    def _tokens(doc):
+        return {token for field in doc for token in tokenize(field)}
+
+    def add(self, entity_id, doc):
+        self.docs[entity_id] = doc
+        tokens = self._tokens(doc)
+        for token in tokens:
+            self.token_postings[token].add(entity_id)
+        for gram in trigrams(tokens):
+            self.postings[gram].add(entity_id)
+
+    def remove(self, entity_id):
+        doc = self.docs.pop(entity_id, None)
+        if doc is None:
+            return
+        tokens = self._tokens(doc)
+        for postings, keys in ((self.token_postings, tokens), (self.postings, trigrams(tokens))):
+            for key in keys:
+                posting = postings.get(key)
+                if posting is not None:
+                    posting.discard(entity_id)
+                    if not posting:
+                        del postings[key]
+
+    def update(self, entity_id, doc):
+        """Index doc for entity_id (None removes it); returns whether anything changed."""
+        current = self.docs.get(entity_id)
+        if current == doc:
+            return False
+        if current is not None:
+            self.remove(entity_id)
+        if doc is not None:
+            self.add(entity_id, doc)
+        return True
+
+    def sync(self, documents):
+        """Bring the index in line with {entity_id: doc}; returns the number of changes."""
+        changes = 0
+        for entity_id in self.docs.keys() - documents.keys():
+            self.remove(entity_id)
+            changes += 1
+        for entity_id, doc in documents.items():
+            changes += self.update(entity_id, doc)
+        return changes
+
+    def search(self, query, limit=25):
+        """Return up to `limit` (score, entity_id) pairs, best first (limit=0: all)."""
+        query_tokens = tokenize(query)
+        query_grams = trigrams(query_tokens)
+        if not query_grams:
+            return []
+
+        hits = Counter()
+        for gram in query_grams:
+            hits.update(self.postings.get(gram, ()))
+
+        pattern = query.lower()
+        exact = [self.token_postings.get(token, ()) for token in query_tokens]
+        scored = []
+        for entity_id, count in hits.items():
+            coverage = count / len(query_grams)
+            if coverage < MIN_COVERAGE:
+                continue
+            exact_tokens = sum(entity_id in posting for posting in exact)
+            scored.append((_score(self.docs[entity_id], coverage, pattern, exact_tokens, query_tokens), entity_id))
+        return _best(scored, limit)
+
+
+def _search_texts(docs):
+    """One string per doc with every token as ' tok ', for substring trigram checks.
+
+    A padded trigram '  ab' / ' ab' / 'ab ' is then the substring ' a' /
+    ' ab' / 'ab ', and an exact token is ' tok '.
+    """
+    text = "\n".join(" ".join(doc[:4]).replace("\n", " ") for doc in docs).lower()
+    if text.isascii():
+        text = text.encode().translate(_ASCII_SEPARATORS).decode()
+    else:
+        text = _SEPARATOR_RE.sub(" ", text)
+    return f" {text} ".replace("\n", " \n ").split("\n")
+
+
+def scan(docs, query, limit=25):
+    """EntityIndex.search over a list of documents, without building an index."""
+    query_tokens = tokenize(query)
+    query_grams = trigrams(query_tokens)
+    if not query_grams or not docs:
+        return []
+
+    texts = _search_texts(docs)
+    # Count each document's trigram hits one trigram at a time; the
+    # per-document work stays inside map()
+    counts = [0] * len(texts)
+    for gram in query_grams:
+        needle = gram[1:] if gram.startswith("  ") else gram
+        counts = list(map(operator.add, counts, map(operator.contains, texts, repeat(needle))))
+
+    pattern = query.lower()
+    exact = [f" {token} " for token in query_tokens]
+    threshold = MIN_COVERAGE * len(query_grams)
+    scored = []
+    for position, count in enumerate(counts):
+        if count < threshold:
+            continue
+        doc, text = docs[position], texts[position]
+        exact_tokens = sum(token in text for token in exact)
+        scored.append((_score(doc, count / len(query_grams), pattern, exact_tokens, query_tokens), doc[0]))
+    return _best(scored, limit)
+
+
+def search(states, locations, query, limit=25, session=None):
+    """Ranked (score, entity_id) pairs for query over states, best first (limit=0: all).
+
+    Answered by the agent's in-memory index when one is running, otherwise
+    by scanning states. Only entities present in states are returned.
+    """
+    from halib.agent import AgentUnavailable
+    from halib.session import get_session
+
+    session = session or get_session()
+    try:
+        matches = session.agent_request("search", query=query, limit=limit)
+    except AgentUnavailable:
+        pass
+    else:
+        known = {state["entity_id"] for state in states}
+        return [(score, entity_id) for score, entity_id in matches if entity_id in known]
+
+    docs = [document(state, locations.get(state["entity_id"])) for state in states]
+    return scan(docs, query, limit)
@@ -0,0 +1,128 @@
+"""
+On-disk service catalog, one file per domain.
+
+The catalog (/api/services) only changes when HA is upgraded or an
+integration is added or removed, so ServiceCatalog keeps it until either
+happens: the cache is stamped with the HA version and a hash of the loaded
+components from /api/config, and each lookup compares the stamp against a
+fresh /api/config (a small response) before reading. A mismatch rebuilds
+the whole catalog.
+
+Each domain is stored in its own file next to a manifest listing the
+domains, so a single-domain query reads and decodes only that domain.
+"""
+
+import hashlib
+import time
+
+from halib.cache import cache_path, read_json, write_json_atomic
+from halib.session import get_session
+
+
+def catalog_stamp(config):
+    """What the catalog depends on: HA version and the loaded components."""
+    components = ",".join(sorted(config.get("components") or []))
+    return {
+        "version": config.get("version"),
+        "components": hashlib.sha1(components.encode()).hexdigest(),
+    }
+
+
+def service_record(service_id, service):
+    """One service from /api/services, keyed the way homeassistant_api's Service dumps it."""
+    return {
+        "service_id": service_id,
+        "name": service.get("name"),
+        "description": service.get("description"),
+        "fields": service.get("fields"),
+        "target": service.get("target"),
+        "response": service.get("response"),
+    }
+
+
+class ServiceCatalog:
+    """The cached service catalog for one HA instance."""
+
+    def __init__(self, session=None):
+        self.session = session or get_session()
+        self.directory = cache_path("services", self.session, suffix="")
+        self.manifest_path = self.directory / "catalog.json"
+
+    def _domain_path(self, domain):
+        return self.directory / f"{domain}.json"
+
+    def fetch(self, stamp):
+        """Download every domain's services and store one file per domain."""
+        return self._store(stamp, self.session.get_json("/api/services"))
+
+    async def fetch_async(self, stamp):
+        """fetch() on the session's async HTTP pool."""
+        return self._store(stamp, await self.session.get_json_async("/api/services"))
+
+    def _store(self, stamp, services):
+        catalog = {
+            domain["domain"]: {
+                service_id: service_record(service_id, service)
+                for service_id, service in (domain.get("services") or {}).items()
+            }
+            for domain in services
+        }
+        # Domain files first, the manifest last: a reader never sees a
+        # manifest naming files that aren't there yet
+        for domain, services in catalog.items():
+            write_json_atomic(self._domain_path(domain), services)
+        for stale in set(self._domains()) - catalog.keys():
+            self._domain_path(stale).unlink(missing_ok=True)
+        write_json_atomic(self.manifest_path, {**stamp, "synced_at": time.time(), "domains": list(catalog)})
+        return catalog
+
+    def _domains(self):
+        manifest = read_json(self.manifest_path)
+        return manifest["domains"] if manifest else []
+
+    def _cached(self, stamp, domains, fresh):
+        """The requested domains from the cache if it matches stamp, else None."""
+        manifest = None if fresh else read_json(self.manifest_path)
+        if manifest and all(manifest.get(key) == value for key, value in stamp.items()):
+            names = manifest["domains"] if domains is None else [name for name in domains if name in manifest["domains"]]
+            catalog = {name: read_json(self._domain_path(name)) for name in names}
+            # A missing slice (cache dir partly cleaned) means refetching
+            if all(services is not None for services in catalog.values()):
+                self.session.stats.cache_hits += 1
+                return catalog
+        self.session.stats.cache_misses += 1
+        return None
+
+    @staticmethod
+    def _select(catalog, domains):
+        if domains is None:
+            return catalog
+        return {name: catalog[name] for name in domains if name in catalog}
+
+    def services(self, domain=None, fresh=False, config=None):
+        """{domain: {service: {...}}} for every domain, or just the one asked for."""
+        return self.slices(None if domain is None else [domain], fresh=fresh, config=config)
+
+    def slices(self, domains=None, fresh=False, config=None):
+        """Like services(), for several domains; reads only those domains' files.
+
+        config is /api/config if the caller already has it, saving a request.
+        """
+        stamp = catalog_stamp(config or self.session.get_json("/api/config"))
+        catalog = self._cached(stamp, domains, fresh)
+        if catalog is not None:
+            return catalog
+        return self._select(self.fetch(stamp), domains)
+
+    async def slices_async(self, domains=None, fresh=False, config=None):
+        """slices() on the session's async HTTP pool, for use alongside other requests."""
+        stamp = catalog_stamp(config or await self.session.get_json_async("/api/config"))
+        catalog = self._cached(stamp, domains, fresh)
+        if catalog is not None:
+            return catalog
+        return self._select(await self.fetch_async(stamp), domains)
+
+    def clear(self):
+        for name in self._domains():
+            self._domain_path(name).unlink(missing_ok=True)
+        self.manifest_path.unlink(missing_ok=True)
@@ -0,0 +1,459 @@
+"""
+Pooled connection layer shared by every Home Assistant script.
+
+A process gets one HASession (via get_session()) that owns:
+
+- a keep-alive connection for get_json, so every REST call after the first
+  reuses the same TLS connection
+- a niquests pool for the homeassistant_api Client, created only if the
+  Client is used
+- at most one authenticated WebSocket, so the auth handshake happens once no
+  matter how many commands are sent
+- an async HTTP pool (get_json_async) for fetching REST endpoints
+  concurrently with other work from inside an event loop
+
+niquests negotiates HTTP/2 over TLS when the server offers it, so
+concurrent async requests are multiplexed on one connection; over plain
+HTTP they use keep-alive connections from the pool.
+
+REST GETs are retried on connection errors and 502/503/504 (HA restarting,
+a proxy in front of it) with jittered exponential backoff, up to
+HA_HTTP_RETRIES extra attempts (default 2). Each request's latency is
+recorded and included in the HA_SESSION_STATS report.
+
+The instance is HA_URL (e.g. http://homeassistant.local:8123), defaulting
+to HA_BASE_URL; the WebSocket URL is derived from it.
+
+When the optional local agent (ha_agent.py, see halib/agent.py) is
+running, REST GETs and WebSocket commands are forwarded to it instead,
+falling back to the direct connections if it isn't there or goes away.
+HA_AGENT=0 turns that off.
+
+Set HA_SESSION_STATS=1 to print how many pools, requests, WebSocket
+connections, auth round-trips and cache hits/misses the run had (to
+stderr, on exit).
+
+Importing this module is cheap: niquests, homeassistant_api, asyncio and
+websockets (halib.websocket) are imported on first use. get_json runs on
+the standard library's http.client, because importing niquests takes
+longer than a whole one-entity lookup; only the async pool, the Client and
+proxied setups (HTTP(S)_PROXY set) load niquests.
+"""
+
+import atexit
+import json
+import os
+import random
+import sys
+import time
+
+HA_BASE_URL = "https://ha.cullen.rocks"
+
+DEFAULT_HTTP_RETRIES = 2
+RETRY_STATUSES = {502, 503, 504}
+# First retry waits up to this long; each further one doubles it
+RETRY_BASE_DELAY = 0.25
+# WebSocket error codes meaning "no such item" rather than a failure
+NOT_FOUND_CODES = {"not_found", "config_not_found"}
+# Proxy settings http.client doesn't apply by itself
+PROXY_VARIABLES = ("https_proxy", "HTTPS_PROXY", "http_proxy", "HTTP_PROXY", "all_proxy", "ALL_PROXY")
+
+
+class HAError(Exception):
+    """Home Assistant rejected authentication or a command."""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        # The error code of a failed WebSocket command (e.g. "not_found"), if any
+        self.code = code
+
+    @property
+    def not_found(self):
+        """Whether HA answered that the thing asked for doesn't exist."""
+        return self.code in NOT_FOUND_CODES
+
+
+class HTTPStatusError(HAError):
+    """A REST request was answered with a 4xx/5xx status."""
+
+    def __init__(self, status_code, reason, url):
+        kind = "Client" if status_code < 500 else "Server"
+        super().__init__(f"{status_code} {kind} Error: {reason} for url: {url}")
+        self.status_code = status_code
+        self.reason = reason
+        self.url = url
+
+
+def http_retries():
+    """Extra attempts for a failed REST GET (HA_HTTP_RETRIES, default 2)."""
+    return int(os.environ.get("HA_HTTP_RETRIES", DEFAULT_HTTP_RETRIES))
+
+
+def retry_delay(attempt):
+    """Full-jitter backoff before retry number `attempt` (0-based)."""
+    return random.uniform(0, RETRY_BASE_DELAY * 2 ** attempt)
+
+
+def _retryable(error):
+    """Whether a request that raised `error` is worth retrying."""
+    if "niquests" in sys.modules:
+        from niquests.exceptions import ConnectionError, RequestException, Timeout
+
+        # niquests errors are OSErrors too, so decide on these first
+        if isinstance(error, RequestException):
+            return isinstance(error, (ConnectionError, Timeout))
+    import http.client
+    import ssl
+
+    # Dropped connections and timeouts, but not certificate failures
+    return isinstance(error, (OSError, http.client.HTTPException)) and not isinstance(error, ssl.SSLError)
+
+
+def resolve_base_url():
+    """HA_URL if set (with any trailing / or /api dropped), else HA_BASE_URL."""
+    url = (os.environ.get("HA_URL") or HA_BASE_URL).rstrip("/")
+    if url.endswith("/api"):
+        url = url[:-len("/api")]
+    return url
+
+
+def require_token():
+    """Return HA_TOKEN or exit with the same message every script uses."""
+    token = os.environ.get("HA_TOKEN")
+    if not token:
+        print("Error: HA_TOKEN environment variable not set", file=sys.stderr)
+        sys.exit(1)
+    return token
+
+
+class SessionStats:
+    """Counters for the round-trips a run actually paid for.
+
+    A plain class, not a dataclass: importing dataclasses (and inspect with
+    it) costs more than a cached lookup takes.
+    """
+
+    def __init__(self):
+        self.http_pools = 0
+        self.http_requests = 0
+        self.ws_connections = 0
+        self.auth_round_trips = 0
+        self.ws_commands = 0
+        self.ws_max_in_flight = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.http_retries = 0
+        # Requests answered by the local agent instead of HA
+        self.agent_requests = 0
+        # [path, milliseconds] for every get_json/get_json_async request
+        self.http_latency_ms = []
+
+
+class HASession:
+    """Owns the HTTP pool and WebSocket for one process."""
+
+    def __init__(self, base_url=None, token=None):
+        self.base_url = (base_url or resolve_base_url()).rstrip("/")
+        self.token = token or require_token()
+        self.stats = SessionStats()
+        self._http = None
+        self._rest = None
+        self._rest_prefix = ""
+        self._async_http = None
+        self._client = None
+        self._ws = None
+        self._ws_connecting = None
+        self._use_agent = os.environ.get("HA_AGENT") != "0"
+        self._agent = None
+        self._agent_async = None
+        self._agent_connecting = None
+
+    @property
+    def api_url(self):
+        return f"{self.base_url}/api"
+
+    @property
+    def ws_url(self):
+        scheme, rest = self.base_url.split("://", 1)
+        return f"{'wss' if scheme == 'https' else 'ws'}://{rest}/api/websocket"
+
+    def http(self):
+        """The keep-alive HTTP session, created on first use."""
+        if self._http is None:
+            import niquests
+
+            self._http = niquests.Session()
+            self._http.headers.update({
+                "Authorization": f"Bearer {self.token}",
+                "Content-Type": "application/json",
+            })
+            self._http.hooks["response"].append(self._count_request)
+            self.stats.http_pools += 1
+        return self._http
+
+    def _count_request(self, response, **kwargs):
+        self.stats.http_requests += 1
+        return response
+
+    def _agent_client(self):
+        """The blocking connection to the local agent, or None without one."""
+        if self._agent is None and self._use_agent:
+            from halib.agent import AgentClient, AgentUnavailable
+
+            try:
+                self._agent = AgentClient(self)
+            except AgentUnavailable:
+                self._use_agent = False
+        return self._agent
+
+    async def _agent_client_async(self):
+        """The pipelined agent connection for the running loop, or None without one."""
+        import asyncio
+
+        if self._agent_async is None and self._use_agent:
+            from halib.agent import AgentUnavailable, AsyncAgentClient
+
+            # Callers gathered concurrently share one connection attempt
+            if self._agent_connecting is None:
+                self._agent_connecting = asyncio.ensure_future(AsyncAgentClient.connect(self))
+            connecting = self._agent_connecting
+            try:
+                self._agent_async = await asyncio.shield(connecting)
+            except AgentUnavailable:
+                self._use_agent = False
+            finally:
+                if connecting.done() and self._agent_connecting is connecting:
+                    self._agent_connecting = None
+        return self._agent_async if self._use_agent else None
+
+    def agent_request(self, op, **fields):
+        """Send one request to the local agent; AgentUnavailable if none is running."""
+        from halib.agent import AgentUnavailable
+
+        agent = self._agent_client()
+        if agent is None:
+            raise AgentUnavailable("no agent is running")
+        try:
+            result = agent.request(op, **fields)
+        except AgentUnavailable:
+            self._drop_agent()
+            raise
+        self.stats.agent_requests += 1
+        return result
+
+    def _drop_agent(self):
+        """Stop forwarding for the rest of the run (the agent went away)."""
+        self._use_agent = False
+        if self._agent is not None:
+            self._agent.close()
+            self._agent = None
+
+    def _rest_connection(self):
+        """The keep-alive http.client connection for get_json, opened on first use."""
+        if self._rest is None:
+            import http.client
+            from urllib.parse import urlsplit
+
+            url = urlsplit(self.base_url)
+            if url.scheme == "https":
+                import ssl
+
+                self._rest = http.client.HTTPSConnection(url.hostname, url.port, context=ssl.create_default_context())
+            else:
+                self._rest = http.client.HTTPConnection(url.hostname, url.port)
+            self._rest_prefix = url.path
+            self.stats.http_pools += 1
+        return self._rest
+
+    def _get(self, path, timeout):
+        """One GET under the base URL: (status, reason, body bytes)."""
+        if any(os.environ.get(name) for name in PROXY_VARIABLES):
+            response = self.http().get(f"{self.base_url}{path}", timeout=timeout)
+            return response.status_code, response.reason, response.content
+
+        import http.client
+
+        connection = self._rest_connection()
+        reused = connection.sock is not None
+        connection.timeout = timeout
+        if reused:
+            connection.sock.settimeout(timeout)
+        try:
+            connection.request("GET", self._rest_prefix + path, headers={
+                "Authorization": f"Bearer {self.token}",
+                "Accept-Encoding": "gzip",
+            })
+            response = connection.getresponse()
+            body = response.read()
+        except (ConnectionError, http.client.HTTPException):
+            connection.close()
+            if not reused:
+                raise
+            # HA closed the idle keep-alive connection; a GET is safe to resend
+            return self._get(path, timeout)
+        except Exception:
+            connection.close()
+            raise
+        self.stats.http_requests += 1
+        if response.getheader("Content-Encoding") == "gzip":
+            import gzip
+
+            body = gzip.decompress(body)
+        return response.status, response.reason, body
+
+    def async_http(self):
+        """The async HTTP session for the running event loop, created on first use."""
+        if self._async_http is None:
+            import niquests
+
+            self._async_http = niquests.AsyncSession()
+            self._async_http.headers.update({
+                "Authorization": f"Bearer {self.token}",
+                "Content-Type": "application/json",
+            })
+            self.stats.http_pools += 1
+        return self._async_http
+
+    def _record(self, path, started):
+        self.stats.http_latency_ms.append([path, round((time.perf_counter() - started) * 1000, 1)])
+
+    def get_json(self, path, timeout=10):
+        """GET a path under the base URL (e.g. /api/states) and decode it.
+
+        Raises HTTPStatusError for a 4xx/5xx answer.
+        """
+        if self._use_agent:
+            from halib.agent import AgentUnavailable
+
+            try:
+                return self.agent_request("get", path=path)
+            except AgentUnavailable:
+                pass
+
+        for attempt in range(http_retries() + 1):
+            started = time.perf_counter()
+            try:
+                status, reason, body = self._get(path, timeout)
+            except Exception as e:
+                if attempt == http_retries() or not _retryable(e):
+                    raise
+            else:
+                self._record(path, started)
+                if attempt == http_retries() or status not in RETRY_STATUSES:
+                    if status >= 400:
+                        raise HTTPStatusError(status, reason, f"{self.base_url}{path}")
+                    return json.loads(body)
+            self.stats.http_retries += 1
+            time.sleep(retry_delay(attempt))
+
+    async def get_json_async(self, path, timeout=10, **kwargs):
+        """Async get_json, for use inside an event loop alongside other requests."""
+        import asyncio
+
+        agent = await self._agent_client_async()
+        if agent is not None:
+            from halib.agent import AgentUnavailable
+
+            try:
+                result = await agent.request("get", path=path)
+            except AgentUnavailable:
+                self._drop_agent()
+            else:
+                self.stats.agent_requests += 1
+                return result
+
+        for attempt in range(http_retries() + 1):
+            started = time.perf_counter()
+            try:
+                response = await self.async_http().get(f"{self.base_url}{path}", timeout=timeout, **kwargs)
+            except Exception as e:
+                if attempt == http_retries() or not _retryable(e):
+                    raise
+            else:
+                self.stats.http_requests += 1
+                self._record(path, started)
+                if attempt == http_retries() or response.status_code not in RETRY_STATUSES:
+                    if response.status_code >= 400:
+                        raise HTTPStatusError(response.status_code, response.reason, f"{self.base_url}{path}")
+                    return response.json()
+            self.stats.http_retries += 1
+            await asyncio.sleep(retry_delay(attempt))
+
+    def client(self):
+        """A homeassistant_api Client bound to the shared HTTP pool.
+
+        Not used as a context manager: entering a Client issues an extra
+        /api/ ping and exiting it closes the pool we want to keep.
+        """
+        if self._client is None:
+            from homeassistant_api import Client
+
+            self._client = Client(self.api_url, self.token, session=self.http())
+        return self._client
+
+    async def websocket(self):
+        """The shared authenticated WebSocket, connected on first use."""
+        import asyncio
+
+        if self._ws is None:
+            # Callers gathered concurrently share one connection attempt
+            if self._ws_connecting is None:
+                self._ws_connecting = asyncio.ensure_future(self._open_websocket())
+            connecting = self._ws_connecting
+            try:
+                self._ws = await asyncio.shield(connecting)
+            finally:
+                if connecting.done() and self._ws_connecting is connecting:
+                    self._ws_connecting = None
+        return self._ws
+
+    async def _open_websocket(self):
+        agent = await self._agent_client_async()
+        if agent is not None:
+            from halib.agent import AgentWebSocket
+
+            return AgentWebSocket(self, agent)
+        from halib.websocket import HAWebSocket
+
+        return await HAWebSocket(self).connect()
+
+    async def aclose(self):
+        if self._ws is not None:
+            await self._ws.close()
+            self._ws = None
+        if self._agent_async is not None:
+            await self._agent_async.close()
+            self._agent_async = None
+        # The async pool belongs to the loop that is about to finish
+        if self._async_http is not None:
+            await self._async_http.close()
+            self._async_http = None
+
+    def close(self):
+        if self._agent is not None:
+            self._agent.close()
+            self._agent = None
+        if self._rest is not None:
+            self._rest.close()
+            self._rest = None
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+            self._client = None
+
+    def report(self):
+        if os.environ.get("HA_SESSION_STATS"):
+            print(f"ha_session: {json.dumps(vars(self.stats))}", file=sys.stderr)
+
+
+_session = None
+
+
+def get_session():
+    """Return the process-wide HASession, creating it on first call."""
+    global _session
+    if _session is None:
+        _session = HASession()
+        atexit.register(_session.report)
+        atexit.register(_session.close)
+    return _session
@@ -0,0 +1,126 @@
+"""
+Latency statistics for automation traces.
+
+Everything works from one sorted list of durations: percentiles are index
+lookups and the histogram is a bisect per bucket boundary, so summarizing
+tens of thousands of archived runs costs a single sort.
+"""
+
+from bisect import bisect_right
+from datetime import datetime
+
+# Upper bounds (seconds) of the latency histogram buckets
+HISTOGRAM_BOUNDS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def format_seconds(value):
+    """Seconds as a display string; only a missing value is "N/A"."""
+    return "N/A" if value is None else f"{value:.3f}s"
+
+
+def _bound_label(seconds):
+    return f"{seconds * 1000:g}ms" if seconds < 1 else f"{seconds:g}s"
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile (0-100) of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def histogram(sorted_values, bounds=HISTOGRAM_BOUNDS):
+    """Bucket counts keyed by range label, e.g. "100ms-250ms"."""
+    buckets = {}
+    lower_index = 0
+    lower = 0
+    for bound in bounds:
+        upper_index = bisect_right(sorted_values, bound)
+        label = f"<{_bound_label(bound)}" if lower == 0 else f"{_bound_label(lower)}-{_bound_label(bound)}"
+        buckets[label] = upper_index - lower_index
+        lower_index, lower = upper_index, bound
+    buckets[f">{_bound_label(lower)}"] = len(sorted_values) - lower_index
+    return buckets
+
+
+def latency_summary(durations, with_histogram=True):
+    """Average, min, max, p50/p90/p99 and (optionally) a histogram."""
+    values = sorted(durations)
+    summary = {
+        "count": len(values),
+        "average": format_seconds(sum(values) / len(values) if values else None),
+        "min": format_seconds(values[0] if values else None),
+        "p50": format_seconds(percentile(values, 50)),
+        "p90": format_seconds(percentile(values, 90)),
+        "p99": format_seconds(percentile(values, 99)),
+        "max": format_seconds(values[-1] if values else None),
+    }
+    if with_histogram and values:
+        # Drop empty buckets at either end to keep the output short
+        buckets = list(histogram(values).items())
+        first = next(i for i, (_, count) in enumerate(buckets) if count)
+        last = len(buckets) - next(i for i, (_, count) in enumerate(reversed(buckets)) if count)
+        summary["histogram"] = dict(buckets[first:last])
+    return summary
+
+
+def _parse(timestamp_str):
+    return datetime.fromisoformat(timestamp_str.replace('Z', '+00:00')).timestamp()
+
+
+def step_durations(trace_detail):
+    """Seconds spent in each step path of one trace/get result.
+
+    HA records when each step started; a step lasts until the next one
+    starts, and the last one until the run finished. Steps revisited in a
+    loop are summed.
+    """
+    steps = []
+    for path, entries in (trace_detail.get("trace") or {}).items():
+        for entry in entries:
+            if entry.get("timestamp"):
+                try:
+                    steps.append((_parse(entry["timestamp"]), path))
+                except ValueError:
+                    continue
+    if not steps:
+        return {}
+    steps.sort()
+
+    finish = (trace_detail.get("timestamp") or {}).get("finish")
+    try:
+        end = _parse(finish) if finish else steps[-1][0]
+    except ValueError:
+        end = steps[-1][0]
+
+    durations = {}
+    for (started, path), (next_started, _) in zip(steps, steps[1:] + [(end, None)]):
+        durations[path] = durations.get(path, 0.0) + max(next_started - started, 0.0)
+    return durations
+
+
+def step_summary(trace_details):
+    """Per-step latency across runs, slowest p90 first."""
+    per_step = {}
+    for detail in trace_details:
+        for path, seconds in step_durations(detail).items():
+            per_step.setdefault(path, []).append(seconds)
+
+    ranked = []
+    for path, values in per_step.items():
+        values.sort()
+        ranked.append((percentile(values, 90), path, values))
+    ranked.sort(reverse=True)
+
+    return {
+        path: {
+            "runs": len(values),
+            "p50": format_seconds(percentile(values, 50)),
+            "p90": format_seconds(p90),
+            "max": format_seconds(values[-1]),
+        }
+        for p90, path, values in ranked
+    }
@@ -0,0 +1,95 @@
+"""
+Display formatting for Home Assistant timestamps.
+
+HA reports ISO 8601 UTC timestamps; the scripts show them in local time as
+"YYYY-MM-DD HH:MM:SS TZ". The zone is HA_TIMEZONE (an IANA name, default
+America/Denver).
+
+Conversions are memoized. Output only has one-second resolution, so the
+cache key drops the fractional part: every event within the same second
+(typical for a trace's start/finish and step timestamps) shares one
+fromisoformat/astimezone/strftime. format_timestamps() converts a whole
+column at once, formatting each distinct second a single time.
+
+Sorting and windowing should use to_epoch() values, never the formatted
+strings: those don't order correctly across DST changes.
+"""
+
+import argparse
+import os
+from datetime import datetime
+from functools import lru_cache
+
+DEFAULT_TIMEZONE = "America/Denver"
+DISPLAY_FORMAT = "%Y-%m-%d %H:%M:%S %Z"
+
+
+def to_epoch(timestamp_str):
+    """ISO timestamp → epoch seconds, or None if missing/unparseable."""
+    if not timestamp_str:
+        return None
+    try:
+        return datetime.fromisoformat(timestamp_str.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_time(value):
+    """argparse type for --since/--until: ISO 8601, in display_zone() if no offset.
+
+    Naive times use the same zone the listings are printed in, so a time
+    copied from the output selects the same instant.
+    """
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid ISO 8601 time: {value}")
+    return dt if dt.tzinfo else dt.replace(tzinfo=display_zone())
+
+
+@lru_cache(maxsize=1)
+def display_zone():
+    """The zone timestamps are shown in (HA_TIMEZONE, default America/Denver)."""
+    from zoneinfo import ZoneInfo
+
+    return ZoneInfo(os.environ.get("HA_TIMEZONE") or DEFAULT_TIMEZONE)
+
+
+def _second_key(timestamp_str):
+    """The timestamp without its fractional seconds (and with Z spelled +00:00)."""
+    timestamp_str = timestamp_str.replace('Z', '+00:00')
+    if len(timestamp_str) > 19 and timestamp_str[19] == ".":
+        end = 20
+        while end < len(timestamp_str) and timestamp_str[end].isdigit():
+            end += 1
+        timestamp_str = timestamp_str[:19] + timestamp_str[end:]
+    return timestamp_str
+
+
+@lru_cache(maxsize=8192)
+def _format_second(key):
+    try:
+        return datetime.fromisoformat(key).astimezone(display_zone()).strftime(DISPLAY_FORMAT)
+    except ValueError:
+        return None
+
+
+def format_timestamp(timestamp_str):
+    """ISO timestamp → local display string; the input unchanged if unparseable."""
+    if not timestamp_str:
+        return None
+    if not isinstance(timestamp_str, str):
+        return timestamp_str
+    return _format_second(_second_key(timestamp_str)) or timestamp_str
+
+
+def format_timestamps(values):
+    """Format a column of timestamps, converting each distinct value once."""
+    converted = {}
+    result = []
+    for value in values:
+        if value not in converted:
+            converted[value] = format_timestamp(value)
+        result.append(converted[value])
+    return result
+
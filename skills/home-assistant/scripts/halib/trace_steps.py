@@ -0,0 +1,291 @@
+"""
+Step-level views of trace/get results: a compact form, and a diff of two runs.
+
+A raw trace keeps, for every step, the variables in scope (older HA) or
+the variables that step set (newer HA). In a looping automation that is
+the same `repeat`, `trigger` and `this` objects over and over. compact()
+rewrites a trace as:
+
+- steps: one list in execution order, each with its time as milliseconds
+  since the run started and `vars` holding only the variables whose value
+  differs from what was already in scope ({"set": {...}, "unset": [...]})
+- strings: every string that occurs more than once (entity ids, service
+  names, states, step paths) stored once; occurrences become "@<index>".
+  A string that itself starts with "@" gets one more "@" in front.
+
+expand() turns a compact trace back into trace/get shape, with each step's
+changed_variables being the delta (re-assignments of an unchanged value
+are dropped; everything else round-trips).
+
+diff_runs() aligns the steps of two runs by path and reports, per step,
+whether it ran in both and which result, error or variable fields differ,
+ignoring fields that always differ between runs (contexts, timestamps).
+"""
+
+import difflib
+from collections import Counter
+from datetime import datetime, timedelta
+
+COMPACT_FORMAT = "ha-compact-trace/1"
+
+# Run-level trace/get fields carried over as-is
+RUN_FIELDS = (
+    "domain", "item_id", "run_id", "state", "script_execution", "last_step",
+    "error", "trigger", "timestamp",
+)
+# Fields that differ between any two runs and say nothing about behaviour
+NOISE_KEYS = {"context", "context_id", "parent_id", "user_id", "last_changed", "last_updated", "last_reported", "time_fired", "timestamp"}
+# Strings shorter than this cost more as a reference than inline
+MIN_INTERN_LENGTH = 4
+
+_MISSING = object()
+
+
+def run_passed(run):
+    return run.get("state") == "stopped" and run.get("script_execution") == "finished" and not run.get("error")
+
+
+def run_failed(run):
+    """Same rule as ha_trace_summary.py: an error, or stopped without finishing."""
+    return bool(run.get("error")) or (run.get("state") == "stopped" and run.get("script_execution") != "finished")
+
+
+def _parse(timestamp):
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+
+
+def ordered_steps(trace):
+    """[(path, entry)] for every step entry, in the order they ran."""
+    steps = []
+    for position, (path, entries) in enumerate((trace.get("trace") or {}).items()):
+        for repeat, entry in enumerate(entries):
+            timestamp = entry.get("timestamp")
+            try:
+                key = _parse(timestamp).timestamp() if timestamp else float("inf")
+            except ValueError:
+                key = float("inf")
+            steps.append((key, position, repeat, path, entry))
+    steps.sort(key=lambda step: step[:3])
+    return [(path, entry) for _, _, _, path, entry in steps]
+
+
+def _step_variables(entry):
+    if "changed_variables" in entry:
+        return entry["changed_variables"] or {}, False
+    if "variables" in entry:
+        return entry["variables"] or {}, True
+    return None, False
+
+
+# Compact form
+
+def _count_strings(node, counts):
+    if isinstance(node, str):
+        if len(node) >= MIN_INTERN_LENGTH:
+            counts[node] += 1
+    elif isinstance(node, list):
+        for item in node:
+            _count_strings(item, counts)
+    elif isinstance(node, dict):
+        for value in node.values():
+            _count_strings(value, counts)
+
+
+def _intern(node, refs):
+    if isinstance(node, str):
+        if node in refs:
+            return refs[node]
+        return "@" + node if node.startswith("@") else node
+    if isinstance(node, list):
+        return [_intern(item, refs) for item in node]
+    if isinstance(node, dict):
+        return {key: _intern(value, refs) for key, value in node.items()}
+    return node
+
+
+def _resolve(node, strings):
+    if isinstance(node, str):
+        if node.startswith("@@"):
+            return node[1:]
+        if node.startswith("@") and node[1:].isdigit():
+            return strings[int(node[1:])]
+        return node
+    if isinstance(node, list):
+        return [_resolve(item, strings) for item in node]
+    if isinstance(node, dict):
+        return {key: _resolve(value, strings) for key, value in node.items()}
+    return node
+
+
+def compact(trace):
+    """A trace/get result in compact form (see the module docstring)."""
+    start = (trace.get("timestamp") or {}).get("start")
+    try:
+        started = _parse(start) if start else None
+    except ValueError:
+        started = None
+
+    scope = {}
+    steps = []
+    for path, entry in ordered_steps(trace):
+        step = {"path": path}
+        timestamp = entry.get("timestamp")
+        if started and timestamp:
+            try:
+                step["t"] = round((_parse(timestamp) - started).total_seconds() * 1000, 3)
+            except ValueError:
+                step["timestamp"] = timestamp
+        elif timestamp:
+            step["timestamp"] = timestamp
+
+        variables, is_snapshot = _step_variables(entry)
+        if variables is not None:
+            changed = {key: value for key, value in variables.items() if scope.get(key, _MISSING) != value}
+            removed = sorted(key for key in scope if key not in variables) if is_snapshot else []
+            scope.update(changed)
+            for key in removed:
+                del scope[key]
+            delta = {}
+            if changed:
+                delta["set"] = changed
+            if removed:
+                delta["unset"] = removed
+            if delta:
+                step["vars"] = delta
+
+        step.update(
+            (key, value) for key, value in entry.items()
+            if key not in ("path", "timestamp", "variables", "changed_variables")
+        )
+        steps.append(step)
+
+    body = {
+        "run": {key: trace[key] for key in RUN_FIELDS if key in trace},
+        "config": trace.get("config"),
+        "steps": steps,
+    }
+    extra = {key: value for key, value in trace.items() if key not in RUN_FIELDS and key not in ("trace", "config")}
+    if extra:
+        body["extra"] = extra
+
+    counts = Counter()
+    _count_strings(body, counts)
+    strings = sorted((text for text, count in counts.items() if count > 1), key=lambda text: -counts[text])
+    refs = {text: f"@{index}" for index, text in enumerate(strings)}
+    return {"format": COMPACT_FORMAT, "strings": strings, **_intern(body, refs)}
+
+
+def expand(compacted):
+    """A compact trace back in trace/get shape."""
+    if compacted.get("format") != COMPACT_FORMAT:
+        raise ValueError(f"not a compact trace: {compacted.get('format')!r}")
+    strings = compacted["strings"]
+    run = _resolve(compacted["run"], strings)
+    start = (run.get("timestamp") or {}).get("start")
+    started = _parse(start) if start else None
+
+    steps = {}
+    for step in _resolve(compacted["steps"], strings):
+        entry = {"path": step["path"]}
+        if "t" in step and started:
+            entry["timestamp"] = (started + timedelta(milliseconds=step["t"])).isoformat()
+        elif "timestamp" in step:
+            entry["timestamp"] = step["timestamp"]
+        if "vars" in step:
+            entry["changed_variables"] = step["vars"].get("set", {})
+        entry.update((key, value) for key, value in step.items() if key not in ("path", "t", "timestamp", "vars"))
+        steps.setdefault(step["path"], []).append(entry)
+
+    return {
+        **run,
+        **_resolve(compacted.get("extra") or {}, strings),
+        "trace": steps,
+        "config": _resolve(compacted.get("config"), strings),
+    }
+
+
+# Diff
+
+def _denoise(node):
+    if isinstance(node, dict):
+        return {key: _denoise(value) for key, value in node.items() if key not in NOISE_KEYS}
+    if isinstance(node, list):
+        return [_denoise(item) for item in node]
+    return node
+
+
+def _flatten(node, prefix=""):
+    """{dotted.path: leaf} for nested dicts; lists and scalars are leaves."""
+    if isinstance(node, dict) and node:
+        flat = {}
+        for key, value in node.items():
+            flat.update(_flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    return {prefix: node}
+
+
+def _step_view(entry, scope):
+    """What a step did, for comparison: its result, error and the variables it set."""
+    variables, _ = _step_variables(entry)
+    changed = {}
+    if variables is not None:
+        changed = {key: value for key, value in variables.items() if scope.get(key, _MISSING) != value}
+        scope.update(variables)
+    view = {key: entry[key] for key in ("result", "error") if key in entry}
+    if changed:
+        view["vars"] = changed
+    return _denoise(view)
+
+
+def _run_view(trace):
+    return {
+        "run_id": trace.get("run_id"),
+        "start": (trace.get("timestamp") or {}).get("start"),
+        "state": trace.get("state"),
+        "script_execution": trace.get("script_execution"),
+        "last_step": trace.get("last_step"),
+        "error": trace.get("error"),
+    }
+
+
+def diff_runs(failing, passing):
+    """Step-by-step differences between two trace/get results."""
+    failing_steps, passing_steps = ordered_steps(failing), ordered_steps(passing)
+    failing_scope, passing_scope = {}, {}
+    failing_views = [_step_view(entry, failing_scope) for _, entry in failing_steps]
+    passing_views = [_step_view(entry, passing_scope) for _, entry in passing_steps]
+
+    steps = []
+    diverged_at = None
+    matcher = difflib.SequenceMatcher(
+        a=[path for path, _ in failing_steps], b=[path for path, _ in passing_steps], autojunk=False
+    )
+    for tag, a_start, a_end, b_start, b_end in matcher.get_opcodes():
+        if tag == "equal":
+            for a, b in zip(range(a_start, a_end), range(b_start, b_end)):
+                failing_flat, passing_flat = _flatten(failing_views[a]), _flatten(passing_views[b])
+                changes = {
+                    key: {"failing": failing_flat.get(key), "passing": passing_flat.get(key)}
+                    for key in sorted(failing_flat.keys() | passing_flat.keys())
+                    if failing_flat.get(key) != passing_flat.get(key)
+                }
+                step = {"path": failing_steps[a][0], "status": "changed" if changes else "same"}
+                if changes:
+                    step["changes"] = changes
+                    if diverged_at is None:
+                        diverged_at = step["path"]
+                steps.append(step)
+            continue
+        for a in range(a_start, a_end):
+            steps.append({"path": failing_steps[a][0], "status": "only_failing", "failing": failing_views[a]})
+        for b in range(b_start, b_end):
+            steps.append({"path": passing_steps[b][0], "status": "only_passing", "passing": passing_views[b]})
+        if diverged_at is None:
+            diverged_at = (failing_steps[a_start] if a_start < a_end else passing_steps[b_start])[0]
+
+    return {
+        "failing": _run_view(failing),
+        "passing": _run_view(passing),
+        "diverged_at": diverged_at,
+        "steps": steps,
+    }
@@ -0,0 +1,225 @@
+"""
+Local SQLite archive of automation traces.
+
+Home Assistant only keeps the last few runs of each automation, so the
+archive accumulates them: sync_traces() asks trace/list what exists, skips
+every run_id already stored, and fetches only the new ones with trace/get.
+Listings and summaries can then be computed over weeks of history from
+the local database instead of the server's rolling sample.
+
+The database lives in HA_TRACE_DB, or under $XDG_DATA_HOME/ha-skill
+(~/.local/share/ha-skill) keyed by HA instance.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+from halib.session import HAError, resolve_base_url
+from halib.timefmt import display_zone, to_epoch
+
+# Runs archived per transaction while syncing details
+COMMIT_EVERY = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    item_id TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    start_ts REAL,
+    finish_ts REAL,
+    state TEXT,
+    script_execution TEXT,
+    last_step TEXT,
+    error TEXT,
+    summary TEXT NOT NULL,
+    detail TEXT,
+    -- 1 once trace/get was asked for this run (detail stays NULL if it had
+    -- aged out); 0 for runs archived with --no-details
+    detail_fetched INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (item_id, run_id)
+);
+CREATE INDEX IF NOT EXISTS runs_start ON runs (start_ts);
+CREATE INDEX IF NOT EXISTS runs_item_start ON runs (item_id, start_ts);
+"""
+
+
+def default_db_path(session=None):
+    """HA_TRACE_DB, else a per-instance file; needs no HA_TOKEN without a session."""
+    if os.environ.get("HA_TRACE_DB"):
+        return Path(os.environ["HA_TRACE_DB"])
+    base_url = session.base_url if session else resolve_base_url()
+    base = os.environ.get("XDG_DATA_HOME") or Path.home() / ".local" / "share"
+    instance = hashlib.sha1(base_url.encode()).hexdigest()[:12]
+    return Path(base) / "ha-skill" / f"traces-{instance}.sqlite"
+
+
+class TraceStore:
+    """The archive database for one HA instance."""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else default_db_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(runs)")}
+        if "detail_fetched" not in columns:
+            # Archives from before the column: runs without detail may have
+            # been synced with --no-details, so they are fetched again
+            self.db.execute("ALTER TABLE runs ADD COLUMN detail_fetched INTEGER NOT NULL DEFAULT 0")
+            self.db.execute("UPDATE runs SET detail_fetched = 1 WHERE detail IS NOT NULL")
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def known_runs(self, item_ids=None):
+        """{(item_id, run_id): detail_fetched} for archived runs, optionally for some automations."""
+        query = "SELECT item_id, run_id, detail_fetched FROM runs"
+        params = []
+        if item_ids:
+            query += f" WHERE item_id IN ({','.join('?' * len(item_ids))})"
+            params = list(item_ids)
+        return {(item_id, run_id): bool(fetched) for item_id, run_id, fetched in self.db.execute(query, params)}
+
+    def add(self, summary, detail=None, detail_fetched=False):
+        """Archive one run: its trace/list entry and, if fetched, its trace/get result."""
+        timestamp = summary.get("timestamp") or {}
+        error = summary.get("error")
+        self.db.execute(
+            "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                summary["item_id"],
+                summary["run_id"],
+                summary.get("domain", "automation"),
+                to_epoch(timestamp.get("start")),
+                to_epoch(timestamp.get("finish")),
+                summary.get("state"),
+                summary.get("script_execution"),
+                summary.get("last_step"),
+                error if error is None or isinstance(error, str) else json.dumps(error),
+                json.dumps(summary),
+                json.dumps(detail) if detail is not None else None,
+                int(detail_fetched or detail is not None),
+            ),
+        )
+
+    def commit(self):
+        self.db.commit()
+
+    def runs(self, item_id=None, since=None, until=None, with_detail=False, limit=None):
+        """trace/list-style entries (newest first), optionally with trace/get detail.
+
+        since/until are epoch seconds; limit keeps only the newest N.
+        With with_detail, yields (summary, detail).
+        """
+        clauses, params = [], []
+        if item_id:
+            clauses.append("item_id = ?")
+            params.append(item_id)
+        if since is not None:
+            clauses.append("start_ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("start_ts <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        columns = "summary, detail" if with_detail else "summary"
+        query = f"SELECT {columns} FROM runs {where} ORDER BY start_ts DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        for row in self.db.execute(query, params):
+            if with_detail:
+                yield json.loads(row[0]), json.loads(row[1]) if row[1] else None
+            else:
+                yield json.loads(row[0])
+
+    def status(self):
+        total, automations, with_detail, oldest, newest = self.db.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT item_id), COUNT(detail), MIN(start_ts), MAX(start_ts) FROM runs"
+        ).fetchone()
+        return {
+            "path": str(self.path),
+            "runs": total,
+            "automations": automations,
+            "runs_with_detail": with_detail,
+            "oldest_start": datetime.fromtimestamp(oldest, display_zone()).isoformat() if oldest else None,
+            "newest_start": datetime.fromtimestamp(newest, display_zone()).isoformat() if newest else None,
+        }
+
+
+async def sync_traces(store, websocket, item_ids=(), concurrency=8, details=True):
+    """Archive every run HA lists that the store hasn't seen. Returns (listed, added).
+
+    With details, runs archived earlier without them (--no-details) get
+    their trace/get too, as long as HA still lists them; added counts those.
+    """
+    item_ids = set(item_ids)
+    command = {"domain": "automation"}
+    if len(item_ids) == 1:
+        command["item_id"] = next(iter(item_ids))
+    listed = await websocket.call("trace/list", **command) or []
+
+    known = store.known_runs(item_ids or None)
+    # Runs still in progress would be archived half-finished and never
+    # revisited, so they wait for a later sync.
+    def wanted(run):
+        key = (run.get("item_id"), run.get("run_id"))
+        return key not in known or (details and not known[key])
+
+    new_runs = [
+        run for run in listed
+        if (not item_ids or run.get("item_id") in item_ids)
+        and run.get("state") != "running"
+        and wanted(run)
+    ]
+
+    if not details:
+        for run in new_runs:
+            store.add(run)
+        store.commit()
+        return len(listed), len(new_runs)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(run):
+        async with semaphore:
+            try:
+                detail = await websocket.call(
+                    "trace/get", domain="automation", item_id=run["item_id"], run_id=run["run_id"]
+                )
+            except HAError:
+                # Aged out between list and get: keep the summary we have
+                detail = None
+            return run, detail
+
+    added = 0
+    tasks = [asyncio.ensure_future(fetch(run)) for run in new_runs]
+    try:
+        for next_run in asyncio.as_completed(tasks):
+            run, detail = await next_run
+            store.add(run, detail, detail_fetched=True)
+            added += 1
+            if added % COMMIT_EVERY == 0:
+                store.commit()
+    finally:
+        # Keep every run fetched so far, even if the sync is cut short, and
+        # stop the fetches still queued
+        store.commit()
+        for task in tasks:
+            task.cancel()
+    return len(listed), added
@@ -0,0 +1,206 @@
+"""
+The Home Assistant WebSocket client behind HASession.websocket().
+
+Kept apart from session.py so that asyncio and websockets are only loaded
+by scripts that open a WebSocket; REST-only scripts never import this.
+"""
+
+import asyncio
+import json
+
+from halib.session import HAError
+
+
+# Queued to subscribers when the connection drops
+_CLOSED = object()
+
+
+class EventBuffer(asyncio.Queue):
+    """A bounded subscription queue that drops its oldest events when full.
+
+    The reader task must never block on a slow consumer (results for other
+    commands arrive on the same socket), so instead of applying backpressure
+    here a full buffer sheds the oldest event and counts it in `dropped`.
+    """
+
+    def __init__(self, maxsize=10000):
+        super().__init__(maxsize)
+        self.dropped = 0
+
+    def put_nowait(self, item):
+        if self.full():
+            self.get_nowait()
+            self.dropped += 1
+        super().put_nowait(item)
+
+
+class HAWebSocket:
+    """An authenticated Home Assistant WebSocket connection.
+
+    Commands are pipelined: each gets its own message id and a future, and a
+    single reader task routes every incoming result to the future with the
+    matching id (and every event to its subscription's queue). Any number of
+    calls can be in flight at once, so gathering N commands costs about one
+    round-trip instead of N.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self._conn = None
+        self._next_id = 0
+        self._pending = {}
+        self._subscriptions = {}
+        self._reader = None
+
+    async def connect(self):
+        import websockets
+
+        # Coalesced frames can carry several large results (dashboard
+        # configs, traces), so don't cap the frame size.
+        self._conn = await websockets.connect(self.session.ws_url, max_size=None)
+        self.session.stats.ws_connections += 1
+
+        msg = json.loads(await self._conn.recv())
+        if msg.get("type") != "auth_required":
+            raise HAError(f"Expected auth_required, got {msg.get('type')}")
+
+        await self._conn.send(json.dumps({
+            "type": "auth",
+            "access_token": self.session.token
+        }))
+        msg = json.loads(await self._conn.recv())
+        self.session.stats.auth_round_trips += 1
+        if msg.get("type") != "auth_ok":
+            raise HAError(f"Authentication failed: {msg}")
+
+        self._reader = asyncio.create_task(self._read_loop())
+
+        # Let HA batch replies into one frame. Not awaited: older versions
+        # reject the command, which is harmless.
+        _, future = await self._send("supported_features", {"features": {"coalesce_messages": 1}})
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        return self
+
+    async def _read_loop(self):
+        error = HAError("WebSocket connection closed")
+        try:
+            async for raw in self._conn:
+                msg = json.loads(raw)
+                for item in msg if isinstance(msg, list) else (msg,):
+                    self._dispatch(item)
+        except Exception as e:
+            error = HAError(f"WebSocket connection lost: {e}")
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+            # Shared queues only need the marker once
+            for queue in {id(queue): queue for queue in self._subscriptions.values()}.values():
+                queue.put_nowait(_CLOSED)
+
+    def _dispatch(self, msg):
+        msg_id = msg.get("id")
+        if msg.get("type") == "event":
+            queue = self._subscriptions.get(msg_id)
+            if queue is not None:
+                queue.put_nowait(msg["event"])
+        elif msg.get("type") == "result":
+            future = self._pending.pop(msg_id, None)
+            if future is not None and not future.done():
+                future.set_result(msg)
+
+    async def _send(self, msg_type, kwargs):
+        """Send a command and return the future its result will land in."""
+        self._next_id += 1
+        msg_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[msg_id] = future
+        await self._conn.send(json.dumps({"id": msg_id, "type": msg_type, **kwargs}))
+        self.session.stats.ws_commands += 1
+        self.session.stats.ws_max_in_flight = max(self.session.stats.ws_max_in_flight, len(self._pending))
+        return msg_id, future
+
+    async def call(self, msg_type, **kwargs):
+        """Send a command and return its result, raising HAError on failure."""
+        _, future = await self._send(msg_type, kwargs)
+        response = await future
+
+        if not response.get("success"):
+            error = response.get("error", {})
+            raise HAError(f"{msg_type}: {error.get('message', 'Unknown error')}", code=error.get("code"))
+
+        return response.get("result")
+
+    async def call_many(self, commands, return_exceptions=False):
+        """Run (msg_type, kwargs) commands concurrently; results come back in order.
+
+        With return_exceptions, a failed command's HAError takes its place
+        in the results instead of failing the whole batch.
+        """
+        return await asyncio.gather(
+            *(self.call(msg_type, **kwargs) for msg_type, kwargs in commands),
+            return_exceptions=return_exceptions,
+        )
+
+    async def subscribe(self, event_type=None, queue=None):
+        """Start a subscribe_events subscription and return its id.
+
+        Events go to `queue` if given (several subscriptions may share one),
+        otherwise to an unbounded queue of their own.
+        """
+        kwargs = {"event_type": event_type} if event_type else {}
+        return await self._subscribe("subscribe_events", kwargs, queue)
+
+    async def subscribe_trigger(self, trigger, queue=None):
+        """Subscribe to one trigger config (or a list of them) evaluated server-side.
+
+        Each event is the trigger's {"variables": {"trigger": ...}, "context": ...}.
+        """
+        return await self._subscribe("subscribe_trigger", {"trigger": trigger}, queue)
+
+    async def _subscribe(self, msg_type, kwargs, queue):
+        # Register under the id _send is about to use, before anything is
+        # sent, so no early event can be dropped.
+        self._subscriptions[self._next_id + 1] = queue if queue is not None else asyncio.Queue()
+        msg_id, future = await self._send(msg_type, kwargs)
+        response = await future
+        if not response.get("success"):
+            del self._subscriptions[msg_id]
+            error = response.get("error", {})
+            raise HAError(f"{msg_type}: {error.get('message', 'Unknown error')}", code=error.get("code"))
+        return msg_id
+
+    async def events(self, subscription_id):
+        """Yield the event payloads delivered for a subscription."""
+        queue = self._subscriptions[subscription_id]
+        while True:
+            event = await queue.get()
+            if event is _CLOSED:
+                raise HAError("WebSocket connection closed")
+            yield event
+
+    async def event_batches(self, subscription_id):
+        """Like events(), but yield everything queued so far as one list.
+
+        Lets a consumer that fell behind catch up a burst in one pass.
+        """
+        queue = self._subscriptions[subscription_id]
+        while True:
+            batch = [await queue.get()]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            events = [event for event in batch if event is not _CLOSED]
+            if events:
+                yield events
+            if len(events) != len(batch):
+                raise HAError("WebSocket connection closed")
+
+    async def close(self):
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
@@ -0,0 +1,69 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).resolve().parent
+# The scripts import halib as a top-level package, the way `uv run` sees it
+sys.path.insert(0, str(HERE.parent / "scripts"))
+sys.path.insert(0, str(HERE.parent / "benchmarks"))
+
+MOCK_ENTITIES = 1000
+
+
+@pytest.fixture(scope="session")
+def mock_ha():
+    """URL of a benchmarks/mock_ha.py install, started once for the test run."""
+    pytest.importorskip("aiohttp")
+    from bench_scripts import start_mock
+
+    process, url = start_mock(MOCK_ENTITIES, 0)
+    yield url
+    process.terminate()
+    process.wait()
+
+
+@pytest.fixture
+def session(mock_ha, tmp_path, monkeypatch):
+    """An HASession on the mock, with its own cache dir and trace archive."""
+    from bench_scripts import TOKEN
+    from halib.session import HASession
+
+    monkeypatch.setenv("HA_URL", mock_ha)
+    monkeypatch.setenv("HA_TOKEN", TOKEN)
+    monkeypatch.setenv("HA_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("HA_TRACE_DB", str(tmp_path / "traces.sqlite"))
+    monkeypatch.setenv("HA_AGENT", "0")
+    session = HASession()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def run(session):
+    """Run a coroutine function with the session's WebSocket closed afterwards."""
+    def run(function, *args, **kwargs):
+        async def main():
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                await session.aclose()
+        return asyncio.run(main())
+    return run
+
+
+@pytest.fixture
+def fail_calls(monkeypatch):
+    """fail_calls(websocket, should_fail, error): websocket.call raises error
+    for the (msg_type, kwargs) that should_fail picks."""
+    def fail_calls(websocket, should_fail, error):
+        call = websocket.call
+
+        async def flaky(msg_type, **kwargs):
+            if should_fail(msg_type, kwargs):
+                raise error
+            return await call(msg_type, **kwargs)
+
+        monkeypatch.setattr(websocket, "call", flaky)
+    return fail_calls
@@ -0,0 +1,127 @@
+import pytest
+
+from halib.automations import AutomationConfigCache
+from halib.cache import RegistryCache, StateCache
+from halib.dashboards import DashboardCache
+from halib.search import EntityIndex, document, scan, search
+from halib.session import HAError
+from conftest import MOCK_ENTITIES
+
+CONNECTION_LOST = HAError("connection lost")
+
+
+def test_state_cache_reuses_the_snapshot(session):
+    cache = StateCache(session)
+    states = cache.states()
+    assert len(states) == MOCK_ENTITIES
+    requests = session.stats.http_requests
+
+    assert cache.states() == states
+    assert session.stats.http_requests == requests
+    assert session.stats.cache_hits == 1
+
+    cache.states(fresh=True)
+    assert session.stats.http_requests == requests + 1
+    assert StateCache(session, ttl=0).load() is None
+
+
+def test_registry_cache_joins_device_areas(session, run):
+    cache = RegistryCache(session)
+    locations = run(cache.locations_async)
+    assert len(locations) == MOCK_ENTITIES
+    assert all(location["area"] and location["device"] for location in locations.values())
+    assert cache.load() == locations
+
+
+@pytest.mark.parametrize("query", ["kitchen light", "living room temp", "garage", "bedrom", "switch.office"])
+def test_scan_matches_the_index(session, run, query):
+    states = StateCache(session).states()
+    locations = run(RegistryCache(session).locations_async)
+    docs = [document(state, locations.get(state["entity_id"])) for state in states]
+    index = EntityIndex()
+    index.sync({doc[0]: doc for doc in docs})
+
+    assert index.search(query, limit=0)
+    assert scan(docs, query, limit=0) == index.search(query, limit=0)
+    assert search(states, locations, query, limit=10, session=session) == index.search(query, limit=10)
+
+
+def test_dashboard_without_config_is_cached_as_none(session, run, fail_calls):
+    async def fetch():
+        websocket = await session.websocket()
+        fail_calls(
+            websocket,
+            lambda msg_type, kwargs: msg_type == "lovelace/config" and kwargs.get("url_path") == "dashboard-garage",
+            HAError("lovelace/config: No config found.", code="config_not_found"),
+        )
+        return await DashboardCache(session).configs_async()
+
+    dashboards = run(fetch)
+    assert dashboards["dashboard-garage"]["config"] is None
+    assert dashboards["dashboard-kitchen"]["config"]["views"]
+    assert DashboardCache(session).configs_path.exists()
+
+
+def test_dashboard_transport_error_is_not_cached(session, run, fail_calls):
+    async def fetch():
+        websocket = await session.websocket()
+        fail_calls(
+            websocket,
+            lambda msg_type, kwargs: msg_type == "lovelace/config" and kwargs.get("url_path") == "dashboard-garage",
+            CONNECTION_LOST,
+        )
+        return await DashboardCache(session).configs_async()
+
+    with pytest.raises(HAError, match="connection lost"):
+        run(fetch)
+    cache = DashboardCache(session)
+    assert not cache.configs_path.exists()
+    assert not cache.index_path.exists()
+
+
+def test_automation_configs_sync_only_what_changed(session, run):
+    states = StateCache(session).states()
+    cache = AutomationConfigCache(session)
+
+    automations, changed = run(cache.sync_async, states)
+    assert changed == set(automations)
+    assert all(entry["config"] for entry in automations.values())
+
+    again, changed = run(cache.sync_async, states)
+    assert again == automations
+    assert changed == set()
+
+    edited = next(iter(automations))
+    states = [
+        {**state, "last_updated": "2026-03-09T00:00:00+00:00"} if state["entity_id"] == edited else state
+        for state in states
+    ]
+    _, changed = run(cache.sync_async, states)
+    assert changed == {edited}
+
+
+def test_automation_config_failures(session, run, fail_calls):
+    states = StateCache(session).states()
+    automation_ids = sorted(state["entity_id"] for state in states if state["entity_id"].startswith("automation."))
+    missing, unreachable = automation_ids[:2]
+    cache = AutomationConfigCache(session)
+
+    async def sync():
+        websocket = await session.websocket()
+        fail_calls(websocket, lambda msg_type, kwargs: kwargs.get("entity_id") == missing,
+                   HAError("automation/config: Entity not found", code="not_found"))
+        fail_calls(websocket, lambda msg_type, kwargs: kwargs.get("entity_id") == unreachable, CONNECTION_LOST)
+        return await cache.sync_async(states)
+
+    with pytest.raises(HAError, match="connection lost"):
+        run(sync)
+    stored = cache.load()
+    # Not found is remembered; a transport failure is left for the next sync
+    assert stored[missing]["config"] is None
+    assert unreachable not in stored
+    assert len(stored) == len(automation_ids) - 1
+
+    automations, changed = run(cache.sync_async, states)
+    assert changed == {unreachable}
+    assert automations[unreachable]["config"]
+    assert automations[missing]["config"] is None
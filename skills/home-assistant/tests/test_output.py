@@ -0,0 +1,43 @@
+import io
+import json
+
+from halib.output import write_records
+
+
+class Stream(io.StringIO):
+    def __init__(self, tty):
+        super().__init__()
+        self.tty = tty
+        self.flushes = 0
+
+    def isatty(self):
+        return self.tty
+
+    def flush(self):
+        self.flushes += 1
+
+
+RECORDS = [{"entity_id": f"light.lamp_{i}", "state": "on"} for i in range(3)]
+
+
+def test_json_and_compact_match_dumping_the_list():
+    for fmt, expected in (("json", json.dumps(RECORDS, indent=2)), ("compact", json.dumps(RECORDS, separators=(",", ":")))):
+        stream = Stream(False)
+        assert write_records(iter(RECORDS), fmt, stream) == 3
+        assert stream.getvalue() == expected + "\n"
+
+
+def test_empty_result_is_an_empty_array():
+    for fmt in ("json", "compact"):
+        stream = Stream(False)
+        assert write_records([], fmt, stream) == 0
+        assert stream.getvalue() == "[]\n"
+
+
+def test_ndjson_flushes_per_line_only_on_a_terminal():
+    piped, terminal = Stream(False), Stream(True)
+    write_records(RECORDS, "ndjson", piped)
+    write_records(RECORDS, "ndjson", terminal)
+    assert piped.getvalue() == terminal.getvalue() == "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in RECORDS)
+    assert piped.flushes == 1
+    assert terminal.flushes == len(RECORDS) + 1
@@ -0,0 +1,83 @@
+import copy
+import json
+from datetime import datetime
+
+import pytest
+
+from halib.trace_steps import COMPACT_FORMAT, compact, diff_runs, expand, ordered_steps
+
+START = "2025-01-10T06:00:00.000000+00:00"
+
+
+def step(path, ms, variables=None, **fields):
+    entry = {"path": path, "timestamp": f"2025-01-10T06:00:00.{ms:03d}000+00:00", **fields}
+    if variables is not None:
+        entry["changed_variables"] = variables
+    return entry
+
+
+def make_trace(run_id="run-pass", fail=False):
+    """A looping automation: trigger, a condition, then a repeat that calls a service twice."""
+    this = {"entity_id": "automation.kitchen_lights", "state": "on", "context": {"id": run_id}}
+    trace = {
+        "domain": "automation",
+        "item_id": "1700000000016",
+        "run_id": run_id,
+        "state": "stopped",
+        "script_execution": "error" if fail else "finished",
+        "last_step": "action/0/repeat/sequence/0",
+        "error": "Service light.turn_on not found" if fail else None,
+        "trigger": "state of sensor.kitchen_motion",
+        "timestamp": {"start": START, "finish": "2025-01-10T06:00:00.900000+00:00"},
+        "context": {"id": run_id},
+        "config": {"id": "1700000000016", "alias": "@kitchen lights", "triggers": []},
+        "blueprint_inputs": None,
+        "trace": {
+            "trigger/0": [step("trigger/0", 0, {"this": this, "trigger": {"platform": "state", "entity_id": "sensor.kitchen_motion"}})],
+            "condition/0": [step("condition/0", 10, result={"result": True, "entities": ["sensor.kitchen_motion"]})],
+            "action/0": [step("action/0", 20, result={"result": True})],
+            "action/0/repeat/sequence/0": [
+                step("action/0/repeat/sequence/0", 100 * i, {"repeat": {"index": i, "first": i == 1}},
+                     result={"params": {"domain": "light", "service": "turn_on", "service_data": {"entity_id": "light.kitchen"}}},
+                     **({"error": "Service light.turn_on not found"} if fail and i == 2 else {}))
+                for i in (1, 2)
+            ],
+        },
+    }
+    return trace
+
+
+def test_compact_round_trip():
+    trace = make_trace()
+    compacted = json.loads(json.dumps(compact(copy.deepcopy(trace))))
+    assert compacted["format"] == COMPACT_FORMAT
+    expanded = expand(compacted)
+
+    for key in ("run_id", "item_id", "state", "script_execution", "last_step", "error", "trigger", "context", "blueprint_inputs"):
+        assert expanded[key] == trace[key]
+    assert expanded["config"] == trace["config"]
+    # "@"-prefixed strings are escaped, not mistaken for references
+    assert expanded["config"]["alias"] == "@kitchen lights"
+
+    original, restored = ordered_steps(trace), ordered_steps(expanded)
+    assert [path for path, _ in restored] == [path for path, _ in original]
+    for (_, before), (_, after) in zip(original, restored):
+        assert after.get("result") == before.get("result")
+        assert after.get("error") == before.get("error")
+        assert datetime.fromisoformat(after["timestamp"]) == datetime.fromisoformat(before["timestamp"])
+        assert after.get("changed_variables", {}) == before.get("changed_variables", {})
+
+
+def test_diff_of_expanded_traces_matches_raw():
+    failing, passing = make_trace("run-fail", fail=True), make_trace()
+    raw = diff_runs(copy.deepcopy(failing), copy.deepcopy(passing))
+    expanded = diff_runs(expand(compact(failing)), expand(compact(passing)))
+
+    assert expanded["steps"] == raw["steps"]
+    assert expanded["diverged_at"] == raw["diverged_at"] == "action/0/repeat/sequence/0"
+    assert expanded["failing"]["run_id"] == "run-fail"
+
+
+def test_expand_rejects_other_formats():
+    with pytest.raises(ValueError):
+        expand(make_trace())
@@ -0,0 +1,122 @@
+import sqlite3
+
+import pytest
+
+from halib import trace_store
+from halib.session import HAError
+from halib.timefmt import display_zone
+from halib.trace_store import TraceStore, default_db_path, sync_traces
+
+# benchmarks/mock_ha.py: TRACED_AUTOMATIONS * RUNS_PER_AUTOMATION
+STORED_RUNS = 50 * 5
+
+
+def sync(session, run, **kwargs):
+    async def main():
+        websocket = await session.websocket()
+        with TraceStore() as store:
+            return await sync_traces(store, websocket, **kwargs)
+    return run(main)
+
+
+def test_sync_fetches_only_new_runs(session, run):
+    assert sync(session, run) == (STORED_RUNS, STORED_RUNS)
+    assert sync(session, run) == (STORED_RUNS, 0)
+
+    with TraceStore() as store:
+        runs = list(store.runs(with_detail=True))
+        assert store.status()["runs_with_detail"] == STORED_RUNS
+    assert len(runs) == STORED_RUNS
+    assert all(detail["trace"] for _, detail in runs)
+    starts = [summary["timestamp"]["start"] for summary, _ in runs]
+    assert starts == sorted(starts, reverse=True)
+
+
+def test_no_details_runs_are_backfilled(session, run):
+    item_id = "1700000000016"
+    assert sync(session, run, item_ids=[item_id], details=False) == (5, 5)
+    with TraceStore() as store:
+        assert set(store.known_runs().values()) == {False}
+        assert store.status()["runs_with_detail"] == 0
+
+    # A full sync fetches details for the summaries archived without them
+    assert sync(session, run) == (STORED_RUNS, STORED_RUNS)
+    with TraceStore() as store:
+        assert all(store.known_runs().values())
+        assert store.status()["runs_with_detail"] == STORED_RUNS
+    assert sync(session, run) == (STORED_RUNS, 0)
+
+
+def test_runs_fetched_before_a_failure_are_kept(session, run, fail_calls, monkeypatch):
+    monkeypatch.setattr(trace_store, "COMMIT_EVERY", 1000)
+    fetched = []
+
+    async def main():
+        websocket = await session.websocket()
+
+        def tenth_get(msg_type, kwargs):
+            if msg_type != "trace/get":
+                return False
+            fetched.append(kwargs["run_id"])
+            return len(fetched) == 10
+
+        fail_calls(websocket, tenth_get, ConnectionResetError("connection lost"))
+        with TraceStore() as store:
+            return await sync_traces(store, websocket, concurrency=1)
+
+    with pytest.raises(ConnectionResetError):
+        run(main)
+    with TraceStore() as store:
+        assert len(store.known_runs()) == 9
+
+
+def test_aged_out_run_keeps_its_summary(session, run, fail_calls):
+    async def main():
+        websocket = await session.websocket()
+        fail_calls(websocket, lambda msg_type, kwargs: kwargs.get("run_id") == "1700000000016-0",
+                   HAError("trace/get: The trace could not be found", code="not_found"))
+        with TraceStore() as store:
+            return await sync_traces(store, websocket, item_ids=["1700000000016"])
+
+    assert run(main) == (5, 5)
+    with TraceStore() as store:
+        details = {summary["run_id"]: detail for summary, detail in store.runs(with_detail=True)}
+        # Asked for once; not retried on every sync
+        assert store.known_runs()[("1700000000016", "1700000000016-0")]
+    assert details["1700000000016-0"] is None
+    assert sum(detail is not None for detail in details.values()) == 4
+
+
+def test_old_archives_are_migrated(tmp_path):
+    path = tmp_path / "old.sqlite"
+    db = sqlite3.connect(path)
+    db.executescript(trace_store.SCHEMA.replace(
+        "    detail_fetched INTEGER NOT NULL DEFAULT 0,\n", ""
+    ))
+    row = ("automation", None, None, "stopped", "finished", "action/0", None, "{}")
+    db.execute("INSERT INTO runs VALUES ('a', 'with', ?, ?, ?, ?, ?, ?, ?, ?, '{}')", row)
+    db.execute("INSERT INTO runs VALUES ('a', 'without', ?, ?, ?, ?, ?, ?, ?, ?, NULL)", row)
+    db.commit()
+    db.close()
+
+    with TraceStore(path) as store:
+        assert store.known_runs() == {("a", "with"): True, ("a", "without"): False}
+
+
+def test_status_needs_no_token(tmp_path, monkeypatch, request):
+    for name in ("HA_TOKEN", "HA_TRACE_DB"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("HA_URL", "http://ha.example:8123")
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path))
+    monkeypatch.setenv("HA_TIMEZONE", "Europe/Berlin")
+    display_zone.cache_clear()
+    request.addfinalizer(display_zone.cache_clear)
+
+    path = default_db_path()
+    assert path.parent == tmp_path / "ha-skill"
+    with TraceStore() as store:
+        store.add({"item_id": "a", "run_id": "1", "timestamp": {"start": "2026-03-08T08:00:00+00:00"}})
+        store.commit()
+        status = store.status()
+    assert status["path"] == str(path)
+    assert status["oldest_start"] == "2026-03-08T09:00:00+01:00"